@@ -0,0 +1,166 @@
+"""
+Benchmark of NumpyStorage allocation modes on checkpoint copy bandwidth.
+
+Slots are allocated with plain np.zeros, with transparent huge pages, with
+parallel first-touch placement, or both, and checkpoints of `--mb`
+megabytes are copied in and out of them, both through save/load and by
+`--threads` threads each copying the share a static OpenMP schedule would
+give it (as an operator writing its checkpoints in place does). Every case
+runs in its own process; when `perf` is available, that process runs
+under `perf stat` to count dTLB misses, which are dominated by the copies
+for enough `--repeat`s.
+
+    python benchmarks/bench_allocation.py --mb 256 --ncp 8 --threads 8 -o alloc.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from timeit import default_timer
+
+import numpy as np
+import pyrevolve as pr
+
+
+MODES = {
+    "default": {},
+    "hugepages": {"hugepages": True},
+    "first-touch": {"first_touch": "omp"},
+    "hugepages+first-touch": {"hugepages": True, "first_touch": "omp"},
+}
+TLB_EVENTS = ["dTLB-load-misses", "dTLB-store-misses"]
+
+
+def parallel_copy(dst, src, placement):
+    """Copies src into dst from one thread per entry of placement, each
+    pinned to its CPUs and copying a contiguous share"""
+    bounds = np.linspace(0, src.size, len(placement) + 1).astype(int)
+
+    def copy(rank, cpus):
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        dst[bounds[rank]:bounds[rank + 1]] = src[bounds[rank]:bounds[rank + 1]]
+
+    threads = [threading.Thread(target=copy, args=(rank, cpus))
+               for rank, cpus in enumerate(placement)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_case(mode, mb, ncp, n_threads, repeat):
+    os.environ["OMP_NUM_THREADS"] = str(n_threads)
+    placement = pr.omp_placement()
+    kwargs = dict(MODES[mode])
+    if kwargs.get("first_touch") == "omp":
+        kwargs["first_touch"] = placement
+    size = mb * 2 ** 20 // 8
+    field = np.random.rand(size)
+    out = np.empty_like(field)
+
+    start = default_timer()
+    storage = pr.NumpyStorage(size, ncp, np.float64, profiler=pr.Profiler(), **kwargs)
+    t_alloc = default_timer() - start
+
+    t_save = t_load = t_par_save = t_par_load = 0.
+    for _ in range(repeat):
+        for key in range(ncp):
+            start = default_timer()
+            storage.save(key, [field])
+            t_save += default_timer() - start
+            start = default_timer()
+            storage.load(key, [out])
+            t_load += default_timer() - start
+            start = default_timer()
+            parallel_copy(storage[key], field, placement)
+            t_par_save += default_timer() - start
+            start = default_timer()
+            parallel_copy(out, storage[key], placement)
+            t_par_load += default_timer() - start
+    assert np.all(out == field)
+
+    nbytes = field.nbytes * ncp * repeat / 1e9
+    return {
+        "name": mode,
+        "mb": mb,
+        "n_checkpoints": ncp,
+        "threads": len(placement),
+        "allocation_time": t_alloc,
+        "save_GBps": nbytes / t_save,
+        "load_GBps": nbytes / t_load,
+        "parallel_save_GBps": nbytes / t_par_save,
+        "parallel_load_GBps": nbytes / t_par_load,
+    }
+
+
+def perf_counts(output):
+    """Parses the CSV output of `perf stat -x,`"""
+    counts = {}
+    for line in output.splitlines():
+        fields = line.split(",")
+        if len(fields) > 2 and fields[2] in TLB_EVENTS:
+            try:
+                counts[fields[2]] = int(fields[0])
+            except ValueError:
+                counts[fields[2]] = None  # not counted or not supported
+    return counts
+
+
+def run_isolated(mode, args, use_perf):
+    case = [sys.executable, os.path.abspath(__file__), "--case", mode,
+            "--mb", str(args.mb), "--ncp", str(args.ncp),
+            "--threads", str(args.threads), "--repeat", str(args.repeat)]
+    if not use_perf:
+        return json.loads(subprocess.check_output(case))
+    proc = subprocess.run(["perf", "stat", "-x,", "-e", ",".join(TLB_EVENTS)] + case,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    result = json.loads(proc.stdout)
+    result.update(perf_counts(proc.stderr))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--mb", type=int, default=64,
+                        help="size of a checkpoint in megabytes")
+    parser.add_argument("--ncp", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-perf", action="store_true",
+                        help="do not count TLB misses with perf")
+    parser.add_argument("--case", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args(argv)
+
+    if args.case is not None:
+        json.dump(run_case(args.case, args.mb, args.ncp, args.threads, args.repeat),
+                  sys.stdout)
+        return
+
+    use_perf = not args.no_perf and shutil.which("perf") is not None
+    if not args.no_perf and not use_perf:
+        print("perf not found, TLB misses are not counted", file=sys.stderr)
+    results = []
+    for mode in args.mode:
+        r = run_isolated(mode, args, use_perf)
+        results.append(r)
+        misses = sum(r.get(event) or 0 for event in TLB_EVENTS)
+        print("%-22s alloc %7.3fs  save %6.2f  load %6.2f  parallel save %6.2f  "
+              "load %6.2f GB/s  dTLB misses %s"
+              % (r["name"], r["allocation_time"], r["save_GBps"], r["load_GBps"],
+                 r["parallel_save_GBps"], r["parallel_load_GBps"],
+                 misses if use_perf else "-"), file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
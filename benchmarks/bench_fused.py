@@ -0,0 +1,107 @@
+"""
+Benchmark of fused against separate forward and reverse steps.
+
+For each grid size of the wave-equation problem of `operators.py`, the
+REVERSE step (one forward step followed by one adjoint step and the
+gradient update) is timed with the two operators called one after the
+other and with WaveFusedReverse.apply_fused, which sweeps the grid in
+cache-sized tiles. The effective bandwidth counts the eight arrays a
+REVERSE step streams at least once (both time levels of the forward and
+adjoint wavefields read, the new levels and the gradient written back).
+A full MemoryRevolver reverse sweep is then timed with `fuse_reverse` on
+and off; the gradients must match.
+
+    python benchmarks/bench_fused.py --ndim 2 --n 512 1024 2048 --nt 200 --ncp 10
+"""
+import argparse
+import json
+import sys
+from timeit import default_timer
+
+import numpy as np
+import pyrevolve as pr
+
+from operators import make_problem
+
+
+def time_steps(ndim, n, steps, fused, cache_bytes):
+    cp, fwd, rev = make_problem(ndim, n, fused=True)
+    rev.set_cache(cache_bytes)
+    for t in range(steps):
+        # give the wavefields non-trivial values before timing
+        fwd.apply(t_start=t, t_end=t + 1)
+    start = default_timer()
+    for t in range(steps, 2 * steps):
+        if fused:
+            rev.apply_fused(t_start=t, t_end=t + 1)
+        else:
+            fwd.apply(t_start=t, t_end=t + 1)
+            rev.apply(t_start=t, t_end=t + 1)
+    elapsed = default_timer() - start
+    streamed = 8 * cp.state.prev.nbytes * steps
+    return elapsed, streamed / elapsed / 1e9, rev.grad
+
+
+def time_revolver(ndim, n, nt, ncp, fuse, cache_bytes):
+    cp, fwd, rev = make_problem(ndim, n, fused=True)
+    rev.set_cache(cache_bytes)
+    revolver = pr.MemoryRevolver(cp, fwd, rev, ncp, nt)
+    revolver.fuse_reverse = fuse
+    revolver.apply_forward()
+    start = default_timer()
+    revolver.apply_reverse()
+    return default_timer() - start, rev.grad
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ndim", type=int, default=2)
+    parser.add_argument("--n", type=int, nargs="+", default=[256, 512, 1024, 2048])
+    parser.add_argument("--steps", type=int, default=50,
+                        help="REVERSE steps timed for each operator")
+    parser.add_argument("--nt", type=int, default=200)
+    parser.add_argument("--ncp", type=int, default=10)
+    parser.add_argument("--cache-kb", type=int, default=1024,
+                        help="cache size the fused tiles are sized for")
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.n:
+        cache_bytes = args.cache_kb * 1024
+        t_sep, bw_sep, grad_sep = time_steps(args.ndim, n, args.steps, False,
+                                             cache_bytes)
+        t_fus, bw_fus, grad_fus = time_steps(args.ndim, n, args.steps, True,
+                                             cache_bytes)
+        rt_sep, rgrad_sep = time_revolver(args.ndim, n, args.nt, args.ncp, False,
+                                          cache_bytes)
+        rt_fus, rgrad_fus = time_revolver(args.ndim, n, args.nt, args.ncp, True,
+                                          cache_bytes)
+        match = (np.array_equal(grad_sep, grad_fus)
+                 and np.array_equal(rgrad_sep, rgrad_fus))
+        r = {
+            "ndim": args.ndim,
+            "n": n,
+            "state_mb": 2 * n ** args.ndim * 4 / 2 ** 20,
+            "separate_step_time": t_sep / args.steps,
+            "fused_step_time": t_fus / args.steps,
+            "separate_GBps": bw_sep,
+            "fused_GBps": bw_fus,
+            "separate_reverse_time": rt_sep,
+            "fused_reverse_time": rt_fus,
+            "speedup": rt_sep / rt_fus,
+            "match": match,
+        }
+        results.append(r)
+        print("n=%-5d state %8.1f MB  separate %6.2f GB/s  fused %6.2f GB/s  "
+              "reverse sweep %7.3fs -> %7.3fs (x%.2f)%s"
+              % (n, r["state_mb"], bw_sep, bw_fus, rt_sep, rt_fus, r["speedup"],
+                 "" if match else "  MISMATCH"), file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Microbenchmark of the time pyrevolve itself adds per timestep.
+
+The revolvers are driven with no-op operators and zero-byte checkpoints,
+so that everything measured is scheduling, dispatch and bookkeeping. For
+each scheduler and number of timesteps this reports the scheduler
+construction time, the number of scheduler actions executed per second,
+the overhead per timestep and the peak resident set size. Every case runs
+in its own process so that peak RSS is not polluted by earlier cases, and
+reports the median of `--repeat` runs after a discarded warm-up run, as
+single runs of the same case vary by more than a factor of three.
+
+Results can be checked against a threshold file to catch regressions:
+
+    python benchmarks/bench_overhead.py --check benchmarks/overhead_thresholds.json
+
+and a new threshold file can be written from the current machine with
+`--update FILE`, which applies `--slack` to every measured median.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+from timeit import default_timer
+
+import numpy as np
+import pyrevolve as pr
+from pyrevolve import crevolve as cr
+
+
+# 10^6 crevolve timesteps take about a minute and 600 MB per run, pass them
+# with --nt when needed
+DEFAULT_NT = {"crevolve": [1000, 10000, 100000], "hrevolve": [50, 100, 200]}
+
+
+class NoOpOperator(pr.Operator):
+    def apply(self, t_start, t_end):
+        pass
+
+
+class NullCheckpoint(pr.Checkpoint):
+    """A checkpoint without any data: storages copy zero bytes"""
+
+    def get_data(self, timestep):
+        return []
+
+    def get_data_location(self, timestep):
+        return []
+
+    @property
+    def dtype(self):
+        return np.float32
+
+    @property
+    def size(self):
+        return 1
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024. ** 2 if sys.platform == "darwin" else 1024.)
+
+
+def build(scheduler, nt):
+    cp = NullCheckpoint()
+    if scheduler == "crevolve":
+        return pr.MemoryRevolver(cp, NoOpOperator(), NoOpOperator(),
+                                 cr.adjust(nt), nt)
+    storages = [pr.NumpyStorage(cp.size, max(nt // 10, 1), cp.dtype),
+                pr.NumpyStorage(cp.size, nt, cp.dtype, wd=2, rd=2, name="slow")]
+    return pr.MultiLevelRevolver(cp, NoOpOperator(), NoOpOperator(), nt,
+                                 storage_list=storages)
+
+
+def time_run(scheduler, nt):
+    """Returns the revolver, its construction time and the time of its
+    forward and reverse sweeps"""
+    start = default_timer()
+    revolver = build(scheduler, nt)
+    t_construct = default_timer() - start
+    start = default_timer()
+    revolver.apply_forward()
+    revolver.apply_reverse()
+    return revolver, t_construct, default_timer() - start
+
+
+def run_case(scheduler, nt, repeat):
+    rss_before = peak_rss_mb()
+    # warms up the interpreter, the allocator and the caches
+    time_run(scheduler, nt)
+    constructs, runs = [], []
+    for _ in range(repeat):
+        # free the previous revolver first, peak RSS is that of one
+        revolver = None
+        revolver, t_construct, t_run = time_run(scheduler, nt)
+        constructs.append(t_construct)
+        runs.append(t_run)
+    t_construct = statistics.median(constructs)
+    t_run = statistics.median(runs)
+    n_actions = sum(sum(counts.values()) for section, counts
+                    in revolver.profiler.counts.items()
+                    if section in ("forward", "reverse"))
+    return {
+        "name": "%s-%d" % (scheduler, nt),
+        "scheduler": scheduler,
+        "nt": nt,
+        "n_checkpoints": revolver.n_checkpoints,
+        "repeat": repeat,
+        "construction_time": t_construct,
+        "run_time": t_run,
+        "run_time_range": [min(runs), max(runs)],
+        "n_actions": n_actions,
+        "actions_per_second": n_actions / t_run,
+        "overhead_per_timestep_us": t_run / nt * 1e6,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_increase_mb": peak_rss_mb() - rss_before,
+    }
+
+
+def run_isolated(scheduler, nt, repeat):
+    out = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--case", scheduler, str(nt),
+         "--repeat", str(repeat)])
+    return json.loads(out)
+
+
+def check(results, thresholds):
+    """Returns a list of human-readable threshold violations"""
+    failures = []
+    for r in results:
+        limits = thresholds.get(r["name"])
+        if limits is None:
+            continue
+        if r["actions_per_second"] < limits.get("min_actions_per_second", 0):
+            failures.append("%s: %.0f actions/s < %.0f" % (
+                r["name"], r["actions_per_second"], limits["min_actions_per_second"]))
+        for metric in ("construction_time", "peak_rss_mb"):
+            limit = limits.get("max_" + metric)
+            if limit is not None and r[metric] > limit:
+                failures.append("%s: %s %.3f > %.3f" % (r["name"], metric,
+                                                        r[metric], limit))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scheduler", nargs="+", default=sorted(DEFAULT_NT),
+                        choices=sorted(DEFAULT_NT))
+    parser.add_argument("--nt", type=int, nargs="+", default=None,
+                        help="numbers of timesteps (up to 10^6 for crevolve)")
+    parser.add_argument("--check", metavar="FILE", default=None,
+                        help="fail if results violate the thresholds in FILE")
+    parser.add_argument("--update", metavar="FILE", default=None,
+                        help="write thresholds derived from this run to FILE")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="timed runs per case, after one warm-up run")
+    parser.add_argument("--slack", type=float, default=4.,
+                        help="tolerance factor used by --update")
+    parser.add_argument("--case", nargs=2, metavar=("SCHEDULER", "NT"),
+                        help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args(argv)
+
+    if args.case is not None:
+        json.dump(run_case(args.case[0], int(args.case[1]), args.repeat), sys.stdout)
+        return
+
+    results = []
+    for scheduler in args.scheduler:
+        for nt in args.nt or DEFAULT_NT[scheduler]:
+            r = run_isolated(scheduler, nt, args.repeat)
+            results.append(r)
+            print("%-16s construct %8.3fs  %10.0f actions/s  %8.2f us/step  "
+                  "peak RSS %7.1f MB" % (r["name"], r["construction_time"],
+                                         r["actions_per_second"],
+                                         r["overhead_per_timestep_us"],
+                                         r["peak_rss_mb"]), file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+    if args.update is not None:
+        thresholds = {r["name"]: {
+            "min_actions_per_second": round(r["actions_per_second"] / args.slack),
+            "max_construction_time": round(r["construction_time"] * args.slack, 3),
+            # peak RSS hardly varies between runs
+            "max_peak_rss_mb": round(r["peak_rss_mb"] * 1.5, 1),
+        } for r in results}
+        with open(args.update, "w") as f:
+            json.dump(thresholds, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    if args.check is not None:
+        with open(args.check) as f:
+            failures = check(results, json.load(f))
+        for failure in failures:
+            print("REGRESSION " + failure, file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Speedup of the parallel-in-segments reverse sweep over the sequential one.
+
+Runs the forward and reverse sweeps of the wave-equation problem of
+`operators.py` with a MemoryRevolver, once with the sequential
+apply_reverse and once with ParallelReverse for every number of worker
+threads in `--workers`. For each case it reports the reverse time, the
+speedup over the sequential sweep, the cores kept busy and the time the
+main thread waited for recomputed states. The gradients must match.
+
+    python benchmarks/bench_parallel_reverse.py --n 256 --nt 400 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import sys
+from timeit import default_timer
+
+import numpy as np
+import pyrevolve as pr
+
+from operators import make_problem
+
+
+def run_case(ndim, n, nt, ncp, workers, block):
+    cp, fwd, rev = make_problem(ndim, n)
+    revolver = pr.MemoryRevolver(cp, fwd, rev, ncp, nt)
+    engine = None
+    if workers:
+        engine = pr.ParallelReverse(revolver, lambda: make_problem(ndim, n)[:2],
+                                    n_workers=workers, block=block)
+    revolver.apply_forward()
+    start = default_timer()
+    if engine is None:
+        revolver.apply_reverse()
+    else:
+        engine.apply_reverse()
+    result = {"workers": workers, "reverse_time": default_timer() - start,
+              "checksum": float(np.sum(rev.grad, dtype=np.float64))}
+    if engine is not None:
+        result.update(parallelism=engine.stats["parallelism"],
+                      wait=engine.stats["wait"],
+                      buffer_mb=engine.stats["buffer_states"] * cp.nbytes / 2 ** 20)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ndim", type=int, default=2)
+    parser.add_argument("--n", type=int, default=256)
+    parser.add_argument("--nt", type=int, default=400)
+    parser.add_argument("--ncp", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, max((os.cpu_count() or 1) - 1, 1)}))
+    parser.add_argument("--block", type=int, default=None,
+                        help="largest number of states recomputed at once")
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args(argv)
+
+    sequential = run_case(args.ndim, args.n, args.nt, args.ncp, 0, None)
+    print("sequential    reverse %8.3fs" % sequential["reverse_time"], file=sys.stderr)
+    results = [sequential]
+    for workers in args.workers:
+        r = run_case(args.ndim, args.n, args.nt, args.ncp, workers, args.block)
+        r["speedup"] = sequential["reverse_time"] / r["reverse_time"]
+        if not np.isclose(r["checksum"], sequential["checksum"]):
+            print("MISMATCH with %d workers" % workers, file=sys.stderr)
+        results.append(r)
+        print("%2d workers    reverse %8.3fs  speedup %5.2f  cores busy %5.2f  "
+              "waited %7.3fs  buffers %8.1f MB"
+              % (workers, r["reverse_time"], r["speedup"], r["parallelism"],
+                 r["wait"], r["buffer_mb"]), file=sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
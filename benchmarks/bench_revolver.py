@@ -0,0 +1,193 @@
+"""
+End-to-end benchmark of pyrevolve with synthetic wave-equation operators.
+
+For every combination of scheduler, storage and compressor this measures
+    * scheduler (and storage) construction time,
+    * forward and reverse wall time and throughput (timesteps per second,
+      counting recomputed steps),
+    * checkpoint save/restore bandwidth, as reported by the storages,
+    * the total overhead relative to a run without checkpointing, i.e. nt
+      forward steps followed by nt reverse steps.
+Results are written as JSON, which `compare.py` can diff across commits.
+
+Usage:
+    python benchmarks/bench_revolver.py --ndim 2 --n 256 --nt 200 -o out.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+import numpy as np
+import pyrevolve as pr
+from pyrevolve.compression import compressors_available
+from pyrevolve.logger import logger
+
+from operators import make_problem
+
+
+SCHEDULERS = ["crevolve", "hrevolve", "storeall"]
+STORAGES = ["numpy", "disk", "bytes"]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def baseline(ndim, n, nt):
+    """Runs nt forward and nt reverse steps without checkpointing"""
+    cp, fwd, rev = make_problem(ndim, n)
+    start = default_timer()
+    fwd.apply(t_start=0, t_end=nt)
+    rev.apply(t_start=0, t_end=nt)
+    return default_timer() - start
+
+
+def build_revolver(scheduler, storage, scheme, cp, fwd, rev, ncp, nt, filedir):
+    if scheduler == "storeall":
+        # the whole trajectory, compressed when using the bytes storage
+        return pr.StoreAllRevolver(cp, fwd, rev, nt, diskstorage=storage == "disk",
+                                   filedir=filedir,
+                                   compression_params={"scheme": scheme})
+    if scheduler == "crevolve":
+        if storage == "disk":
+            return pr.DiskRevolver(cp, fwd, rev, ncp, nt, filedir=filedir)
+        if storage == "bytes":
+            revolver = pr.SingleLevelRevolver(cp, fwd, rev, ncp, nt)
+            revolver.resetStorageList()
+            revolver.addByteStorage({"scheme": scheme})
+            return revolver
+        return pr.MemoryRevolver(cp, fwd, rev, ncp, nt)
+
+    # H-Revolve: 'ncp' fast checkpoints on top of the chosen slow level
+    if storage == "bytes":
+        compressor = pr.init({"scheme": scheme})
+        slow = pr.BytesStorage(cp.nbytes, nt, cp.dtype, compressor,
+                               name="ByteStorage", wd=1, rd=1)
+    elif storage == "disk":
+        slow = pr.DiskStorage(cp.size, nt, cp.dtype, filedir=filedir, wd=2, rd=2)
+    else:
+        slow = pr.NumpyStorage(cp.size, nt, cp.dtype, name="SlowMemory", wd=1, rd=1)
+    fast = pr.NumpyStorage(cp.size, ncp, cp.dtype)
+    return pr.MultiLevelRevolver(cp, fwd, rev, nt, storage_list=[fast, slow])
+
+
+def run_case(scheduler, storage, scheme, ndim, n, nt, ncp, filedir, t_base):
+    cp, fwd, rev = make_problem(ndim, n)
+    start = default_timer()
+    revolver = build_revolver(scheduler, storage, scheme, cp, fwd, rev,
+                              ncp, nt, filedir)
+    t_construct = default_timer() - start
+
+    start = default_timer()
+    revolver.apply_forward()
+    t_forward = default_timer() - start
+    start = default_timer()
+    revolver.apply_reverse()
+    t_reverse = default_timer() - start
+
+    stats = [st.stats() for st in revolver.storage_list]
+    bytes_written = sum(s["bytes_written"] for s in stats)
+    bytes_read = sum(s["bytes_read"] for s in stats)
+    write_time = sum(s["bytes_written"] / s["write_bandwidth"] / 1e9
+                     for s in stats if s["write_bandwidth"] > 0)
+    read_time = sum(s["bytes_read"] / s["read_bandwidth"] / 1e9
+                    for s in stats if s["read_bandwidth"] > 0)
+    t_total = t_forward + t_reverse
+    steps = fwd.counter + rev.counter
+    return {
+        "name": "-".join(str(x) for x in (scheduler, storage, scheme, ndim, n, nt, ncp)),
+        "scheduler": scheduler,
+        "storage": storage,
+        "compression": scheme,
+        "ndim": ndim,
+        "n": n,
+        "nt": nt,
+        "ncp": ncp,
+        "checkpoint_bytes": cp.nbytes,
+        "construction_time": t_construct,
+        "forward_time": t_forward,
+        "reverse_time": t_reverse,
+        "total_time": t_total,
+        "baseline_time": t_base,
+        "overhead": t_total / t_base,
+        "forward_steps": fwd.counter,
+        "recompute_ratio": fwd.counter / nt,
+        "throughput": steps / t_total,
+        "bytes_written": bytes_written,
+        "bytes_read": bytes_read,
+        "save_bandwidth": bytes_written / write_time / 1e9 if write_time else 0.,
+        "restore_bandwidth": bytes_read / read_time / 1e9 if read_time else 0.,
+        "checksum": float(np.sum(rev.grad, dtype=np.float64)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ndim", type=int, nargs="+", default=[2, 3])
+    parser.add_argument("--n", type=int, nargs="+", default=None,
+                        help="grid points per dimension (default: 256 in 2D, "
+                        "48 in 3D)")
+    parser.add_argument("--nt", type=int, default=200)
+    parser.add_argument("--ncp", type=int, default=20)
+    parser.add_argument("--scheduler", nargs="+", default=SCHEDULERS,
+                        choices=SCHEDULERS)
+    parser.add_argument("--storage", nargs="+", default=STORAGES, choices=STORAGES)
+    parser.add_argument("--compression", nargs="+", default=None,
+                        help="compressors used with the bytes storage "
+                        "(default: all available)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per case, the fastest one is kept")
+    parser.add_argument("--filedir", default=tempfile.gettempdir() + "/")
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args(argv)
+    logger.setLevel(logging.WARNING)
+
+    schemes = args.compression or compressors_available
+    results = []
+    for ndim in args.ndim:
+        for n in args.n or [256 if ndim == 2 else 48]:
+            t_base = min(baseline(ndim, n, args.nt) for _ in range(args.repeat))
+            for scheduler in args.scheduler:
+                for storage in args.storage:
+                    for scheme in (schemes if storage == "bytes" else [None]):
+                        runs = [run_case(scheduler, storage, scheme, ndim, n,
+                                         args.nt, args.ncp, args.filedir, t_base)
+                                for _ in range(args.repeat)]
+                        best = min(runs, key=lambda r: r["total_time"])
+                        results.append(best)
+                        print("%-40s total %8.3fs  overhead %6.2fx  %8.1f steps/s"
+                              % (best["name"], best["total_time"],
+                                 best["overhead"], best["throughput"]),
+                              file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": git_revision(),
+            "pyrevolve": pr.__version__,
+            "numpy": np.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "node": platform.node(),
+        },
+        "results": results,
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
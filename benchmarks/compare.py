@@ -0,0 +1,58 @@
+"""
+Compares two JSON reports written by the pyrevolve benchmarks, matching
+cases by name, and exits with a non-zero status if any timing got slower
+than `--threshold` times the reference.
+
+Usage:
+    python benchmarks/compare.py before.json after.json --threshold 1.1
+"""
+import argparse
+import json
+import sys
+
+
+TIMINGS = ["construction_time", "forward_time", "reverse_time", "total_time"]
+
+
+def load(filename):
+    with open(filename) as f:
+        return {r["name"]: r for r in json.load(f)["results"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("reference")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=1.1)
+    parser.add_argument("--metrics", nargs="+", default=TIMINGS)
+    args = parser.parse_args(argv)
+
+    reference = load(args.reference)
+    candidate = load(args.candidate)
+    regressions = []
+    print("%-40s %-18s %12s %12s %8s"
+          % ("case", "metric", "reference", "candidate", "ratio"))
+    for name in sorted(set(reference) & set(candidate)):
+        for metric in args.metrics:
+            before = reference[name].get(metric)
+            after = candidate[name].get(metric)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            flag = ""
+            if ratio > args.threshold:
+                flag = " <-- slower"
+                regressions.append((name, metric, ratio))
+            print("%-40s %-18s %12.4g %12.4g %8.3f%s"
+                  % (name, metric, before, after, ratio, flag))
+    for name in sorted(set(reference) ^ set(candidate)):
+        print("%-40s only in %s" % (name, args.reference if name in reference
+                                    else args.candidate))
+
+    if regressions:
+        print("%d regression(s) above %.2fx" % (len(regressions), args.threshold))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Synthetic, NumPy-vectorised operators used by the pyrevolve benchmarks.
+
+The forward operator solves the constant-density acoustic wave equation
+    u_tt = c^2 * laplace(u) + s(t)
+with a second-order finite-difference stencil in 2D or 3D, and a point
+source in the centre of the grid. The reverse operator propagates an
+adjoint wavefield with the same stencil and accumulates the imaging
+condition grad += u * v, so that both directions touch the full state
+at every timestep like a real adjoint solver would.
+"""
+import numpy as np
+import pyrevolve as pr
+
+
+def ricker(nt, dt, f0=10.):
+    t = np.arange(nt) * dt - 1. / f0
+    a = (np.pi * f0 * t) ** 2
+    return (1 - 2 * a) * np.exp(-a)
+
+
+class WaveState(object):
+    """Live data of a wave propagator: two time levels of the wavefield.
+    The time levels are swapped by reference after every step, so users
+    must always go through `prev` and `curr`."""
+
+    def __init__(self, shape, dtype=np.float32):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.prev = np.zeros(self.shape, dtype=dtype)
+        self.curr = np.zeros(self.shape, dtype=dtype)
+
+    def swap(self):
+        self.prev, self.curr = self.curr, self.prev
+
+    @property
+    def fields(self):
+        return [self.prev, self.curr]
+
+
+class WaveStencil(object):
+    """Second-order in time, second-order in space leapfrog update
+    u_next = 2 * u - u_prev + (c * dt / h)^2 * laplace(u), evaluated on the
+    interior of the grid with preallocated scratch space."""
+
+    def __init__(self, shape, dtype=np.float32, courant=0.5):
+        self.shape = tuple(shape)
+        self.ndim = len(shape)
+        self.c2 = np.asarray(courant ** 2 / self.ndim, dtype=dtype)
+        self.lap = np.zeros(tuple(s - 2 for s in shape), dtype=dtype)
+        self.indices = {}
+
+    def slices(self, lo, hi):
+        """Returns the interior of rows lo..hi-1 and its neighbours along
+        every axis"""
+        if (lo, hi) not in self.indices:
+            bounds = [(lo, hi)] + [(1, s - 1) for s in self.shape[1:]]
+            inner = tuple(slice(a, b) for a, b in bounds)
+            neighbours = []
+            for axis, (a, b) in enumerate(bounds):
+                for shift in (-1, 1):
+                    idx = list(inner)
+                    idx[axis] = slice(a + shift, b + shift)
+                    neighbours.append(tuple(idx))
+            self.indices[(lo, hi)] = (inner, neighbours)
+        return self.indices[(lo, hi)]
+
+    def step(self, prev, curr, lo=1, hi=None):
+        """Overwrites `prev` with the next time level, on the interior rows
+        lo..hi-1 of the first axis (default: all of them)"""
+        if hi is None:
+            hi = self.shape[0] - 1
+        inner, neighbours = self.slices(lo, hi)
+        lap = self.lap[:hi - lo]
+        np.multiply(curr[inner], -2 * self.ndim, out=lap)
+        for idx in neighbours:
+            np.add(lap, curr[idx], out=lap)
+        lap *= self.c2
+        update = prev[inner]
+        np.subtract(lap, update, out=update)
+        update += curr[inner]
+        update += curr[inner]
+
+
+class WaveForward(pr.Operator):
+    def __init__(self, state, dt=1e-3):
+        self.state = state
+        self.stencil = WaveStencil(state.shape, state.dtype)
+        self.source = tuple(s // 2 for s in state.shape)
+        self.wavelet = None
+        self.dt = dt
+        self.counter = 0
+
+    def source_term(self, t):
+        if self.wavelet is None or len(self.wavelet) <= t:
+            self.wavelet = ricker(t + 1, self.dt).astype(self.state.dtype)
+        return self.wavelet[t]
+
+    def apply(self, t_start, t_end):
+        if t_end > t_start:
+            self.source_term(t_end - 1)
+        state = self.state
+        for t in range(t_start, t_end):
+            self.stencil.step(state.prev, state.curr)
+            state.prev[self.source] += self.wavelet[t]
+            state.swap()
+        self.counter += t_end - t_start
+
+
+class WaveReverse(pr.Operator):
+    def __init__(self, state, adjoint):
+        self.state = state
+        self.adjoint = adjoint
+        self.stencil = WaveStencil(adjoint.shape, adjoint.dtype)
+        self.receiver = tuple(s // 4 for s in adjoint.shape)
+        self.grad = np.zeros(state.shape, dtype=state.dtype)
+        self.counter = 0
+
+    def apply(self, t_start, t_end):
+        adjoint = self.adjoint
+        for t in range(t_end - 1, t_start - 1, -1):
+            self.stencil.step(adjoint.prev, adjoint.curr)
+            adjoint.prev[self.receiver] += 1.
+            adjoint.swap()
+            self.grad += self.state.curr * adjoint.curr
+        self.counter += t_end - t_start
+
+
+class WaveFusedReverse(WaveReverse):
+    """WaveReverse with a fused forward and reverse step: the grid is swept
+    in tiles of rows small enough to stay in a cache of `cache_bytes`, and
+    each tile is advanced forward, advanced backward and added to the
+    gradient before moving on, so the new forward state is read from cache
+    instead of memory. The results are identical to those of the two
+    separate operators."""
+
+    def __init__(self, state, adjoint, fwd, cache_bytes=2 ** 20):
+        super().__init__(state, adjoint)
+        self.fwd = fwd
+        self.set_cache(cache_bytes)
+
+    def set_cache(self, cache_bytes):
+        # six arrays are touched per tile, plus halo rows
+        row_bytes = self.state.prev[0].nbytes
+        self.tile = max(int(cache_bytes // (6 * row_bytes)) - 2, 1)
+
+    def apply_fused(self, t_start, t_end):
+        if t_end - t_start != 1:
+            self.fwd.apply(t_start=t_start, t_end=t_end)
+            self.apply(t_start=t_start, t_end=t_end)
+            return
+        state, adjoint, fwd = self.state, self.adjoint, self.fwd
+        source = fwd.source_term(t_start)
+        n = state.shape[0]
+        for lo in range(1, n - 1, self.tile):
+            hi = min(lo + self.tile, n - 1)
+            fwd.stencil.step(state.prev, state.curr, lo, hi)
+            if lo <= fwd.source[0] < hi:
+                state.prev[fwd.source] += source
+            self.stencil.step(adjoint.prev, adjoint.curr, lo, hi)
+            if lo <= self.receiver[0] < hi:
+                adjoint.prev[self.receiver] += 1.
+            # the boundary rows go with the first and last tiles
+            rows = slice(0 if lo == 1 else lo, n if hi == n - 1 else hi)
+            self.grad[rows] += state.prev[rows] * adjoint.prev[rows]
+        state.swap()
+        adjoint.swap()
+        fwd.counter += 1
+        self.counter += 1
+
+
+class WaveCheckpoint(pr.Checkpoint):
+    def __init__(self, state):
+        self.state = state
+
+    def get_data(self, timestep):
+        return self.state.fields
+
+    def get_data_location(self, timestep):
+        return self.state.fields
+
+    @property
+    def dtype(self):
+        return self.state.dtype
+
+    @property
+    def size(self):
+        return 2 * int(np.prod(self.state.shape))
+
+
+def make_problem(ndim=2, n=128, dtype=np.float32, fused=False):
+    """Returns (checkpoint, forward operator, reverse operator) of a
+    wave-equation problem on a grid with `n` points in each direction.
+    With `fused`, the reverse operator has apply_fused."""
+    shape = (n,) * ndim
+    state = WaveState(shape, dtype)
+    adjoint = WaveState(shape, dtype)
+    fwd = WaveForward(state)
+    rev = WaveFusedReverse(state, adjoint, fwd) if fused else WaveReverse(state, adjoint)
+    return WaveCheckpoint(state), fwd, rev
@@ -39,6 +39,9 @@ int revolve_getoldcapo(CRevolve r);
 int revolve_getwhere(CRevolve r);
 void revolve_setinfo(CRevolve r, int inf);
 void revolve_turn(CRevolve r, int final);
+int revolve_get_write_and_read_counts(CRevolve r, int* counts, int n);
+int revolve_get_number_of_writes_i(CRevolve r, int l, int c, int i);
+int revolve_get_number_of_reads_i(CRevolve r, int l, int c, int i);
 const char* revolve_caction_string(CACTION action);
 #ifdef __cplusplus
 }
@@ -2,6 +2,8 @@ from __future__ import absolute_import
 
 from pyrevolve.pyrevolve import * # noqa
 from pyrevolve.crevolve import * # noqa
+from pyrevolve.shots import ShotDriver, plan_shots # noqa
+from pyrevolve.parallel import ParallelReverse # noqa
 
 from . import _version
 __version__ = _version.get_versions()['version']
@@ -4,7 +4,7 @@ from functools import partial
 import pickle
 
 
-compressors_available = [None]
+compressors_available = [None, 'zeroblock']
 
 
 try:
@@ -20,7 +20,8 @@ except ImportError:
 
 
 DEFAULTS = {None: {}, 'blosc': {'chunk_size': 1000000},
-            'zfp': {'tolerance': 0.0000001, 'parallel': True}}
+            'zfp': {'tolerance': 0.0000001, 'parallel': True},
+            'zeroblock': {'block_size': 4096}}
 
 # Key-value pair of compressors pyrevolve is aware about but which may
 # or may not be installed. Key is the name of the compressor, value is
@@ -116,6 +117,94 @@ class CompressedObject(object):
         self.pickled_metadata = pickle.dumps(self.metadata)
 
 
+class ZeroBlockEncoder(object):
+    """
+    Chunk-level sparsity encoder. A byte array is split into blocks of
+    `block_size` bytes, all-zero blocks are detected with one vectorised
+    test and dropped, and the other blocks are packed contiguously. A
+    bitmap with one bit per block records which blocks were kept; decoding
+    zero-fills the dropped ones. Early in a wave simulation most of the
+    wavefield is exactly zero, so this cuts the bytes stored and moved.
+    """
+
+    def __init__(self, block_size=4096):
+        if block_size is None or block_size <= 0:
+            raise ValueError("CompressionError: block_size must be positive.")
+        self.block_size = block_size
+
+    def n_blocks(self, nbytes):
+        return -(-nbytes // self.block_size)
+
+    def _blocks(self, data):
+        """Returns the full blocks of the byte array `data` as a 2-D array,
+        and the trailing partial block"""
+        n_full = len(data) // self.block_size
+        end = n_full * self.block_size
+        return data[:end].reshape(n_full, self.block_size), data[end:]
+
+    def mask(self, data):
+        """Returns one boolean per block of `data`, True if it is non-zero"""
+        blocks, tail = self._blocks(data)
+        if self.block_size % 8 == 0:
+            # test eight bytes at once
+            blocks = blocks.view(np.uint64)
+        mask = np.empty(self.n_blocks(len(data)), dtype=bool)
+        np.any(blocks, axis=1, out=mask[:len(blocks)])
+        if len(tail):
+            mask[-1] = tail.any()
+        return mask
+
+    def encode(self, data, out):
+        """Packs the non-zero blocks of the byte array `data` into the front
+        of the byte array `out`. Returns the bitmap of kept blocks and the
+        number of bytes written."""
+        mask = self.mask(data)
+        blocks, tail = self._blocks(data)
+        keep = mask[:len(blocks)]
+        n_kept = int(np.count_nonzero(keep))
+        nbytes = n_kept * self.block_size
+        np.compress(keep, blocks, axis=0,
+                    out=out[:nbytes].reshape(n_kept, self.block_size))
+        if len(tail) and mask[-1]:
+            out[nbytes:nbytes + len(tail)] = tail
+            nbytes += len(tail)
+        return np.packbits(mask), nbytes
+
+    def decode(self, packed, bitmap, out):
+        """Unpacks the blocks in the byte array `packed` into the byte array
+        `out`, zero-filling the blocks that are not set in `bitmap`"""
+        blocks, tail = self._blocks(out)
+        mask = np.unpackbits(bitmap, count=self.n_blocks(len(out))).view(bool)
+        keep = mask[:len(blocks)]
+        n_kept = int(np.count_nonzero(keep))
+        nbytes = n_kept * self.block_size
+        blocks[~keep] = 0
+        blocks[keep] = packed[:nbytes].reshape(n_kept, self.block_size)
+        if len(tail):
+            if mask[-1]:
+                tail[:] = packed[nbytes:nbytes + len(tail)]
+            else:
+                tail[:] = 0
+
+
+def zeroblock_compress(params, indata):
+    encoder = ZeroBlockEncoder(params.get('block_size'))
+    data = np.ascontiguousarray(indata).reshape(-1).view(np.uint8)
+    packed = np.empty_like(data)
+    bitmap, nbytes = encoder.encode(data, packed)
+    metadata = {'shape': indata.shape, 'dtype': indata.dtype,
+                'bitmap': bitmap, 'nbytes': data.nbytes}
+    return CompressedObject(memoryview(packed[:nbytes]), metadata=metadata)
+
+
+def zeroblock_decompress(params, indata):
+    encoder = ZeroBlockEncoder(params.get('block_size'))
+    out = np.empty(indata.metadata['nbytes'], dtype=np.uint8)
+    encoder.decode(np.frombuffer(indata.data, dtype=np.uint8),
+                   indata.metadata['bitmap'], out)
+    return out.view(indata.dtype).reshape(indata.shape)
+
+
 def zfp_compress(params, indata):
     return CompressedObject(memoryview(pyzfp.compress(indata, **params)),
                             shape=indata.shape, dtype=indata.dtype)
@@ -128,6 +217,6 @@ def zfp_decompress(params, indata):
 
 
 compressors = {None: no_compression_in, 'blosc': blosc_compress,
-               'zfp': zfp_compress}
+               'zfp': zfp_compress, 'zeroblock': zeroblock_compress}
 decompressors = {None: no_compression_out, 'blosc': blosc_decompress,
-                 'zfp': zfp_decompress}
+                 'zfp': zfp_decompress, 'zeroblock': zeroblock_decompress}
@@ -0,0 +1,258 @@
+import numpy as np
+
+
+# Storage dtype of fields kept as the 16 most significant bits of their
+# float32 representation (bfloat16), held in uint16 words.
+BFLOAT16 = "bfloat16"
+
+
+def bfloat16_encode(src, dst):
+    """Rounds `src` to the nearest bfloat16 (ties to even) and writes the
+    resulting bit patterns into the uint16 array `dst`. NaNs stay quiet
+    NaNs of the same sign, rather than rounding into the exponent."""
+    bits = np.asarray(src, dtype=np.float32).view(np.uint32)
+    rounding = (bits >> 16) & 1
+    rounding += 0x7FFF
+    rounding += bits
+    rounding >>= 16
+    nan = (bits & 0x7FFFFFFF) > 0x7F800000
+    if nan.any():
+        rounding[nan] = (bits[nan] >> 16) | 0x0040
+    np.copyto(dst, rounding, casting="unsafe")
+
+
+def bfloat16_decode(src, dst):
+    """Expands the bfloat16 bit patterns in the uint16 array `src` into
+    `dst`."""
+    bits = src.astype(np.uint32)
+    bits <<= 16
+    np.copyto(dst, bits.view(np.float32))
+
+
+class FieldLayout(object):
+    """
+    Placement of one field of a checkpoint inside a storage slot.
+
+    Attributes:
+        name:           field name
+        array_shape:    shape of the live array
+        interior:       tuple of slices selecting the region of the live
+                        array that is saved, or None for the whole array
+        shape:          shape of the saved region
+        dtype:          dtype of the live array
+        storage_dtype:  dtype of the field inside the storage ('bfloat16'
+                        fields are held as uint16)
+        offset:         byte offset of the field inside a slot
+        size:           number of saved entries
+        nbytes:         number of bytes inside the storage
+    """
+
+    def __init__(self, name, shape, dtype, storage_dtype, offset, interior=None):
+        self.name = name
+        self.array_shape = tuple(shape)
+        self.interior = None
+        self.shape = self.array_shape
+        if interior is not None:
+            interior = tuple(interior)
+            if len(interior) > len(self.array_shape):
+                raise ValueError("LayoutError: interior of field %s has %d "
+                                 "dimensions, the array has %d." % (
+                                     name, len(interior), len(self.array_shape)))
+            interior += (slice(None),) * (len(self.array_shape) - len(interior))
+            self.interior = interior
+            self.shape = tuple(len(range(*s.indices(n)))
+                               for s, n in zip(interior, self.array_shape))
+        self.dtype = np.dtype(dtype)
+        self.bfloat16 = isinstance(storage_dtype, str) and storage_dtype == BFLOAT16
+        if self.bfloat16:
+            self.storage_dtype = np.dtype(np.uint16)
+        else:
+            self.storage_dtype = np.dtype(storage_dtype)
+        self.offset = offset
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+        self.nbytes = self.size * self.storage_dtype.itemsize
+
+    @property
+    def converted(self):
+        """Whether the field is stored with a different dtype than its own"""
+        return self.bfloat16 or self.storage_dtype != self.dtype
+
+    @property
+    def partial(self):
+        """Whether only an interior region of the live array is saved"""
+        return self.interior is not None
+
+    def region(self, array):
+        """Returns the view of the live `array` that is saved"""
+        if self.interior is None:
+            return array
+        return array[self.interior]
+
+    def _to_storage(self, src, dst):
+        if self.bfloat16:
+            bfloat16_encode(src, dst)
+        else:
+            np.copyto(dst, src, casting="unsafe")
+
+    def _from_storage(self, src, dst):
+        if self.bfloat16:
+            bfloat16_decode(src, dst)
+        else:
+            np.copyto(dst, src, casting="unsafe")
+
+    def encode(self, src, dst):
+        """Copies the saved region of the live array `src` into its storage
+        representation `dst`, straight from the strided view."""
+        self._to_storage(self.region(src), dst)
+
+    def decode(self, src, dst):
+        """Copies the stored array `src` back into the saved region of the
+        live array `dst`, leaving the rest of `dst` untouched."""
+        self._from_storage(src, self.region(dst))
+
+    @property
+    def raw_nbytes(self):
+        """Number of bytes of the live array"""
+        return int(np.prod(self.array_shape, dtype=np.int64)) * self.dtype.itemsize
+
+    def view(self, slot):
+        """Returns the part of the byte array `slot` holding this field,
+        as an array of `storage_dtype` with the field's shape."""
+        return slot[self.offset:self.offset + self.nbytes] \
+            .view(self.storage_dtype).reshape(self.shape)
+
+    def __repr__(self):
+        return "FieldLayout(%s, shape=%s, dtype=%s, storage_dtype=%s, offset=%d)" % (
+            self.name, self.array_shape if self.interior is None
+            else "%s[%s]" % (self.array_shape, self.shape), self.dtype,
+            BFLOAT16 if self.bfloat16 else self.storage_dtype, self.offset)
+
+
+class CheckpointLayout(object):
+    """
+    Static description of the data saved in one checkpoint: the name,
+    shape and dtype of every field, and the byte offset at which
+    it is placed inside a storage slot. A layout is computed once and
+    shared by all storages of a revolver, so that saving and loading a
+    checkpoint becomes a fixed list of copies between precomputed views,
+    without any per-call bookkeeping.
+
+    Fields may have different dtypes. `storage_dtype` is either a single
+    dtype used for every field, or a list with one entry per field: a
+    dtype, 'bfloat16', or None to keep the field's own dtype. Storing
+    fields in reduced precision (e.g. float64 as float32, float32 as
+    float16 or bfloat16) lets more checkpoints fit in the same memory;
+    see 'precision_report' for the memory saved and the error incurred.
+
+    `interiors` optionally gives, for each field, a tuple of slices
+    selecting the region to save, e.g. the interior of a grid without the
+    halo and absorbing-boundary padding that the forward operator
+    recomputes. Only that strided region is copied, and restoring a
+    checkpoint leaves the rest of the live array untouched.
+    """
+
+    def __init__(self, shapes, dtypes, storage_dtype, names=None, interiors=None):
+        if names is None:
+            names = ["f%d" % i for i in range(len(shapes))]
+        if interiors is None:
+            interiors = [None] * len(shapes)
+        if isinstance(storage_dtype, (list, tuple)):
+            storage_dtypes = [dtype if sd is None else sd
+                              for sd, dtype in zip(storage_dtype, dtypes)]
+        else:
+            storage_dtypes = [storage_dtype] * len(shapes)
+        if not (len(shapes) == len(dtypes) == len(names) == len(storage_dtypes)
+                == len(interiors)):
+            raise ValueError("LayoutError: shapes, dtypes and names of the "
+                             "checkpoint fields must have the same length.")
+        self.fields = []
+        offset = 0
+        for name, shape, dtype, sdtype, interior in zip(
+                names, shapes, dtypes, storage_dtypes, interiors):
+            field = FieldLayout(name, shape, dtype, sdtype, 0, interior)
+            # keep every field aligned to its own item size
+            itemsize = field.storage_dtype.itemsize
+            field.offset = -(-offset // itemsize) * itemsize
+            self.fields.append(field)
+            offset = field.offset + field.nbytes
+        self.nbytes = offset
+        self.raw_nbytes = sum(f.raw_nbytes for f in self.fields)
+        self.converted = any(f.converted for f in self.fields)
+        self.partial = any(f.partial for f in self.fields)
+
+    @classmethod
+    def from_arrays(cls, arrays, storage_dtype, names=None, interiors=None):
+        """Creates the layout of a checkpoint made of `arrays`"""
+        arrays = list(arrays)
+        return cls([a.shape for a in arrays], [a.dtype for a in arrays],
+                   storage_dtype, names=names, interiors=interiors)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __repr__(self):
+        return "CheckpointLayout(%s)" % ", ".join(repr(f) for f in self.fields)
+
+    @property
+    def size(self):
+        """Number of saved entries of one checkpoint"""
+        return sum(f.size for f in self.fields)
+
+    def views(self, slot):
+        """Returns one view per field of the byte array `slot`"""
+        return [f.view(slot) for f in self.fields]
+
+    @property
+    def saved_nbytes(self):
+        """Bytes per checkpoint saved by storing fields in reduced precision
+        and by leaving out everything but their interior"""
+        return self.raw_nbytes - self.nbytes
+
+    def encode(self, arrays, views):
+        """Copies live `arrays` into their storage representation `views`"""
+        for field, src, dst in zip(self.fields, arrays, views):
+            field.encode(src, dst)
+
+    def decode(self, views, arrays):
+        """Copies stored `views` back into the live `arrays`"""
+        for field, src, dst in zip(self.fields, views, arrays):
+            field.decode(src, dst)
+
+    def precision_report(self, arrays):
+        """Returns, for each field of the checkpoint made of `arrays`, the
+        live and stored bytes and the maximum absolute and relative error
+        caused by the round trip through the storage dtype."""
+        report = []
+        for field, array in zip(self.fields, arrays):
+            array = field.region(array)
+            stored = np.empty(field.shape, dtype=field.storage_dtype)
+            restored = np.empty(field.shape, dtype=field.dtype)
+            field._to_storage(array, stored)
+            field._from_storage(stored, restored)
+            error = np.abs(restored.astype(np.float64) - array)
+            scale = np.abs(array).max() if array.size else 0
+            report.append({
+                "name": field.name,
+                "dtype": str(field.dtype),
+                "storage_dtype": BFLOAT16 if field.bfloat16 else str(field.storage_dtype),
+                "raw_nbytes": field.raw_nbytes,
+                "nbytes": field.nbytes,
+                "saved_nbytes": field.raw_nbytes - field.nbytes,
+                "max_abs_error": float(error.max()) if array.size else 0.,
+                "max_rel_error": float(error.max() / scale) if scale else 0.,
+            })
+        return report
+
+    def validate(self, arrays):
+        """Raises a ValueError if `arrays` do not match the layout"""
+        arrays = list(arrays)
+        if len(arrays) != len(self.fields):
+            raise ValueError("LayoutError: expected %d fields, got %d."
+                             % (len(self.fields), len(arrays)))
+        for field, array in zip(self.fields, arrays):
+            if tuple(array.shape) != field.array_shape:
+                raise ValueError("LayoutError: field %s has shape %s, expected %s."
+                                 % (field.name, array.shape, field.array_shape))
@@ -0,0 +1,215 @@
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer
+from .logger import logger
+from .schedulers import HRevolve, Retain
+from .storage import NumpyStorage
+
+
+def live_checkpoints(saved):
+    """
+    Returns {timestep: key} of the checkpoints still held after the saves
+    in `saved`, a dict {key: timestep} in the order of the saves. Keys are
+    used as a stack, as the single-level schedulers do: a save to key k
+    supersedes the checkpoints of every key above k.
+    """
+    live = {}
+    lowest = None
+    for key, timestep in reversed(list(saved.items())):
+        if lowest is None or key < lowest:
+            live[timestep] = key
+            lowest = key
+    return live
+
+
+class ParallelReverse(object):
+    """
+    Runs the reverse sweep of a single-level revolver on several cores.
+    After 'apply_forward', the trajectory is split at the checkpoints the
+    forward sweep left in storage, and each segment into blocks of at most
+    `block` steps. While the main thread reverses one block, worker
+    threads restore the checkpoint below the next blocks and recompute
+    their forward states into a ring of up to n_workers + 1 buffers of one
+    block each, with independent operators built by `operator_factory`.
+    The buffers never hold more than `memory_budget` bytes of states, by
+    default as much as the revolver's own checkpoints, so running in
+    parallel at most doubles the checkpoint memory. The main
+    thread then runs one forward and one reverse step per timestep, as
+    REVERSE does, fused if the reverse operator supports it.
+
+    The forward operators must release the GIL (NumPy, compiled kernels)
+    for the workers to run in parallel. Afterwards the revolver is reset,
+    see 'BaseRevolver.reset', and `stats` reports the time the main thread
+    waited for states and the number of cores kept busy.
+    """
+
+    def __init__(self, revolver, operator_factory, n_workers=None, block=None,
+                 memory_budget=None):
+        """
+        @params:
+            revolver:         single-level revolver, whose forward sweep
+                              runs through apply_forward
+            operator_factory: function returning a new (checkpoint,
+                              forward operator) pair over its own state,
+                              shaped like the revolver's checkpoint
+            n_workers:        recomputation threads (default: CPUs - 1)
+            block:            largest number of states recomputed at once
+                              (default: as many as the budget allows)
+            memory_budget:    bytes of recomputed states held at once
+                              (default: n_workers + 1 blocks if `block` is
+                              given, else n_checkpoints checkpoints)
+        """
+        if isinstance(revolver.scheduler, (HRevolve, Retain)):
+            raise ValueError("RevolverError: the parallel reverse sweep needs a "
+                             "single-level, single-sweep schedule.")
+        if n_workers is None:
+            n_workers = max((os.cpu_count() or 1) - 1, 1)
+        if n_workers < 1 or (block is not None and block < 1):
+            raise ValueError("RevolverError: n_workers and block must be "
+                             "positive.")
+        nbytes = revolver.checkpoint.nbytes
+        if block is not None and memory_budget is None:
+            memory_budget = (n_workers + 1) * block * nbytes
+        elif memory_budget is None:
+            memory_budget = revolver.n_checkpoints * nbytes
+        budget_states = int(memory_budget // nbytes)
+        if budget_states < 1:
+            raise ValueError("RevolverError: memory budget of %d bytes cannot hold "
+                             "a state of %d bytes." % (memory_budget, nbytes))
+        # fewer buffers than workers + 1 if the budget is short
+        self.n_buffers = min(n_workers + 1, budget_states)
+        max_block = budget_states // self.n_buffers
+        if block is not None and block > max_block:
+            raise ValueError("RevolverError: %d buffers of %d states exceed the "
+                             "memory budget of %d states."
+                             % (self.n_buffers, block, budget_states))
+        self.revolver = revolver
+        self.operator_factory = operator_factory
+        self.n_workers = n_workers
+        self.memory_budget = memory_budget
+        self.block = block or max_block
+        self.profiler = revolver.profiler
+        self.stats = {}
+        self.__instances = queue.Queue()
+        for _ in range(n_workers):
+            self.__instances.put(operator_factory())
+        self.__buffers = []
+        self.__io_lock = threading.Lock()
+
+    def apply_forward(self):
+        """Executes the forward computation of the revolver"""
+        self.revolver.apply_forward()
+
+    def blocks(self):
+        """Returns the blocks (start, end, origin, key) to reverse, last
+        first: the states start..end-1 are recomputed from the checkpoint
+        of timestep `origin`, held in slot `key`"""
+        nt = self.revolver.n_timesteps
+        live = live_checkpoints(self.revolver.saved)
+        origins = sorted(t for t in live if t < nt - 1)
+        if nt > 1 and (not origins or origins[0] != 0):
+            raise ValueError("RevolverError: the forward sweep left no checkpoint "
+                             "of timestep 0.")
+        blocks = []
+        for origin, end in zip(origins, origins[1:] + [nt - 1]):
+            length = self.block
+            for start in range(origin, end, length):
+                blocks.append((start, min(start + length, end), origin, live[origin]))
+        return blocks[::-1]
+
+    def __allocate(self, length):
+        """Keeps n_buffers buffers of `length` states"""
+        checkpoint = self.revolver.checkpoint
+        if self.__buffers and self.__buffers[0].n_ckp != length:
+            self.__buffers = []
+        while len(self.__buffers) < self.n_buffers:
+            self.__buffers.append(NumpyStorage(checkpoint.size, length,
+                                               checkpoint.dtype, profiler=self.profiler,
+                                               name="ReverseBuffer"))
+        return deque(self.__buffers)
+
+    def __recompute(self, block, buffer):
+        start, end, origin, key = block
+        begin = default_timer()
+        checkpoint, fwd_operator = self.__instances.get()
+        try:
+            with self.profiler.get_timer("parallel", "restore"):
+                # storages are not thread safe
+                with self.__io_lock:
+                    storage, local = self.revolver._slot(0, key)
+                    storage.load(local, checkpoint.get_data_location(origin))
+            with self.profiler.get_timer("parallel", "advance"):
+                if start > origin:
+                    fwd_operator.apply(t_start=origin, t_end=start)
+                for t in range(start, end):
+                    buffer.save(t - start, checkpoint.get_data(t))
+                    if t < end - 1:
+                        fwd_operator.apply(t_start=t, t_end=t + 1)
+        finally:
+            self.__instances.put((checkpoint, fwd_operator))
+        return end - 1 - origin, default_timer() - begin
+
+    def apply_reverse(self):
+        """Executes the backward computation, recomputing the forward
+        states of the next blocks on the worker threads"""
+        revolver = self.revolver
+        nt = revolver.n_timesteps
+        rev_operator = revolver.rev_operator
+        locations = revolver.checkpoint.get_data_location
+        blocks = deque(self.blocks())
+        free = self.__allocate(self.block)
+        pending = deque()
+        begin = default_timer()
+        wait = busy = worker_busy = 0.
+        recomputed = 0
+
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            def submit():
+                if blocks:
+                    block, buffer = blocks.popleft(), free.popleft()
+                    pending.append((block, buffer,
+                                    executor.submit(self.__recompute, block, buffer)))
+
+            for _ in range(self.n_buffers):
+                submit()
+            start = default_timer()
+            with self.profiler.get_timer("reverse", "reverse"):
+                rev_operator.apply(t_start=nt - 1, t_end=nt)
+            busy += default_timer() - start
+            while pending:
+                (first, end, _, _), buffer, future = pending.popleft()
+                start = default_timer()
+                steps, elapsed = future.result()
+                wait += default_timer() - start
+                recomputed += steps
+                worker_busy += elapsed
+
+                start = default_timer()
+                for t in range(end - 1, first - 1, -1):
+                    with self.profiler.get_timer("reverse", "restore"):
+                        buffer.load(t - first, locations(t))
+                    with self.profiler.get_timer("reverse", "reverse"):
+                        revolver._reverse_step(t)
+                busy += default_timer() - start
+                buffer.reset()
+                free.append(buffer)
+                submit()
+
+        elapsed = default_timer() - begin
+        self.profiler.sample_memory("reverse")
+        revolver.reset()
+        self.stats = {
+            "workers": self.n_workers,
+            "elapsed": elapsed,
+            "wait": wait,
+            "recomputed_steps": recomputed,
+            "buffer_states": sum(b.n_ckp for b in self.__buffers),
+            # cores kept busy on average, main thread included
+            "parallelism": (busy + worker_busy) / elapsed if elapsed else 0.,
+        }
+        logger.info("Parallel reverse sweep: %.3fs with %d workers, %.2f cores busy, "
+                    "%.3fs waiting for states"
+                    % (elapsed, self.n_workers, self.stats["parallelism"], wait))
@@ -1,12 +1,42 @@
+import collections
+import json
+import math
+import os
+import threading
 from timeit import default_timer
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def current_rss():
+    """Returns the resident set size of this process in bytes, or None
+    where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """Returns the largest resident set size of this process so far in
+    bytes, or None where it cannot be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
 
 
 class Timer(object):
-    def __init__(self, profiler, section, action):
+    def __init__(self, profiler, section, action, args=None):
         self.timer = default_timer
         self.profiler = profiler
         self.section = section
         self.action = action
+        self.args = args
 
     def __enter__(self):
         self.start = self.timer()
@@ -17,25 +47,200 @@ class Timer(object):
         self.elapsed_secs = end - self.start
         self.elapsed = self.elapsed_secs * 1000  # millisecs
         self.profiler.increment(self.section, self.action, self.elapsed)
+        if self.profiler.tracer is not None:
+            self.profiler.tracer.record(self.section, self.action, self.start,
+                                        self.elapsed_secs, self.args)
+
+
+class Histogram(object):
+    """
+    Fixed-bucket, log-scale histogram of timings (HDR-style).
+    Every power of two between `lowest` and `highest` is split into
+    `sub_buckets` buckets, so any recorded value is known with a
+    relative error of at most 2**(1/sub_buckets) - 1 (~4.4% for the
+    default of 16). The number of buckets only depends on the
+    configured range, never on the number of recorded values.
+
+    Attributes:
+        lowest:      smallest distinguishable value (millisecs)
+        highest:     largest distinguishable value (millisecs)
+        sub_buckets: number of buckets per power of two
+    """
+
+    def __init__(self, lowest=1e-6, highest=1e7, sub_buckets=16):
+        self.lowest = lowest
+        self.highest = highest
+        self.sub_buckets = sub_buckets
+        self.n_buckets = int(math.ceil(math.log2(highest / lowest) * sub_buckets)) + 1
+        self.buckets = [0] * self.n_buckets
+        self.count = 0
+        self.min = math.inf
+        self.max = 0.
+
+    def bucket(self, value):
+        """Returns the index of the bucket holding `value`"""
+        if value <= self.lowest:
+            return 0
+        index = int(math.log2(value / self.lowest) * self.sub_buckets)
+        return min(index, self.n_buckets - 1)
+
+    def bucket_value(self, index):
+        """Returns the upper bound of the bucket with number `index`"""
+        return self.lowest * 2 ** ((index + 1) / self.sub_buckets)
+
+    def record(self, value):
+        self.buckets[self.bucket(value)] += 1
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Returns the value below which `p` percent of the recorded
+        values fall, within the resolution of the histogram."""
+        if self.count == 0:
+            return 0.
+        rank = max(1, int(math.ceil(p / 100. * self.count)))
+        running = 0
+        for index, count in enumerate(self.buckets):
+            running += count
+            if running >= rank:
+                return max(self.min, min(self.bucket_value(index), self.max))
+        return self.max
+
+
+class Tracer(object):
+    """
+    Opt-in timeline of profiled events, kept in a ring buffer of at
+    most `capacity` events so that memory stays bounded no matter how
+    many timesteps are run: once full, the oldest events are dropped.
+    Each event is (section, action, start, duration, thread, args),
+    where `args` holds the optional capo/old_capo/storage index/key
+    of the scheduler action. The timeline can be written out in the
+    Chrome Trace Event format, which chrome://tracing and Perfetto
+    (ui.perfetto.dev) can open.
+    """
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.events = collections.deque(maxlen=capacity)
+        self.n_events = 0
+        self.origin = default_timer()
+
+    def record(self, section, action, start, duration, args=None):
+        self.events.append((section, action, start, duration,
+                            threading.get_ident(), args))
+        self.n_events += 1
+
+    @property
+    def dropped(self):
+        """Number of events that were pushed out of the ring buffer"""
+        return self.n_events - len(self.events)
+
+    def clear(self):
+        self.events.clear()
+        self.n_events = 0
+        self.origin = default_timer()
+
+    def to_chrome_trace(self):
+        """Returns the recorded events as a Chrome Trace Event dict"""
+        pid = os.getpid()
+        events = []
+        for section, action, start, duration, thread, args in self.events:
+            event = {"name": action, "cat": section, "ph": "X",
+                     "ts": (start - self.origin) * 1e6, "dur": duration * 1e6,
+                     "pid": pid, "tid": thread}
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"dropped_events": self.dropped}}
+
+    def dump(self, filename):
+        """Writes the recorded events to `filename` as Chrome Trace JSON"""
+        with open(filename, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
 
 
 class Profiler(object):
-    def __init__(self):
+    def __init__(self, percentiles=(50, 90, 99), tracer=None):
         self.timings = {}
         self.counts = {}
+        self.histograms = {}
+        self.bytes = {}
+        self.raw_bytes = {}
+        self.percentiles = percentiles
+        self.tracer = tracer
+        self.memory = {}
+        # timers may run on several threads, see 'ParallelReverse'
+        self.lock = threading.RLock()
 
-    def get_timer(self, section, action):
-        return Timer(self, section, action)
+    def enable_tracing(self, capacity=100000):
+        """Starts recording a timeline of all profiled events"""
+        self.tracer = Tracer(capacity)
+        return self.tracer
+
+    def get_timer(self, section, action, **args):
+        return Timer(self, section, action, args)
 
     def increment(self, section, action, elapsed):
-        # Warning: Not thread safe
-        section_timings = self.timings.get(section, {})
-        section_timings[action] = section_timings.get(action, 0) + elapsed
-        self.timings[section] = section_timings
+        with self.lock:
+            section_timings = self.timings.get(section, {})
+            section_timings[action] = section_timings.get(action, 0) + elapsed
+            self.timings[section] = section_timings
+
+            section_counts = self.counts.get(section, {})
+            section_counts[action] = section_counts.get(action, 0) + 1
+            self.counts[section] = section_counts
+
+            section_histograms = self.histograms.setdefault(section, {})
+            histogram = section_histograms.get(action)
+            if histogram is None:
+                histogram = section_histograms[action] = Histogram()
+            histogram.record(elapsed)
+
+    def add_bytes(self, section, action, nbytes, raw_nbytes=None, elapsed=None):
+        """Accounts `nbytes` moved by `action` (`raw_nbytes` before
+        compression). If `elapsed` (in seconds) is given, the operation is
+        also timed, so that the achieved bandwidth can be reported."""
+        with self.lock:
+            section_bytes = self.bytes.setdefault(section, {})
+            section_bytes[action] = section_bytes.get(action, 0) + nbytes
+            section_raw = self.raw_bytes.setdefault(section, {})
+            section_raw[action] = section_raw.get(action, 0) + \
+                (nbytes if raw_nbytes is None else raw_nbytes)
+            if elapsed is not None:
+                self.increment(section, action, elapsed * 1000)
 
-        section_counts = self.counts.get(section, {})
-        section_counts[action] = section_counts.get(action, 0) + 1
-        self.counts[section] = section_counts
+    def sample_memory(self, section):
+        """Records the current resident set size of the process under
+        `section`, keeping the last and the largest sample, as well as the
+        process-wide peak RSS."""
+        rss = current_rss()
+        if rss is None:
+            return
+        sample = self.memory.setdefault(section, {"current": 0, "peak": 0})
+        sample["current"] = rss
+        sample["peak"] = max(sample["peak"], rss)
+        sample["process_peak"] = peak_rss()
+
+    def get_bandwidth(self, section, action):
+        """Returns the average bandwidth (GB/s) achieved by `action`"""
+        elapsed = self.timings.get(section, {}).get(action, 0)
+        if elapsed == 0:
+            return 0.
+        return self.bytes[section][action] / (elapsed / 1000) / 1e9
+
+    def get_percentiles(self, section, action):
+        """Returns a dict {'p50': .., 'p90': .., 'max': ..} with the
+        timing distribution (in millisecs) of a profiled action."""
+        histogram = self.histograms[section][action]
+        results = {}
+        for p in self.percentiles:
+            results['p%g' % p] = histogram.percentile(p)
+        results['max'] = histogram.max
+        return results
 
     def summary(self):
         summary = '****************'
@@ -45,6 +250,17 @@ class Profiler(object):
                 summary += '\n\tAction %s: %f (%d)' \
                            % (action, action_time,
                               self.counts[section][action])
+                summary += ''.join(
+                    ' %s=%f' % item
+                    for item in self.get_percentiles(section, action).items())
+                if action in self.bytes.get(section, {}):
+                    summary += ' bytes=%d raw_bytes=%d GB/s=%f' \
+                               % (self.bytes[section][action],
+                                  self.raw_bytes[section][action],
+                                  self.get_bandwidth(section, action))
+        for section, sample in self.memory.items():
+            summary += '\nMemory %s: rss=%d peak_rss=%d' \
+                       % (section, sample['current'], sample['peak'])
         summary += '\n****************'
         return summary
 
@@ -58,4 +274,20 @@ class Profiler(object):
             for a_n, a_time in s_dict.items():
                 results['%s_%s_counts' % (s_n, a_n)] = a_time
 
+        for s_n, s_dict in self.histograms.items():
+            for a_n in s_dict:
+                for p_n, p_time in self.get_percentiles(s_n, a_n).items():
+                    results['%s_%s_%s' % (s_n, a_n, p_n)] = "{:.4f}".format(p_time)
+
+        for s_n, s_dict in self.bytes.items():
+            for a_n, a_bytes in s_dict.items():
+                results['%s_%s_bytes' % (s_n, a_n)] = a_bytes
+                results['%s_%s_raw_bytes' % (s_n, a_n)] = self.raw_bytes[s_n][a_n]
+                results['%s_%s_GBps' % (s_n, a_n)] = \
+                    "{:.4f}".format(self.get_bandwidth(s_n, a_n))
+
+        for s_n, sample in self.memory.items():
+            results['%s_rss' % s_n] = sample['current']
+            results['%s_peak_rss' % s_n] = sample['peak']
+
         return results
@@ -1,14 +1,64 @@
 from abc import ABCMeta, abstractproperty, abstractmethod
+from functools import partial
+import asyncio
 import numpy as np
 from . import crevolve as cr
 from .compression import init_compression as init
-from .schedulers import CRevolve, HRevolve, Action, Architecture
+from .logger import logger
+from .schedulers import (CRevolve, slot_counts, HRevolve, StoreAll, WeightedRevolve,
+                         Retain, Action, Architecture)
 from .profiling import Profiler
-from .storage import NumpyStorage, BytesStorage, DiskStorage
+from .layout import CheckpointLayout, FieldLayout # noqa
+from .storage import NumpyStorage, BytesStorage, DiskStorage, DeltaStorage
+from .storage import CapacityExceeded
+from .storage import omp_placement, StoragePool, storage_pool # noqa
+
+
+async def _await_call(function, *args, **kwargs):
+    """Awaits function(*args, **kwargs): natively if it is a coroutine
+    function, otherwise in the default executor of the running loop"""
+    if asyncio.iscoroutinefunction(function):
+        return await function(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(function, *args, **kwargs))
+
+
+def _call(function, *args, awaitable=None, **kwargs):
+    """A call yielded to the revolver drivers: function(*args, **kwargs).
+    The async drivers await `awaitable`, a coroutine function taking the
+    same arguments, when given, and `function` through '_await_call'
+    otherwise."""
+    return function, args, kwargs, awaitable
+
+
+def _run(calls):
+    """Makes the calls yielded by `calls`, see '_call'"""
+    for function, args, kwargs, _ in calls:
+        function(*args, **kwargs)
+
+
+async def _async_run(calls):
+    """Awaits the calls yielded by `calls`, see '_call'"""
+    for function, args, kwargs, awaitable in calls:
+        if awaitable is None:
+            await _await_call(function, *args, **kwargs)
+        else:
+            await awaitable(*args, **kwargs)
 
 
 class Operator(object):
-    """Abstract base class for an Operator that may be used with pyRevolve."""
+    """Abstract base class for an Operator that may be used with pyRevolve.
+
+    A reverse operator may also define apply_fused(t_start, t_end), with
+    the effect of the forward operator's apply over the same steps followed
+    by its own. Revolvers then call it for every REVERSE action instead of
+    the two operators, so that a single kernel can reuse the forward state
+    while it is still in cache.
+
+    The asynchronous drivers of the revolvers ('async_apply_forward',
+    'async_apply_reverse') await apply and apply_fused if they are
+    coroutine functions, and run them in an executor otherwise.
+    """
 
     __metaclass__ = ABCMeta
 
@@ -43,6 +93,54 @@ class Checkpoint(object):
     def nbytes(self):
         return self.size * np.dtype(self.dtype).itemsize
 
+    @property
+    def layout(self):
+        """Return a CheckpointLayout describing the arrays returned by
+        `get_data`, or None to infer it from the first snapshot."""
+        return None
+
+    @property
+    def storage_dtypes(self):
+        """Return one storage dtype per array returned by `get_data`, to keep
+        fields in reduced precision inside the storages (e.g. float32 for a
+        float64 field, or 'bfloat16'). None entries keep the field's own
+        dtype. Return None to store every field as `dtype`."""
+        return None
+
+    @property
+    def interiors(self):
+        """Return one tuple of slices per array returned by `get_data`,
+        selecting the region that must be saved (e.g. the interior of a
+        padded grid, without the halo the forward operator recomputes).
+        None entries save the whole array. Return None to save everything.
+        Restoring a checkpoint leaves the rest of the arrays untouched."""
+        return None
+
+    @property
+    def supports_inplace(self):
+        """Return True if the checkpoint can write its data straight into
+        buffers handed out by the storage, through `fill_data`. With a
+        `fill_data` that produces the data in place, this saves one copy of
+        the full state per snapshot."""
+        return False
+
+    def get_data_shapes(self, timestep):
+        """Return the shapes of the arrays that `fill_data` writes."""
+        return [ptr.shape for ptr in self.get_data(timestep)]
+
+    def get_data_dtypes(self, timestep):
+        """Return the dtypes of the arrays that `fill_data` writes."""
+        return [ptr.dtype for ptr in self.get_data(timestep)]
+
+    def fill_data(self, timestep, buffers):
+        """Write live data into the storage-provided arrays `buffers`, which
+        have the shapes returned by `get_data_shapes`. The default copies
+        the arrays of `get_data`, which costs as much as a regular save:
+        checkpoints that declare `supports_inplace` should override it to
+        compute or gather their data straight into the buffers."""
+        for ptr, buf in zip(self.get_data(timestep), buffers):
+            np.copyto(buf, ptr)
+
 
 class BaseRevolver(object):
     """
@@ -105,9 +203,45 @@ class BaseRevolver(object):
         self.fwd_operator = fwd_operator
         self.rev_operator = rev_operator
         self.scheduler = scheduler
+        self.layout = None
+        if checkpoint.layout is not None:
+            self.set_layout(checkpoint.layout)
+        elif checkpoint.storage_dtypes is not None or checkpoint.interiors is not None:
+            # size the slots for the saved data before any storage is created
+            self.set_layout(self._infer_layout(0))
+        # opportunistic caching of recomputed states, see 'enable_cache'
+        self.cache = None
+        self.avoided_steps = 0
+        # slots given back during the reverse sweep, see 'enable_release'
+        self.releases = None
+        self.released = set()
+        # StoragePool that new storages are taken from, if any
+        self.pool = None
+        # timestep held by each checkpoint key, in the order of the saves
+        self.saved = {}
+        # call rev_operator.apply_fused for REVERSE actions, if it has one
+        self.fuse_reverse = True
+
+    def set_layout(self, layout, arrays=None):
+        """Validates the CheckpointLayout `layout` against the checkpoint, or
+        the fields `arrays` it was built from, and shares it with every
+        storage."""
+        if arrays is None:
+            arrays = self.checkpoint.get_data(0)
+        layout.validate(arrays)
+        if layout.nbytes > self.checkpoint.nbytes:
+            raise ValueError(
+                "LayoutError: checkpoint layout needs %d bytes, but "
+                "Checkpoint.nbytes is %d." % (layout.nbytes, self.checkpoint.nbytes)
+            )
+        self.layout = layout
+        for st in self.storage_list:
+            st.register_layout(layout)
 
     def addStorage(self, new_storage):
         self.storage_list.append(new_storage)
+        if self.layout is not None:
+            new_storage.register_layout(self.layout)
 
     def removeStorage(self, st_idx):
         if st_idx < len(self.storage_list):
@@ -116,12 +250,46 @@ class BaseRevolver(object):
     def resetStorageList(self):
         self.storage_list.clear()
 
+    def reset(self):
+        """Rewinds the scheduler and empties the storages, so that
+        apply_forward and apply_reverse can run again with the same
+        configuration. The schedule and the storage allocations are
+        reused."""
+        self.scheduler.reset()
+        for st in self.storage_list:
+            st.reset(keep_layout=True)
+        if self.cache is not None:
+            self.enable_cache()
+        self.released.clear()
+        self.saved.clear()
+
+    def use_pool(self, pool):
+        """Takes the storages created from now on from `pool`, a
+        StoragePool, or the process-wide one if `pool` is True"""
+        self.pool = storage_pool if pool is True else pool
+
+    def release_storage(self):
+        """Gives the storages taken from a StoragePool back to it and
+        empties the storage list. The revolver cannot run afterwards."""
+        for st in self.storage_list:
+            if st.pool is not None:
+                st.pool.release(st)
+        self.storage_list = []
+
+    def _new_storage(self, storage_type, n_ckp, **kwargs):
+        """Returns a storage_type with n_ckp slots for the checkpoint,
+        taken from the pool if there is one"""
+        if self.pool is not None:
+            return self.pool.acquire(storage_type, self._slot_size(), n_ckp,
+                                     self.checkpoint.dtype, profiler=self.profiler,
+                                     **kwargs)
+        return storage_type(self._slot_size(), n_ckp, self.checkpoint.dtype,
+                            profiler=self.profiler, **kwargs)
+
     def addDiskStorage(self, filedir="./", singlefile=False, wd=0, rd=0):
-        diskSt = DiskStorage(
-            self.checkpoint.size,
+        diskSt = self._new_storage(
+            DiskStorage,
             self.n_checkpoints,
-            self.checkpoint.dtype,
-            profiler=self.profiler,
             filedir=filedir,
             singlefile=singlefile,
             wd=wd,
@@ -130,16 +298,18 @@ class BaseRevolver(object):
         self.addStorage(diskSt)
         return len(self.storage_list) - 1  # st index
 
-    def addNumpyStorage(self, compression_params=None):
+    def addNumpyStorage(self, compression_params=None, elastic=False, hugepages=False,
+                        first_touch=None):
         npSt = None
         if compression_params is None:
             compression_params = {"scheme": None}
         if compression_params["scheme"] is None:
-            npSt = NumpyStorage(
-                self.checkpoint.size,
+            npSt = self._new_storage(
+                NumpyStorage,
                 self.n_checkpoints,
-                self.checkpoint.dtype,
-                profiler=self.profiler,
+                elastic=elastic,
+                hugepages=hugepages,
+                first_touch=first_touch,
             )
         else:
             compressor, decompressor = init(self.compression_params)
@@ -154,7 +324,7 @@ class BaseRevolver(object):
         self.addStorage(npSt)
         return len(self.storage_list) - 1  # st index
 
-    def addByteStorage(self, compression_params):
+    def addByteStorage(self, compression_params, capacity=None):
         compressor, decompressor = init(compression_params)
         npSt = BytesStorage(
             self.checkpoint.nbytes,
@@ -163,14 +333,45 @@ class BaseRevolver(object):
             auto_pickle=True,
             compression=(compressor, decompressor),
             profiler=self.profiler,
+            capacity=capacity,
         )
         self.addStorage(npSt)
         return len(self.storage_list) - 1  # st index
 
+    def addDeltaStorage(self, compression_params, max_chain=8, quantum=None):
+        compressor, decompressor = init(compression_params)
+        deltaSt = DeltaStorage(
+            self.checkpoint.nbytes,
+            self.n_checkpoints,
+            self.checkpoint.dtype,
+            compression=(compressor, decompressor),
+            max_chain=max_chain,
+            quantum=quantum,
+            auto_pickle=True,
+            profiler=self.profiler,
+        )
+        self.addStorage(deltaSt)
+        return len(self.storage_list) - 1  # st index
+
     @property
     def makespan(self):
         return 0
 
+    def _timer(self, section, name, action):
+        """Returns a profiler timer for a scheduler action. When tracing is
+        enabled, the action's position in the schedule is attached to the
+        traced event."""
+        if self.profiler.tracer is None:
+            return self.profiler.get_timer(section, name)
+        return self.profiler.get_timer(
+            section,
+            name,
+            capo=self.scheduler.capo,
+            old_capo=self.scheduler.old_capo,
+            st_idx=action.storageIndex(),
+            key=self.scheduler.cp_pointer,
+        )
+
     @property
     def ratio(self):
         return 0
@@ -178,96 +379,333 @@ class BaseRevolver(object):
     def apply_forward(self):
         """Executes only the forward computation while storing checkpoints,
         then returns."""
+        _run(self._forward_calls())
+
+    def apply_reverse(self):
+        """Executes only the backward computation while loading checkpoints,
+        then returns. The forward operator will be called as needed to
+        recompute sections of the trajectory that have not been stored in the
+        forward run."""
+        _run(self._reverse_calls())
+
+    async def async_apply_forward(self):
+        """Awaitable 'apply_forward', to drive the revolver from an asyncio
+        event loop. Operators are awaited (see 'Operator') and checkpoints
+        go through the storages' async_save, so that other coroutines, such
+        as other revolvers, run while this one computes or moves data. A
+        revolver must not be driven by two coroutines at once."""
+        await _async_run(self._forward_calls())
+
+    async def async_apply_reverse(self):
+        """Awaitable 'apply_reverse', see 'async_apply_forward'"""
+        await _async_run(self._reverse_calls())
+
+    def _forward_calls(self):
+        """Yields the calls of the forward sweep, see '_call'. Each call is
+        timed until the driver asks for the next one."""
         while True:
             # ask Revolve what to do next.
             action = self.scheduler.next()
             if action.type == Action.ADVANCE:
                 # advance forward computation
-                with self.profiler.get_timer("forward", "advance"):
-                    self.fwd_operator.apply(
-                        t_start=self.scheduler.old_capo, t_end=self.scheduler.capo
-                    )
+                with self._timer("forward", "advance", action):
+                    yield _call(self.fwd_operator.apply,
+                                t_start=self.scheduler.old_capo,
+                                t_end=self.scheduler.capo)
             elif action.type == Action.TAKESHOT:
                 # take a snapshot: copy from workspace into storage
-                with self.profiler.get_timer("forward", "takeshot"):
-                    self.save_checkpoint(action.storageIndex())
+                with self._timer("forward", "takeshot", action):
+                    yield _call(self.save_checkpoint, action.storageIndex(),
+                                awaitable=self.async_save_checkpoint)
             elif action.type == Action.CPDEL:
                 # remove a snapshot from the storage stack
-                with self.profiler.get_timer("forward", "remove"):
-                    self.remove_checkpoint(action.storageIndex())
+                with self._timer("forward", "remove", action):
+                    yield _call(self.remove_checkpoint, action.storageIndex(),
+                                awaitable=self.async_remove_checkpoint)
             elif action.type == Action.LASTFW:
                 # final step in the forward computation
-                with self.profiler.get_timer("forward", "lastfw"):
-                    self.fwd_operator.apply(
-                        t_start=self.scheduler.old_capo, t_end=self.n_timesteps
-                    )
-                break
+                with self._timer("forward", "lastfw", action):
+                    yield _call(self.fwd_operator.apply,
+                                t_start=self.scheduler.old_capo,
+                                t_end=self.n_timesteps)
+                self.profiler.sample_memory("forward")
+                return
             elif action.type == Action.REVERSE:
                 """HRevolve scheduler doesn't have an explicit LASTFW operation.
                 Because of that, aplly_forward ends when the first REVERSE
                 action is reached.
                 """
-                break
+                return
             else:
                 raise ValueError("Unknown action %s" % str(action))
 
-    def apply_reverse(self):
-        """Executes only the backward computation while loading checkpoints,
-        then returns. The forward operator will be called as needed to
-        recompute sections of the trajectory that have not been stored in the
-        forward run."""
-        action = None
+    def _reverse_calls(self):
+        """Yields the calls of the reverse sweep, see '_forward_calls'"""
         while True:
             # ask Revolve what to do next.
             action = self.scheduler.next()
+            if self.cache is not None:
+                self._cache_update(action)
             if action.type == Action.REVERSE:
                 # advance adjoint computation by a single step
-                with self.profiler.get_timer("reverse", "reverse"):
-                    self.fwd_operator.apply(
-                        t_start=self.scheduler.capo, t_end=self.scheduler.capo + 1
-                    )
-                    self.rev_operator.apply(
-                        t_start=self.scheduler.capo, t_end=self.scheduler.capo + 1
-                    )
+                with self._timer("reverse", "reverse", action):
+                    yield from self._step_calls(self.scheduler.capo)
             elif action.type == Action.REVSTART:
                 """Sets the rev_operator to 'nt' only if its not already there.
                 This condition happens when using CRevolve shceduler, but not
                 when using HRevolve.
                 """
-                with self.profiler.get_timer("reverse", "reverse"):
-                    self.rev_operator.apply(
-                        t_start=self.scheduler.capo, t_end=self.scheduler.capo + 1
-                    )
+                with self._timer("reverse", "reverse", action):
+                    yield _call(self.rev_operator.apply,
+                                t_start=self.scheduler.capo,
+                                t_end=self.scheduler.capo + 1)
             elif action.type == Action.TAKESHOT:
                 # take a snapshot: copy from workspace into storage
-                with self.profiler.get_timer("reverse", "takeshot"):
-                    self.save_checkpoint(action.storageIndex())
+                with self._timer("reverse", "takeshot", action):
+                    yield _call(self.save_checkpoint, action.storageIndex(),
+                                awaitable=self.async_save_checkpoint)
             elif action.type == Action.ADVANCE:
                 # advance forward computation
-                with self.profiler.get_timer("reverse", "advance"):
-                    self.fwd_operator.apply(
-                        t_start=self.scheduler.old_capo, t_end=self.scheduler.capo
-                    )
+                with self._timer("reverse", "advance", action):
+                    if self.cache is None:
+                        yield _call(self.fwd_operator.apply,
+                                    t_start=self.scheduler.old_capo,
+                                    t_end=self.scheduler.capo)
+                    else:
+                        yield from self._cached_advance_calls(self.scheduler.old_capo,
+                                                              self.scheduler.capo)
             elif action.type == Action.RESTORE:
                 # restore a snapshot: copy from storage into workspace
-                with self.profiler.get_timer("reverse", "restore"):
-                    self.load_checkpoint(action.storageIndex())
+                with self._timer("reverse", "restore", action):
+                    yield _call(self.load_checkpoint, action.storageIndex(),
+                                awaitable=self.async_load_checkpoint)
             elif action.type == Action.CPDEL:
                 # remove a snapshot from the storage stack
-                with self.profiler.get_timer("reverse", "remove"):
-                    self.remove_checkpoint(action.storageIndex())
+                with self._timer("reverse", "remove", action):
+                    yield _call(self.remove_checkpoint, action.storageIndex(),
+                                awaitable=self.async_remove_checkpoint)
             elif action.type == Action.TERMINATE:
-                break
+                self.profiler.sample_memory("reverse")
+                return
             else:
                 raise ValueError("Unknown action %s" % str(action))
+            if self.releases is not None:
+                self._release_slots(action)
+
+    def _reverse_step(self, timestep):
+        """Runs the forward and the reverse operator over `timestep`, fused
+        into one call if the reverse operator has apply_fused"""
+        _run(self._step_calls(timestep))
+
+    def _step_calls(self, timestep):
+        """Yields the calls of '_reverse_step'"""
+        fused = getattr(self.rev_operator, "apply_fused", None)
+        if self.fuse_reverse and fused is not None:
+            yield _call(fused, t_start=timestep, t_end=timestep + 1)
+        else:
+            yield _call(self.fwd_operator.apply, t_start=timestep, t_end=timestep + 1)
+            yield _call(self.rev_operator.apply, t_start=timestep, t_end=timestep + 1)
+
+    def _fetch_data(self, timestep=None):
+        """Returns the live data to be saved at `timestep`, by default the
+        current one. The first snapshot fixes the checkpoint layout, unless
+        the checkpoint provided one."""
+        if timestep is None:
+            timestep = self.scheduler.capo
+        data_pointers = self.checkpoint.get_data(timestep)
+        if self.layout is None:
+            self.set_layout(
+                CheckpointLayout.from_arrays(data_pointers, self._storage_dtypes(),
+                                             interiors=self.checkpoint.interiors),
+                data_pointers
+            )
+        return data_pointers
+
+    def _inplace(self, storage, timestep=None):
+        """Whether the next snapshot can be written straight into `storage`"""
+        if not (self.checkpoint.supports_inplace and storage.supports_inplace):
+            return False
+        if self.layout is None:
+            if timestep is None:
+                timestep = self.scheduler.capo
+            self.set_layout(self._infer_layout(timestep),
+                            self.checkpoint.get_data(timestep))
+        # fields stored in another dtype or only partially saved go through
+        # the storage's conversion
+        return not (self.layout.converted or self.layout.partial)
+
+    def _infer_layout(self, timestep):
+        """Builds the layout of the checkpoint from the shapes and dtypes of
+        its fields at `timestep`"""
+        return CheckpointLayout(self.checkpoint.get_data_shapes(timestep),
+                                self.checkpoint.get_data_dtypes(timestep),
+                                self._storage_dtypes(),
+                                interiors=self.checkpoint.interiors)
+
+    def _storage_dtypes(self):
+        storage_dtypes = self.checkpoint.storage_dtypes
+        if storage_dtypes is None:
+            return self.checkpoint.dtype
+        return list(storage_dtypes)
+
+    def _slot_size(self):
+        """Entries of `checkpoint.dtype` per storage slot: the whole
+        checkpoint, or only what the layout needs when it is known."""
+        if self.layout is None:
+            return self.checkpoint.size
+        itemsize = np.dtype(self.checkpoint.dtype).itemsize
+        return -(-self.layout.nbytes // itemsize)
+
+    def _slot(self, st_idx, key=None):
+        """Returns the storage and storage key that hold checkpoint `key`,
+        by default the current one"""
+        if key is None:
+            key = self.scheduler.cp_pointer
+        return self.storage_list[st_idx], key
 
     def save_checkpoint(self, st_idx=0):
-        data_pointers = self.checkpoint.get_data(self.scheduler.capo)
-        self.storage_list[st_idx].save(self.scheduler.cp_pointer, data_pointers)
+        self._save(st_idx, self.scheduler.cp_pointer, self.scheduler.capo)
 
     def load_checkpoint(self, st_idx=0):
-        locations = self.checkpoint.get_data_location(self.scheduler.capo)
-        self.storage_list[st_idx].load(self.scheduler.cp_pointer, locations)
+        self._load(st_idx, self.scheduler.cp_pointer, self.scheduler.capo)
+
+    def _save(self, st_idx, key, timestep):
+        _run(self._save_calls(st_idx, key, timestep))
+
+    def _load(self, st_idx, key, timestep):
+        _run(self._load_calls(st_idx, key, timestep))
+
+    def _save_calls(self, st_idx, key, timestep):
+        """Yields the calls saving the state at `timestep` as checkpoint
+        `key` of storage `st_idx`"""
+        self.saved.pop(key, None)
+        self.saved[key] = timestep
+        storage, key = self._slot(st_idx, key)
+        if self._inplace(storage, timestep):
+            # the checkpoint copies itself into the storage's memory
+            yield _call(self.checkpoint.fill_data, timestep, storage.acquire_slot(key))
+            storage.commit_slot(key)
+        else:
+            yield _call(storage.save, key, self._fetch_data(timestep),
+                        awaitable=storage.async_save)
+
+    def _load_calls(self, st_idx, key, timestep):
+        """Yields the calls restoring checkpoint `key` of storage `st_idx`"""
+        locations = self.checkpoint.get_data_location(timestep)
+        storage, key = self._slot(st_idx, key)
+        yield _call(storage.load, key, locations, awaitable=storage.async_load)
+
+    async def async_save_checkpoint(self, st_idx=0):
+        await _async_run(self._save_calls(st_idx, self.scheduler.cp_pointer,
+                                          self.scheduler.capo))
+
+    async def async_load_checkpoint(self, st_idx=0):
+        await _async_run(self._load_calls(st_idx, self.scheduler.cp_pointer,
+                                          self.scheduler.capo))
+
+    async def async_remove_checkpoint(self, st_idx=0):
+        return self.remove_checkpoint(st_idx)
+
+    def enable_release(self):
+        """
+        Gives checkpoint slots back to their storage as soon as the schedule
+        will not read them again in the current reverse sweep, so that an
+        elastic storage returns their memory to the OS while the adjoint
+        computation runs. Needs a schedule with an action list, such as
+        CRevolve and WeightedRevolve, and cannot be used with Retain,
+        whose slots are read again by every sweep.
+        """
+        oplist = self.scheduler.oplist
+        if oplist is None or isinstance(self.scheduler, Retain):
+            raise ValueError("RevolverError: releasing slots needs a single-sweep "
+                             "schedule with an action list.")
+        types = [a.type for a in oplist]
+        start = types.index(Action.REVSTART) if Action.REVSTART in types else 0
+        last = {}
+        for i, a in enumerate(oplist):
+            if a.type in (Action.TAKESHOT, Action.RESTORE):
+                last[a.ckp] = i
+        # keys to release after each action of the reverse sweep
+        self.releases = {}
+        for key, i in last.items():
+            if i >= start:
+                self.releases.setdefault(i - start, []).append(key)
+        self.released = set()
+        self.__reverse_index = 0
+
+    def _release_slots(self, action):
+        if action.type == Action.REVSTART:
+            self.__reverse_index = 0
+            self.released.clear()
+        else:
+            self.__reverse_index += 1
+        keys = self.releases.get(self.__reverse_index)
+        if keys:
+            for key in keys:
+                storage, st_key = self._slot(0, key)
+                storage.release(st_key)
+                self.released.add(key)
+            self.profiler.sample_memory("reverse")
+
+    def enable_cache(self):
+        """
+        Caches states recomputed during the reverse sweep in checkpoint
+        slots the schedule no longer needs, and starts later recomputations
+        from the closest cached state. Relies on the schedule using its keys
+        as a stack, as the single-level schedulers do: after saving or
+        restoring key k, the keys above k are free until saved again.
+        `avoided_steps` counts the forward steps saved.
+        """
+        self.cache = {}
+        self.avoided_steps = 0
+        self.__top = -1
+        self.__front = self.n_timesteps
+
+    def _cache_update(self, action):
+        """Tracks the keys and states the schedule still needs"""
+        if action.type in (Action.TAKESHOT, Action.RESTORE):
+            self.__top = self.scheduler.cp_pointer
+            if action.type == Action.TAKESHOT:
+                # saving a key may discard those above it in stacked storages
+                self._cache_drop(lambda key, t: key >= self.__top)
+        elif action.type in (Action.REVERSE, Action.REVSTART):
+            self.__front = self.scheduler.capo
+            # states at or after the last reversed step are never used again
+            self._cache_drop(lambda key, t: t >= self.__front)
+        elif action.type == Action.TERMINATE:
+            self.cache.clear()
+            self.__top = -1
+            self.__front = self.n_timesteps
+
+    def _cache_drop(self, condition):
+        for key, t in list(self.cache.items()):
+            if condition(key, t):
+                del self.cache[key]
+
+    def _cached_advance_calls(self, t_start, t_end):
+        """Yields the calls advancing from `t_start` to `t_end` during the
+        reverse sweep, starting from the latest cached state in between and
+        caching intermediate states in free slots"""
+        cached = [(t, key) for key, t in self.cache.items() if t_start < t <= t_end]
+        if cached:
+            t, key = max(cached)
+            yield from self._load_calls(0, key, t)
+            self.avoided_steps += t - t_start
+            t_start = t
+        pinned = getattr(self.scheduler, "n_forward_checkpoints", 0)
+        free = [key for key in range(max(self.__top + 1, pinned), self.n_checkpoints)
+                if key not in self.cache and key not in self.released]
+        n = max(min(len(free), t_end - t_start - 1), 0)
+        for i, key in enumerate(free[:n]):
+            t = t_start + (t_end - t_start) * (i + 1) // (n + 1)
+            if t > t_start:
+                yield _call(self.fwd_operator.apply, t_start=t_start, t_end=t)
+                self._cache_drop(lambda k, _: k > key)
+                yield from self._save_calls(0, key, t)
+                self.cache[key] = t
+                t_start = t
+        if t_end > t_start:
+            yield _call(self.fwd_operator.apply, t_start=t_start, t_end=t_end)
 
     def remove_checkpoint(self, st_idx=0):
         return NotImplemented
@@ -310,6 +748,17 @@ class SingleLevelRevolver(BaseRevolver):
         diskstorage=False,
         filedir="./",
         singlefile=True,
+        costs=None,
+        reverse_costs=None,
+        memory_budget=None,
+        checkpoint_sizes=None,
+        retain=False,
+        cache=False,
+        elastic=False,
+        hugepages=False,
+        first_touch=None,
+        pool=None,
+        scheduler=None,
     ):
         """
         Initializes a single-level Revolver
@@ -325,7 +774,43 @@ class SingleLevelRevolver(BaseRevolver):
             diskstorage:        True for using disk storage
             filedir:            disk storage directory
             singlefile:         True for single-file disk storage
+            costs:              forward cost of each timestep; when given,
+                                the WeightedRevolve scheduler is used
+            reverse_costs:      reverse cost of each timestep
+            memory_budget:      bytes available for checkpoints; replaces
+                                n_checkpoints, and checkpoints are packed
+                                into a single in-memory buffer
+            checkpoint_sizes:   bytes of the checkpoint of each timestep,
+                                or a function of the timestep predicting
+                                them (default checkpoint.nbytes)
+            retain:             keep the forward checkpoints, so that
+                                apply_reverse can be called repeatedly
+                                after a single apply_forward
+            cache:              cache recomputed states in free slots,
+                                see 'enable_cache'
+            elastic:            return the memory of slots to the OS once
+                                the reverse sweep is done with them, see
+                                'enable_release'
+            hugepages:          back the slots with transparent huge pages
+            first_touch:        threads, or CPU sets of the threads (see
+                                'omp_placement'), of the forward operator,
+                                which fault in the slots before use so that
+                                they are placed on the right NUMA nodes
+            pool:               StoragePool to take the uncompressed
+                                storages from (True for the process-wide
+                                one), see 'release_storage'
+            scheduler:          precomputed single-level scheduler, such
+                                as a SharedSchedule, used instead of
+                                building one; replaces n_checkpoints
         """
+        in_memory = not (diskstorage or memory_budget is not None
+                         or (compression_params or {}).get("scheme") is not None)
+        if elastic and (retain or not in_memory):
+            raise ValueError("RevolverError: elastic memory needs uncompressed "
+                             "in-memory storage and a single reverse sweep.")
+        if (hugepages or first_touch is not None) and not in_memory:
+            raise ValueError("RevolverError: huge pages and first-touch placement "
+                             "need uncompressed in-memory storage.")
         super().__init__(
             checkpoint,
             fwd_operator,
@@ -338,26 +823,79 @@ class SingleLevelRevolver(BaseRevolver):
 
         self.filedir = filedir
         self.singlefile = singlefile
-
-        if n_checkpoints is None:
-            self.n_checkpoints = cr.adjust(n_timesteps)
+        self.use_pool(pool)
+
+        if scheduler is not None:
+            if memory_budget is not None or costs is not None \
+                    or reverse_costs is not None:
+                raise ValueError("RevolverError: a precomputed scheduler cannot "
+                                 "take costs or a memory budget.")
+            self.scheduler = scheduler
+            self.n_checkpoints = scheduler.n_checkpoints
+        elif memory_budget is not None:
+            if diskstorage:
+                raise ValueError("RevolverError: a memory budget needs in-memory "
+                                 "storage.")
+            if cache:
+                raise ValueError("RevolverError: caching needs fixed-size slots, "
+                                 "not a memory budget.")
+            if checkpoint_sizes is None:
+                checkpoint_sizes = [checkpoint.nbytes] * n_timesteps
+            self.scheduler = WeightedRevolve(None, self.n_timesteps, costs=costs,
+                                             reverse_costs=reverse_costs,
+                                             sizes=checkpoint_sizes,
+                                             memory_budget=memory_budget)
+            self.n_checkpoints = self.scheduler.n_checkpoints
         else:
-            self.n_checkpoints = n_checkpoints
+            if n_checkpoints is None:
+                self.n_checkpoints = cr.adjust(n_timesteps)
+            else:
+                self.n_checkpoints = n_checkpoints
 
-        self.scheduler = CRevolve(self.n_checkpoints, self.n_timesteps)
+            if costs is None and reverse_costs is None:
+                self.scheduler = CRevolve(self.n_checkpoints, self.n_timesteps)
+            else:
+                self.scheduler = WeightedRevolve(self.n_checkpoints, self.n_timesteps,
+                                                 costs=costs,
+                                                 reverse_costs=reverse_costs)
+
+        if retain:
+            self.scheduler = Retain(self.scheduler)
+            self.n_checkpoints = self.scheduler.n_checkpoints
+            logger.info("Retaining %d forward checkpoints takes %d extra slots"
+                        % (self.scheduler.n_forward_checkpoints,
+                           self.scheduler.extra_checkpoints))
 
         # remove storage list to avoid memory overflow
         self.resetStorageList()
-        if diskstorage is True:
+        if memory_budget is not None:
+            self.compression_params = compression_params or {"scheme": None}
+            self.addByteStorage(self.compression_params, capacity=memory_budget)
+        elif diskstorage is True:
             self.addDiskStorage(filedir=self.filedir, singlefile=self.singlefile)
         else:
             self.compression_params = compression_params
-            self.addNumpyStorage(compression_params)
+            self.addNumpyStorage(compression_params, elastic=elastic,
+                                 hugepages=hugepages, first_touch=first_touch)
+        if cache:
+            self.enable_cache()
+        if elastic:
+            self.enable_release()
 
     @property
     def ratio(self):
         return self.scheduler.ratio
 
+    @property
+    def retain_extra_bytes(self):
+        """Storage needed on top of the plain schedule to retain the forward
+        checkpoints, or 0 without retain"""
+        if not isinstance(self.scheduler, Retain):
+            return 0
+        extra = self.scheduler.n_checkpoints - self.scheduler.scheduler.n_checkpoints
+        slot_nbytes = self._slot_size() * np.dtype(self.checkpoint.dtype).itemsize
+        return max(extra, 0) * slot_nbytes
+
     def storage_ckps(self, k=0):
         """Returns a list of all checkpoint keys stored at the k-th
         storage level"""
@@ -471,8 +1009,12 @@ class MultiLevelRevolver(BaseRevolver):
         return self.scheduler.storage(k)
 
     def save_checkpoint(self, st_idx=0):
-        data_pointers = self.checkpoint.get_data(self.scheduler.capo)
-        self.storage_list[st_idx].push(data_pointers)
+        storage = self.storage_list[st_idx]
+        if self._inplace(storage):
+            self.checkpoint.fill_data(self.scheduler.capo, storage.acquire_push())
+            storage.commit_push()
+        else:
+            storage.push(self._fetch_data())
 
     def load_checkpoint(self, st_idx=0):
         locations = self.checkpoint.get_data_location(self.scheduler.capo)
@@ -482,6 +1024,18 @@ class MultiLevelRevolver(BaseRevolver):
         locations = self.checkpoint.get_data_location(self.scheduler.capo)
         self.storage_list[st_idx].pop(locations)
 
+    # the storage stacks have no asynchronous interface: their operations
+    # run in the executor as a whole
+
+    async def async_save_checkpoint(self, st_idx=0):
+        await _await_call(self.save_checkpoint, st_idx)
+
+    async def async_load_checkpoint(self, st_idx=0):
+        await _await_call(self.load_checkpoint, st_idx)
+
+    async def async_remove_checkpoint(self, st_idx=0):
+        await _await_call(self.remove_checkpoint, st_idx)
+
 
 class MemoryRevolver(SingleLevelRevolver):
     """
@@ -502,6 +1056,7 @@ class MemoryRevolver(SingleLevelRevolver):
         timings=None,
         profiler=None,
         compression_params=None,
+        pool=None,
     ):
         super().__init__(
             checkpoint,
@@ -513,6 +1068,7 @@ class MemoryRevolver(SingleLevelRevolver):
             profiler=profiler,
             compression_params=compression_params,
             diskstorage=False,
+            pool=pool,
         )
 
 
@@ -529,6 +1085,11 @@ class DiskRevolver(SingleLevelRevolver):
           storage file is used. (default = single file).
         - The storage file is removed by default when storage
           object is destroyed.
+    With 'minimize_writes', the number of checkpoints is chosen, among
+    those whose recomputation stays within 'recompute_tolerance' of the
+    one of 'n_checkpoints', as the one that writes the fewest snapshots.
+    With 'fast_slots', the slots written and read most often are kept in
+    memory instead of on disk.
     """
 
     def __init__(
@@ -542,7 +1103,26 @@ class DiskRevolver(SingleLevelRevolver):
         profiler=None,
         filedir="./",
         singlefile=True,
+        minimize_writes=False,
+        recompute_tolerance=0.0,
+        fast_slots=0,
+        pool=None,
     ):
+        """
+        Initializes a disk-based Revolver
+        @params:
+            minimize_writes:     choose the number of checkpoints that
+                                 minimizes disk writes
+            recompute_tolerance: relative increase in forward steps accepted
+                                 when minimizing writes
+            fast_slots:          number of checkpoint slots kept in memory
+            pool:                StoragePool to take the storages from
+        """
+        if n_checkpoints is None:
+            n_checkpoints = cr.adjust(n_timesteps)
+        if minimize_writes:
+            n_checkpoints = fewest_writes(n_checkpoints, n_timesteps,
+                                          recompute_tolerance)
         super().__init__(
             checkpoint,
             fwd_operator,
@@ -554,7 +1134,294 @@ class DiskRevolver(SingleLevelRevolver):
             diskstorage=True,
             filedir=filedir,
             singlefile=singlefile,
+            pool=pool,
+        )
+        self.placement = None
+        if fast_slots > 0:
+            self._place_slots(min(fast_slots, self.n_checkpoints))
+
+    def _place_slots(self, fast_slots):
+        """Maps the `fast_slots` busiest slots to a NumpyStorage, and the
+        others to the DiskStorage"""
+        writes, reads = self.scheduler.write_counts, self.scheduler.read_counts
+        busiest = sorted(range(self.n_checkpoints),
+                         key=lambda k: (-(writes[k] + reads[k]), k))
+        levels = [(sorted(busiest[fast_slots:]), DiskStorage,
+                   dict(filedir=self.filedir, singlefile=self.singlefile)),
+                  (sorted(busiest[:fast_slots]), NumpyStorage, {})]
+
+        self.release_storage()
+        self.placement = {}
+        for keys, storage, kwargs in levels:
+            if not keys:
+                continue
+            self.addStorage(self._new_storage(storage, len(keys), **kwargs))
+            st_idx = len(self.storage_list) - 1
+            for local, key in enumerate(keys):
+                self.placement[key] = (st_idx, local)
+
+    def _slot(self, st_idx, key=None):
+        if self.placement is None:
+            return super()._slot(st_idx, key)
+        if key is None:
+            key = self.scheduler.cp_pointer
+        st_idx, key = self.placement[key]
+        return self.storage_list[st_idx], key
+
+
+def fewest_writes(n_checkpoints, n_timesteps, recompute_tolerance=0.0):
+    """
+    Returns the number of checkpoints, at most `n_checkpoints`, whose
+    Revolve schedule writes the fewest snapshots while recomputing at most
+    `1 + recompute_tolerance` times the forward steps of the schedule
+    with `n_checkpoints`. Ties go to the fewer checkpoints.
+    """
+    bound = (1 + recompute_tolerance) * cr.numforw(n_timesteps, n_checkpoints)
+    best, best_writes = n_checkpoints, None
+    for c in range(1, n_checkpoints + 1):
+        if cr.numforw(n_timesteps, c) > bound:
+            continue
+        writes = sum(slot_counts(c, n_timesteps)[0])
+        if best_writes is None or writes < best_writes:
+            best, best_writes = c, writes
+    return best
+
+
+class StoreAllRevolver(BaseRevolver):
+    """
+    Revolver that stores the (compressed) forward trajectory instead of
+    recomputing it, using the StoreAll scheduler. When compression shrinks
+    checkpoints enough, keeping every timestep (or every `stride`-th one,
+    with a short recomputation in between) beats Revolve's recomputation.
+    Checkpoints go to a BytesStorage packed into `capacity` bytes, or to a
+    DiskStorage. See 'select_revolver' to pick this mode automatically.
+
+    With `fallback_checkpoints`, a forward sweep whose compressed
+    trajectory overflows `capacity` is not lost: the state of timestep 0
+    is restored from the storage and the sweep restarts under Revolve
+    with that many uncompressed checkpoints, as a MemoryRevolver would.
+    """
+
+    def __init__(
+        self,
+        checkpoint,
+        fwd_operator,
+        rev_operator,
+        n_timesteps,
+        stride=1,
+        compression_params=None,
+        capacity=None,
+        timings=None,
+        profiler=None,
+        diskstorage=False,
+        filedir="./",
+        singlefile=True,
+        cache=False,
+        fallback_checkpoints=None,
+    ):
+        """
+        Initializes a store-all Revolver
+        @params:
+            checkpoint:         checkpoint object
+            fwd_operator:       forward operator
+            rev_operator:       backward operator
+            n_timesteps:        number of timesteps
+            stride:             timesteps between stored checkpoints
+            compression_params: compression scheme
+            capacity:           bytes of the packed in-memory storage (by
+                                default, one uncompressed slot per checkpoint)
+            timings:            timings
+            profiler:           Profiler
+            diskstorage:        True for using disk storage
+            filedir:            disk storage directory
+            singlefile:         True for single-file disk storage
+            cache:              cache states recomputed within a stride in
+                                the slots of reversed strides, see
+                                'enable_cache'
+            fallback_checkpoints: number of Revolve checkpoints to continue
+                                with if `capacity` is exceeded
+        """
+        if cache and capacity is not None:
+            raise ValueError("RevolverError: caching needs fixed-size slots, "
+                             "not a packed capacity.")
+        scheduler = StoreAll(n_timesteps, stride)
+        super().__init__(
+            checkpoint,
+            fwd_operator,
+            rev_operator,
+            max(scheduler.n_checkpoints, 1),
+            n_timesteps,
+            scheduler=scheduler,
+            timings=timings,
+            profiler=profiler,
         )
+        self.stride = stride
+        self.fallback_checkpoints = fallback_checkpoints
+        self.resetStorageList()
+        if diskstorage is True:
+            self.addDiskStorage(filedir=filedir, singlefile=singlefile)
+        else:
+            if compression_params is None:
+                compression_params = {"scheme": None}
+            compressor, decompressor = init(compression_params)
+            self.addStorage(BytesStorage(
+                self.checkpoint.nbytes,
+                self.n_checkpoints,
+                self.checkpoint.dtype,
+                compression=(compressor, decompressor),
+                auto_pickle=True,
+                profiler=self.profiler,
+                capacity=capacity,
+            ))
+        if cache:
+            self.enable_cache()
+
+    @property
+    def ratio(self):
+        return self.scheduler.ratio
+
+    def storage_ckps(self, k=0):
+        return self.scheduler.storage(k)
+
+    @property
+    def fell_back(self):
+        """Whether the forward sweep switched to Revolve"""
+        return not isinstance(self.scheduler, StoreAll)
+
+    def apply_forward(self):
+        try:
+            super().apply_forward()
+        except CapacityExceeded:
+            if self.fallback_checkpoints is None:
+                raise
+            self._fall_back()
+            super().apply_forward()
+
+    async def async_apply_forward(self):
+        try:
+            await super().async_apply_forward()
+        except CapacityExceeded:
+            if self.fallback_checkpoints is None:
+                raise
+            self._fall_back()
+            await super().async_apply_forward()
+
+    def _fall_back(self):
+        """Restores timestep 0 and replaces the store-all schedule and
+        storage with Revolve over `fallback_checkpoints` NumpyStorage slots"""
+        if 0 in self.saved:
+            self._load(0, 0, 0)
+        n_checkpoints = self.fallback_checkpoints
+        logger.warning("Compressed trajectory exceeds %d bytes, restarting the "
+                       "forward sweep with Revolve and %d checkpoints"
+                       % (self.storage_list[0].capacity, n_checkpoints))
+        self.release_storage()
+        self.n_checkpoints = n_checkpoints
+        self.scheduler = CRevolve(n_checkpoints, self.n_timesteps)
+        self.saved.clear()
+        self.addNumpyStorage()
+
+    def report(self):
+        """Returns a dict comparing the measured run with Revolve under the
+        same memory: the compression ratio and peak memory achieved, the
+        measured time, and the time Revolve is predicted to take, i.e. the
+        same run without checkpoint I/O plus the extra forward steps
+        Revolve recomputes with as many uncompressed checkpoints as fit in
+        the peak memory used here."""
+        stats = self.storage_list[0].stats()
+        timings = self.profiler.timings
+        forward_time = sum(timings.get("forward", {}).values())
+        reverse_time = sum(timings.get("reverse", {}).values())
+        storage_time = (timings.get("forward", {}).get("takeshot", 0)
+                        + timings.get("reverse", {}).get("restore", 0))
+        step_time = forward_time / self.n_timesteps
+        forward_steps = int(round(self.ratio * self.n_timesteps))
+        revolve_ncp = max(1, min(stats["peak_bytes"] // self.checkpoint.nbytes,
+                                 self.n_timesteps - 1))
+        revolve_steps = cr.numforw(self.n_timesteps, revolve_ncp)
+        total_time = forward_time + reverse_time
+        revolve_time = (total_time - storage_time
+                        + (revolve_steps - forward_steps) * step_time)
+        return {
+            "n_timesteps": self.n_timesteps,
+            "stride": self.stride,
+            "n_checkpoints": self.scheduler.n_checkpoints,
+            "compression_ratio": stats["compression_ratio"],
+            "peak_bytes": stats["peak_bytes"],
+            "forward_steps": forward_steps,
+            "forward_time": forward_time,
+            "reverse_time": reverse_time,
+            "storage_time": storage_time,
+            "total_time": total_time,
+            "revolve_checkpoints": revolve_ncp,
+            "revolve_forward_steps": revolve_steps,
+            "revolve_predicted_time": revolve_time,
+            "speedup": revolve_time / total_time if total_time else 1.,
+        }
+
+
+def estimate_compression_ratio(checkpoint, compression_params, timestep=0):
+    """Compresses the live data of `checkpoint` at `timestep` and returns
+    the achieved compression ratio. Early states of a simulation are often
+    much more compressible than later ones, so call it once the live data
+    is representative of the whole run, not on the initial state."""
+    compressor, _ = init(compression_params)
+    data = checkpoint.get_data(timestep)
+    raw = sum(x.nbytes for x in data)
+    compressed = sum(len(compressor(x).data) for x in data)
+    return raw / max(compressed, 1)
+
+
+def select_revolver(
+    checkpoint,
+    fwd_operator,
+    rev_operator,
+    n_timesteps,
+    memory_budget,
+    compression_params=None,
+    stride=1,
+    compression_ratio=None,
+    profiler=None,
+):
+    """
+    Returns a StoreAllRevolver if the compressed trajectory is predicted to
+    fit in `memory_budget` bytes, otherwise a MemoryRevolver with as many
+    uncompressed checkpoints as fit in the budget. Should the prediction
+    prove optimistic, the StoreAllRevolver falls back to Revolve with that
+    many checkpoints during the forward sweep instead of failing.
+    @params:
+        memory_budget:      bytes available for checkpoints
+        compression_params: compression scheme of the stored trajectory
+        stride:             timesteps between stored checkpoints
+        compression_ratio:  expected compression ratio, required with a
+                            compression scheme, e.g. measured with
+                            'estimate_compression_ratio' on a representative
+                            state of a previous run
+    """
+    if compression_params is None:
+        compression_params = {"scheme": None}
+    if compression_ratio is None:
+        if compression_params.get("scheme") is not None:
+            raise ValueError("RevolverError: compression_ratio must be given with "
+                             "a compression scheme, see "
+                             "'estimate_compression_ratio'.")
+        compression_ratio = 1.
+    revolve_checkpoints = max(1, int(memory_budget // checkpoint.nbytes))
+    n_checkpoints = StoreAll(n_timesteps, stride).n_checkpoints
+    predicted = n_checkpoints * checkpoint.nbytes / compression_ratio
+    if predicted <= memory_budget:
+        logger.info("Storing the whole trajectory: %d bytes predicted, "
+                    "%d available" % (predicted, memory_budget))
+        return StoreAllRevolver(checkpoint, fwd_operator, rev_operator, n_timesteps,
+                                stride=stride, compression_params=compression_params,
+                                capacity=int(memory_budget), profiler=profiler,
+                                fallback_checkpoints=revolve_checkpoints)
+    n_checkpoints = revolve_checkpoints
+    logger.info("Using Revolve with %d checkpoints: storing the trajectory "
+                "needs %d bytes, %d available"
+                % (n_checkpoints, predicted, memory_budget))
+    return MemoryRevolver(checkpoint, fwd_operator, rev_operator, n_checkpoints,
+                          n_timesteps, profiler=profiler)
 
 
 """ To keep backward compatibility with previous testcases
@@ -1,6 +1,10 @@
 from .base import Action, Scheduler, Architecture # noqa
-from .crevolve import CAction, CRevolve # noqa
+from .crevolve import CAction, CRevolve, slot_counts # noqa
 from .hrevolve import HAction, HRevolve # noqa
+from .storeall import SAction, StoreAll # noqa
+from .wrevolve import WAction, WeightedRevolve # noqa
+from .retain import RAction, Retain # noqa
+from .shared import SharedAction, SharedSchedule, schedule_array # noqa
 
 # defines Revolve name for backward compatibility
 Revolve = CRevolve
@@ -132,6 +132,13 @@ class Scheduler(object):
     def next(self):
         return NotImplemented
 
+    def reset(self):
+        """Rewinds the scheduler to the first action of its schedule,
+        without computing the schedule again"""
+        raise NotImplementedError(
+            "%s cannot be reset" % type(self).__name__
+        )
+
     @property
     def capo(self):
         return 0
@@ -2,9 +2,22 @@ try:
     import pyrevolve.crevolve as cr
 except ImportError:
     import crevolve as cr
+from collections import Counter
+from math import comb
 from .base import Action, Scheduler
 
 
+def slot_counts(n_checkpoints, n_timesteps):
+    """Returns the number of writes and of reads of each checkpoint slot in
+    the Revolve schedule. Uses the closed forms of revolve.cpp where they
+    are exact, and counts the actions of the schedule otherwise."""
+    if n_checkpoints >= n_timesteps - 1 or n_timesteps <= comb(n_checkpoints + 3, 3):
+        return (cr.write_counts(n_timesteps, n_checkpoints),
+                cr.read_counts(n_timesteps, n_checkpoints))
+    scheduler = CRevolve(n_checkpoints, n_timesteps)
+    return scheduler.write_counts, scheduler.read_counts
+
+
 class CAction(Action):
     """
     This class is an specialization of the Action
@@ -21,7 +34,9 @@ class CAction(Action):
 class CRevolve(Scheduler):
     """
     Scheduler class based on the CPP implementation of
-    the traditional Revolve Algorithm
+    the traditional Revolve Algorithm. The C++ state machine can only
+    run once, so the schedule is recorded on construction and replayed
+    from the action list, which lets 'reset' rewind it.
     """
 
     translations = {
@@ -40,40 +55,63 @@ class CRevolve(Scheduler):
         self.__oplist = []
         self.__stored_ckps = []
         self.__ratio = self.__calc_ratio()
-        self.revolve = cr.CRevolve(n_checkpoints, n_timesteps, None)
+        self.reset()
 
     def __calc_ratio(self):
         fcomp = 0
-        ca = self.next()
+        ca = self.__revolve_next()
         self.__oplist.append(ca)
         while ca.type != Action.TERMINATE:
             if (ca.type == Action.ADVANCE) or (ca.type == Action.LASTFW):
                 st = ca.old_capo
                 end = ca.capo
                 fcomp += (end-st)
-            ca = self.next()
+            ca = self.__revolve_next()
             self.__oplist.append(ca)
 
         return (fcomp/self.n_timesteps)
 
+    def reset(self):
+        """Rewinds the scheduler to the first action of the schedule"""
+        self.__next = iter(self.__oplist)
+        self.__action = CAction(Action.ADVANCE, 0, 0, 0)
+
     @property
     def oplist(self):
         return self.__oplist
 
+    def __count(self, action_type):
+        counts = Counter(a.ckp for a in self.__oplist if a.type == action_type)
+        return [counts[i] for i in range(self.n_checkpoints)]
+
+    @property
+    def write_counts(self):
+        """Number of times each checkpoint slot is written"""
+        return self.__count(Action.TAKESHOT)
+
+    @property
+    def read_counts(self):
+        """Number of times each checkpoint slot is read"""
+        return self.__count(Action.RESTORE)
+
     def next(self):
+        self.__action = next(self.__next, self.__oplist[-1])
+        return self.__action
+
+    def __revolve_next(self):
         if self.__revstart_action is None:
             ca = CAction(
                 action_type=self.translations[self.revolve.revolve()],
-                capo=self.capo,
-                old_capo=self.old_capo,
-                ckp=self.cp_pointer,
+                capo=self.revolve.capo,
+                old_capo=self.revolve.oldcapo,
+                ckp=self.revolve.check,
             )
             if ca.type is Action.LASTFW:
                 self.__revstart_action = CAction(
                     action_type=Action.REVSTART,
-                    capo=self.capo,
-                    old_capo=self.old_capo,
-                    ckp=self.cp_pointer,
+                    capo=ca.capo,
+                    old_capo=ca.old_capo,
+                    ckp=ca.ckp,
                 )
             if ca.type is Action.TAKESHOT:
                 self.__stored_ckps.append(ca.capo)
@@ -84,15 +122,15 @@ class CRevolve(Scheduler):
 
     @property
     def capo(self):
-        return self.revolve.capo
+        return self.__action.capo
 
     @property
     def old_capo(self):
-        return self.revolve.oldcapo
+        return self.__action.old_capo
 
     @property
     def cp_pointer(self):
-        return self.revolve.check
+        return self.__action.ckp
 
     @property
     def ratio(self):
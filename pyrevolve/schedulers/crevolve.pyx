@@ -3,6 +3,7 @@
 from .schedulers cimport revolve_c
 
 from enum import Enum
+import array
 import warnings
 
 from .tools import OutputGrabber
@@ -48,6 +49,23 @@ def expense(timesteps, snapshots):
     cdef int c_sn = snapshots
     return revolve_c.revolve_expense(c_st, c_sn)
 
+def write_counts(timesteps, snapshots):
+    """Returns the number of times each checkpoint slot is written by the
+    offline Revolve schedule for `timesteps` steps and `snapshots` slots.
+    The closed form is exact for schedules with at most three sweeps,
+    i.e. timesteps <= binomial(snapshots + 3, 3)."""
+    r = CRevolve(snapshots, timesteps)
+    return [r.get_number_of_writes_i(timesteps, snapshots, i)
+            for i in range(snapshots)]
+
+def read_counts(timesteps, snapshots):
+    """Returns the number of times each checkpoint slot is read by the
+    offline Revolve schedule for `timesteps` steps and `snapshots` slots.
+    Exact under the same condition as `write_counts`."""
+    r = CRevolve(snapshots, timesteps)
+    return [r.get_number_of_reads_i(timesteps, snapshots, i)
+            for i in range(snapshots)]
+
 cdef class CRevolve(object):
     cdef revolve_c.CRevolve __r
 
@@ -144,6 +162,33 @@ cdef class CRevolve(object):
         cdef int c_final = final
         revolve_c.revolve_turn(self.__r, c_final)
 
+    def get_write_and_read_counts(self):
+        """Returns the number of writes plus reads of each checkpoint slot
+        in the offline schedule"""
+        cdef int n = revolve_c.revolve_get_write_and_read_counts(self.__r, NULL, 0)
+        cdef int[::1] counts
+        if n <= 0:
+            return []
+        counts = array.array("i", [0] * n)
+        revolve_c.revolve_get_write_and_read_counts(self.__r, &counts[0], n)
+        return list(counts)
+
+    def get_number_of_writes_i(self, l, c, i):
+        """Returns how many times checkpoint `i` is written when reversing
+        `l` steps with `c` checkpoint slots"""
+        cdef int c_l = l
+        cdef int c_c = c
+        cdef int c_i = i
+        return revolve_c.revolve_get_number_of_writes_i(self.__r, c_l, c_c, c_i)
+
+    def get_number_of_reads_i(self, l, c, i):
+        """Returns how many times checkpoint `i` is read when reversing
+        `l` steps with `c` checkpoint slots"""
+        cdef int c_l = l
+        cdef int c_c = c
+        cdef int c_i = i
+        return revolve_c.revolve_get_number_of_reads_i(self.__r, c_l, c_c, c_i)
+
     def __del__(self):
         revolve_c.revolve_destroy(self.__r)
 
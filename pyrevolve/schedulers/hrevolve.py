@@ -662,6 +662,15 @@ class HRevolve(Scheduler):
     def resetSequence(self):
         self.__copindex = 0
 
+    def reset(self):
+        """Rewinds the scheduler to the first operation of the sequence"""
+        self.resetSequence()
+        self.__capo = 0
+        self.__old_capo = 0
+        self.__last_capo_read = -1
+        self.__last_stidx_read = -1
+        self.__last_action = None
+
     @property
     def oplist(self):
         return self.__oplist
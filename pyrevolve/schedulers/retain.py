@@ -0,0 +1,134 @@
+from .base import Action, Scheduler
+
+
+class RAction(Action):
+    """
+    This class is an specialization of the Action
+    base class for the Retain scheduler
+    """
+
+    def __init__(self, action_type, capo, old_capo, ckp):
+        super().__init__(action_type, capo, old_capo, ckp)
+
+    def storageIndex(self):
+        return 0
+
+
+class Retain(Scheduler):
+    """
+    Wraps a single-level scheduler with a CRevolve-like action list (CRevolve,
+    WeightedRevolve) so that its reverse sweep can be run several times over
+    one forward sweep. Checkpoints taken in the forward sweep keep their keys
+    and are never overwritten; checkpoints taken while reversing go to
+    scratch keys above them. After TERMINATE, the next action starts a new
+    reverse sweep from the last forward checkpoint, which recomputes the end
+    of the trajectory instead of the whole forward run.
+    """
+
+    def __init__(self, scheduler):
+        oplist = scheduler.oplist
+        if oplist is None:
+            raise ValueError("SchedulerError: Retain needs a scheduler with an "
+                             "action list.")
+        super().__init__(scheduler.n_checkpoints, scheduler.n_timesteps)
+        self.scheduler = scheduler
+        types = [a.type for a in oplist]
+        if Action.REVSTART not in types:
+            raise ValueError("SchedulerError: Retain needs a schedule with a "
+                             "REVSTART action.")
+        revstart = types.index(Action.REVSTART)
+        forward = oplist[:revstart]
+        shots = [a for a in forward if a.type == Action.TAKESHOT]
+        self.n_forward_checkpoints = len(shots)
+        self.__forward = [RAction(a.type, a.capo, a.old_capo, a.ckp) for a in forward]
+        self.__reverse = self.__remap(oplist[revstart:])
+        self.n_checkpoints = self.n_forward_checkpoints + self.extra_checkpoints
+
+        # a replayed sweep resumes from the last forward checkpoint
+        self.__replay = []
+        if shots:
+            last, nt = shots[-1], self.n_timesteps
+            self.__replay.append(RAction(Action.RESTORE, last.capo, last.capo,
+                                         last.ckp))
+            if last.capo < nt - 1:
+                self.__replay.append(RAction(Action.ADVANCE, nt - 1, last.capo,
+                                             last.ckp))
+            self.__replay.append(RAction(Action.REVERSE, nt - 1, nt - 1, last.ckp))
+        self.reset()
+
+    def __remap(self, actions):
+        """Moves the checkpoints of the reverse sweep to scratch keys.
+        A checkpoint saved at key k supersedes every key >= k, so the
+        scratch keys in use are those held by keys below k."""
+        n_forward = self.n_forward_checkpoints
+        current = {k: k for k in range(n_forward)}
+        self.extra_checkpoints = 0
+        remapped = []
+        for a in actions:
+            key = a.ckp
+            if a.type == Action.TAKESHOT:
+                used = set(v for k, v in current.items() if k < a.ckp)
+                key = n_forward
+                while key in used:
+                    key += 1
+                current[a.ckp] = key
+                self.extra_checkpoints = max(self.extra_checkpoints,
+                                             key - n_forward + 1)
+            elif a.type == Action.RESTORE:
+                key = current[a.ckp]
+            remapped.append(RAction(a.type, a.capo, a.old_capo, key))
+        return remapped
+
+    @property
+    def oplist(self):
+        return self.__forward + self.__reverse
+
+    def reset(self):
+        """Rewinds the scheduler to the start of the forward sweep"""
+        self.n_sweeps = 0
+        self.__capo = 0
+        self.__old_capo = 0
+        self.__cp_pointer = 0
+        self.__next = iter(self.__forward + self.__reverse)
+
+    def next(self):
+        action = next(self.__next, None)
+        if action is None:
+            # start another reverse sweep over the retained checkpoints
+            if not self.__replay:
+                raise ValueError("SchedulerError: no checkpoint was retained to "
+                                 "replay the reverse sweep from.")
+            self.__next = iter(self.__replay + self.__reverse[1:])
+            action = next(self.__next)
+        if action.type == Action.TERMINATE:
+            self.n_sweeps += 1
+        self.__capo = action.capo
+        self.__old_capo = action.old_capo
+        self.__cp_pointer = action.ckp
+        return action
+
+    @property
+    def capo(self):
+        return self.__capo
+
+    @property
+    def old_capo(self):
+        return self.__old_capo
+
+    @property
+    def cp_pointer(self):
+        return self.__cp_pointer
+
+    @property
+    def ratio(self):
+        return self.scheduler.ratio
+
+    @property
+    def replay_ratio(self):
+        """Steps advanced per timestep by each additional reverse sweep"""
+        steps = sum(a.capo - a.old_capo for a in self.__replay + self.__reverse
+                    if a.type == Action.ADVANCE)
+        return steps / self.n_timesteps
+
+    def storage(self, k):
+        return self.scheduler.storage(k)
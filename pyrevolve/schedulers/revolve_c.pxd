@@ -33,3 +33,6 @@ cdef extern from "../include/revolve_c.h":
     cdef int revolve_getwhere(CRevolve r)
     #cdef void revolve_setinfo(CRevolve r, int inf)
     cdef void revolve_turn(CRevolve r, int final)
+    cdef int revolve_get_write_and_read_counts(CRevolve r, int* counts, int n)
+    cdef int revolve_get_number_of_writes_i(CRevolve r, int l, int c, int i)
+    cdef int revolve_get_number_of_reads_i(CRevolve r, int l, int c, int i)
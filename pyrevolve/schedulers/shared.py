@@ -0,0 +1,93 @@
+import numpy as np
+from .base import Action, Scheduler
+
+
+class SharedAction(Action):
+    """
+    This class is an specialization of the Action
+    base class for the SharedSchedule scheduler
+    """
+
+    def __init__(self, action_type, capo, old_capo, ckp):
+        super().__init__(action_type, capo, old_capo, ckp)
+
+    def storageIndex(self):
+        return 0
+
+
+def schedule_array(scheduler):
+    """Returns the action list of a single-level scheduler (CRevolve,
+    WeightedRevolve) as an (n_actions, 4) int32 array of type, capo,
+    old_capo and ckp, e.g. to place it in shared memory"""
+    oplist = scheduler.oplist
+    if oplist is None:
+        raise ValueError("SchedulerError: the scheduler has no action list.")
+    return np.array([(a.type, a.capo, a.old_capo, a.ckp) for a in oplist],
+                    dtype=np.int32).reshape(-1, 4)
+
+
+class SharedSchedule(Scheduler):
+    """
+    Replays a single-level schedule from an array built by
+    'schedule_array'. The array is only read, so one copy in shared
+    memory can serve every revolver of a process pool, none of which
+    has to compute the schedule again.
+    """
+
+    def __init__(self, actions, n_checkpoints, n_timesteps):
+        """
+        @params:
+            actions:       (n_actions, 4) array of type, capo, old_capo, ckp
+            n_checkpoints: number of checkpoint slots of the schedule
+            n_timesteps:   number of timesteps
+        """
+        super().__init__(n_checkpoints, n_timesteps)
+        if actions.ndim != 2 or actions.shape[1] != 4 or not len(actions):
+            raise ValueError("SchedulerError: actions must be an (n_actions, 4) "
+                             "array.")
+        self.actions = actions
+        self.__oplist = None
+        self.reset()
+
+    def reset(self):
+        """Rewinds the scheduler to the first action of the schedule"""
+        self.__index = 0
+        self.__action = SharedAction(Action.ADVANCE, 0, 0, 0)
+
+    def next(self):
+        row = self.actions[min(self.__index, len(self.actions) - 1)]
+        self.__index += 1
+        self.__action = SharedAction(int(row[0]), int(row[1]), int(row[2]),
+                                     int(row[3]))
+        return self.__action
+
+    @property
+    def oplist(self):
+        if self.__oplist is None:
+            self.__oplist = [SharedAction(*(int(x) for x in row))
+                             for row in self.actions]
+        return self.__oplist
+
+    @property
+    def capo(self):
+        return self.__action.capo
+
+    @property
+    def old_capo(self):
+        return self.__action.old_capo
+
+    @property
+    def cp_pointer(self):
+        return self.__action.ckp
+
+    @property
+    def ratio(self):
+        """Steps advanced per timestep, counted as for CRevolve"""
+        advance = self.actions[self.actions[:, 0] == Action.ADVANCE]
+        return int((advance[:, 1] - advance[:, 2]).sum()) / self.n_timesteps
+
+    def storage(self, k):
+        """Returns the timesteps checkpointed at the k-th storage level.
+        For SharedSchedule, k is always 0"""
+        shots = self.actions[self.actions[:, 0] == Action.TAKESHOT]
+        return [int(t) for t in shots[:, 1]]
@@ -0,0 +1,95 @@
+from .base import Action, Scheduler
+
+
+class SAction(Action):
+    """
+    This class is an specialization of the Action
+    base class for StoreAll scheduler
+    """
+
+    def __init__(self, action_type, capo, old_capo, ckp):
+        super().__init__(action_type, capo, old_capo, ckp)
+
+    def storageIndex(self):
+        return 0
+
+
+class StoreAll(Scheduler):
+    """
+    Scheduler that stores the forward trajectory instead of recomputing it.
+    A checkpoint is taken every `stride` timesteps, so the reverse sweep
+    recomputes at most stride - 1 steps before each adjoint step and never
+    re-runs the forward sweep. With stride=1 every state is stored.
+    Checkpoint keys grow with time and are only read back in decreasing
+    order, matching the LIFO order of the Revolve schedulers.
+    """
+
+    def __init__(self, n_timesteps, stride=1):
+        if stride < 1:
+            raise ValueError("SchedulerError: stride must be at least 1.")
+        n_checkpoints = -(-(n_timesteps - 1) // stride) if n_timesteps > 1 else 0
+        super().__init__(n_checkpoints, n_timesteps)
+        self.stride = stride
+        self.reset()
+        # recomputed steps of the reverse sweep within each stride
+        n_full, last = divmod(max(n_timesteps - 1, 0), stride)
+        recomputed = n_full * stride * (stride - 1) // 2 + last * (last - 1) // 2
+        self.__ratio = (max(n_timesteps - 1, 0) + recomputed) / n_timesteps
+
+    def __schedule(self):
+        nt = self.n_timesteps
+        stride = self.stride
+        capo = 0
+        for key in range(self.n_checkpoints):
+            capo = key * stride
+            yield Action.TAKESHOT, capo, capo, key
+            end = min(capo + stride, nt - 1)
+            yield Action.ADVANCE, end, capo, key
+            capo = end
+        yield Action.LASTFW, capo, capo, self.n_checkpoints - 1
+        yield Action.REVSTART, nt - 1, capo, self.n_checkpoints - 1
+        for t in range(nt - 2, -1, -1):
+            key = t // stride
+            base = key * stride
+            yield Action.RESTORE, base, t + 1, key
+            if t > base:
+                yield Action.ADVANCE, t, base, key
+            yield Action.REVERSE, t, t, key
+        while True:
+            yield Action.TERMINATE, 0, 0, -1
+
+    def reset(self):
+        """Rewinds the scheduler to the first action of the schedule"""
+        self.__capo = 0
+        self.__old_capo = 0
+        self.__cp_pointer = 0
+        self.__actions = self.__schedule()
+
+    def next(self):
+        action_type, capo, old_capo, key = next(self.__actions)
+        self.__capo = capo
+        self.__old_capo = old_capo
+        self.__cp_pointer = key
+        return SAction(action_type, capo, old_capo, key)
+
+    @property
+    def capo(self):
+        return self.__capo
+
+    @property
+    def old_capo(self):
+        return self.__old_capo
+
+    @property
+    def cp_pointer(self):
+        return self.__cp_pointer
+
+    @property
+    def ratio(self):
+        """Steps advanced per timestep, counted as for CRevolve"""
+        return self.__ratio
+
+    def storage(self, k):
+        """Returns the timesteps stored at the k-th storage level. For
+        StoreAll, k is always 0"""
+        return [key * self.stride for key in range(self.n_checkpoints)]
@@ -0,0 +1,334 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from .base import Action, Scheduler
+
+
+class WAction(Action):
+    """
+    This class is an specialization of the Action
+    base class for WeightedRevolve scheduler
+    """
+
+    def __init__(self, action_type, capo, old_capo, ckp):
+        super().__init__(action_type, capo, old_capo, ckp)
+
+    def storageIndex(self):
+        return 0
+
+
+class WeightedRevolve(Scheduler):
+    """
+    Offline single-level Revolve for timestep-dependent costs. Step t
+    (from t to t+1) costs costs[t] forward and reverse_costs[t] backward,
+    and every write and read of a checkpoint costs wd and rd. The
+    checkpoint placement minimizing the total cost is found by dynamic
+    programming over segments of the trajectory, vectorized over the
+    segment start with NumPy: O(n_checkpoints * n_timesteps**3 / 6) time
+    and O(n_checkpoints * n_timesteps**2) memory, or the same with
+    budget_units instead of n_checkpoints under a memory_budget, plus a
+    float64 cost table of that size. This is meant for trajectories of a
+    few hundred timesteps: schedules larger than `max_work` table cells
+    are refused, and long trajectories with uniform costs should use
+    CRevolve, which is optimal for them and linear in n_timesteps.
+    The actions follow the CRevolve conventions, so the scheduler can
+    replace it in a SingleLevelRevolver.
+
+    With a memory_budget, checkpoints are limited by bytes instead of
+    slots: the checkpoint of timestep t takes sizes[t] bytes, and the
+    checkpoints held at any time never add up to more than the budget.
+    The budget is split into budget_units units and sizes are rounded up
+    to whole units, so the tables grow with budget_units instead of
+    n_checkpoints. n_checkpoints then becomes the number of keys the
+    schedule uses.
+    """
+
+    def __init__(self, n_checkpoints, n_timesteps, costs=None, reverse_costs=None,
+                 wd=0, rd=0, sizes=None, memory_budget=None, budget_units=64,
+                 max_work=5 * 10 ** 8):
+        """
+        @params:
+            n_checkpoints: number of checkpoint slots, ignored with a
+                           memory_budget
+            n_timesteps:   number of timesteps
+            costs:         forward cost of each timestep (default 1)
+            reverse_costs: reverse cost of each timestep (default 1)
+            wd:            cost of writing a checkpoint
+            rd:            cost of reading a checkpoint
+            sizes:         bytes of the checkpoint of each timestep, or a
+                           function of the timestep predicting them
+            memory_budget: bytes available for checkpoints
+            budget_units:  resolution of the memory budget
+            max_work:      largest number of table cells evaluated, about
+                           10 ns each, or None for no limit
+        """
+        super().__init__(n_checkpoints, n_timesteps)
+        self.costs = self.__check_costs(costs, "costs")
+        self.reverse_costs = self.__check_costs(reverse_costs, "reverse_costs")
+        self.wd = wd
+        self.rd = rd
+        self.memory_budget = memory_budget
+        self.sizes = None
+        if memory_budget is None:
+            if n_checkpoints is None or n_checkpoints < 1:
+                raise ValueError("SchedulerError: at least one checkpoint is needed.")
+            levels = max(min(n_checkpoints - 1, n_timesteps - 2), 0)
+            self.__check_size(levels, max_work, 0)
+            self.__units = np.ones(n_timesteps, dtype=np.int64)
+            splits = self.__splits(levels)
+        else:
+            if callable(sizes):
+                sizes = [sizes(t) for t in range(n_timesteps)]
+            self.sizes = self.__check_costs(sizes, "sizes")
+            quantum = memory_budget / budget_units
+            self.__units = np.maximum(np.ceil(self.sizes / quantum), 1).astype(np.int64)
+            if n_timesteps > 1 and self.__units[0] > budget_units:
+                raise ValueError("SchedulerError: memory budget of %d bytes cannot "
+                                 "hold the first checkpoint." % memory_budget)
+            levels = budget_units - int(self.__units[0]) if n_timesteps > 1 else 0
+            self.__check_size(levels, max_work, 8)
+            splits = self.__budget_splits(levels)
+        self.__capo = 0
+        self.__old_capo = 0
+        self.__cp_pointer = 0
+        self.__stored_ckps = []
+        self.__oplist = self.__schedule(splits)
+        self.reset()
+        if memory_budget is not None:
+            self.n_checkpoints = max(a.ckp for a in self.__oplist) + 1
+
+    def __check_size(self, levels, max_work, cost_itemsize):
+        """Refuses dynamic programs of more than `max_work` cells"""
+        nt = self.n_timesteps
+        work = levels * nt ** 3 / 6
+        if max_work is None or work <= max_work:
+            return
+        itemsize = 2 if nt < np.iinfo(np.int16).max else 4
+        nbytes = (levels + 1) * (nt + 1) ** 2 * (itemsize + cost_itemsize)
+        raise ValueError("SchedulerError: WeightedRevolve over %d timesteps with "
+                         "%d levels evaluates %.1e table cells and needs %d MB "
+                         "(max_work is %.1e). Use CRevolve for long trajectories "
+                         "with uniform costs, or fewer checkpoints or "
+                         "budget_units." % (nt, levels, work, nbytes // 2 ** 20,
+                                            max_work))
+
+    def __check_costs(self, costs, name):
+        if costs is None:
+            return np.ones(self.n_timesteps)
+        costs = np.asarray(costs, dtype=np.float64)
+        if costs.shape != (self.n_timesteps,):
+            raise ValueError("SchedulerError: %s must have one entry per timestep."
+                             % name)
+        if np.any(costs < 0):
+            raise ValueError("SchedulerError: %s must be non-negative." % name)
+        return costs
+
+    def __chain(self, prefix):
+        """Cost of reversing every segment with no slot but the first"""
+        nt = self.n_timesteps
+        cost = np.zeros((nt + 1, nt + 1))
+        for L in range(2, nt + 1):
+            s = np.arange(nt - L + 1)
+            cost[L, s] = cost[L - 1, s] + prefix[s + L - 1] - prefix[s] + self.rd
+        return cost
+
+    def __update(self, cost, splits, L, total):
+        """Keeps the best split of each segment of length L if it beats
+        reversing it with fewer slots"""
+        s = np.arange(total.shape[0])
+        best = np.argmin(total, axis=1)
+        value = total[s, best]
+        better = value < cost[L, s]
+        cost[L, s[better]] = value[better]
+        splits[L, s[better]] = best[better] + 1
+
+    def __splits(self, levels):
+        """
+        Returns splits[c, L, s], the step after s where the segment of
+        length L starting at s is checkpointed when c slots are free besides
+        the one holding s, or 0 if it is best reversed with fewer slots.
+        The cost of reversing that segment is, with F the forward cost of a
+        range of steps,
+            T[0, L, s] = T[0, L-1, s] + F(s, s+L-1) + rd
+            T[c, L, s] = min(T[c-1, L, s],
+                             min_j F(s, s+j) + wd + T[c-1, L-j, s+j]
+                                   + rd + T[c, j, s])
+        """
+        nt = self.n_timesteps
+        prefix = np.concatenate(([0.], np.cumsum(self.costs)))
+        dtype = np.int16 if nt < np.iinfo(np.int16).max else np.int32
+        splits = np.zeros((levels + 1, nt + 1, nt + 1), dtype=dtype)
+
+        cost = self.__chain(prefix)
+        # strided views give, for a segment length L, the terms of every
+        # start s (rows) and split j = 1..L-2 (columns) without copies
+        N = nt + 1
+        item = cost.itemsize
+        for c in range(1, levels + 1):
+            fewer, cost = cost, cost.copy()
+            for L in range(3, nt + 1):
+                s = np.arange(nt - L + 1)
+                shape = (len(s), L - 2)
+                advance = as_strided(prefix[1:], shape, (item, item))
+                right = as_strided(fewer.reshape(-1)[(L - 1) * N + 1:], shape,
+                                   (item, (1 - N) * item))
+                left = as_strided(cost.reshape(-1)[N:], shape, (item, N * item))
+                total = advance - prefix[s, None] + right + left + (self.wd + self.rd)
+                self.__update(cost, splits[c], L, total)
+        return splits
+
+    def __budget_splits(self, levels):
+        """
+        Same as `__splits`, with c counting free budget units instead of
+        free slots: checkpointing step s+j leaves c - units[s+j] units to
+        the right segment, so every level of the table is kept.
+        """
+        nt = self.n_timesteps
+        N = nt + 1
+        units = self.__units
+        prefix = np.concatenate(([0.], np.cumsum(self.costs)))
+        dtype = np.int16 if nt < np.iinfo(np.int16).max else np.int32
+        splits = np.zeros((levels + 1, N, N), dtype=dtype)
+
+        cost = np.empty((levels + 1, N, N))
+        cost[0] = self.__chain(prefix)
+        table = cost.reshape(-1)
+        item = cost.itemsize
+        for c in range(1, levels + 1):
+            cost[c] = cost[c - 1]
+            for L in range(3, nt + 1):
+                s = np.arange(nt - L + 1)
+                j = np.arange(1, L - 1)
+                shape = (len(s), L - 2)
+                level = c - as_strided(units[1:], shape, (units.itemsize,) * 2)
+                fits = level >= 0
+                if not fits.any():
+                    continue
+                index = (np.where(fits, level, 0) * N * N
+                         + ((L - j) * N + j)[None, :] + s[:, None])
+                right = np.where(fits, table[index], np.inf)
+                advance = as_strided(prefix[1:], shape, (item, item))
+                left = as_strided(cost[c].reshape(-1)[N:], shape, (item, N * item))
+                total = advance - prefix[s, None] + right + left + (self.wd + self.rd)
+                self.__update(cost[c], splits[c], L, total)
+        return splits
+
+    def __schedule(self, splits):
+        nt = self.n_timesteps
+        oplist = []
+
+        def add(action_type, capo, old_capo, ckp):
+            oplist.append(WAction(action_type, capo, old_capo, ckp))
+
+        def reverse(t, ckp):
+            if t == nt - 1:
+                add(Action.LASTFW, t, t, ckp)
+                add(Action.REVSTART, t, t, ckp)
+            else:
+                add(Action.REVERSE, t, t, ckp)
+
+        if nt > 1:
+            add(Action.TAKESHOT, 0, 0, 0)
+            self.__stored_ckps.append(0)
+        # segments [s, e) whose start is live, reversed with c free slots
+        # above the slot `depth` that holds s; None marks a restore of s
+        stack = [(0, nt, splits.shape[0] - 1, 0)]
+        while stack:
+            task = stack.pop()
+            if task[2] is None:
+                add(Action.RESTORE, task[0], task[0], task[3])
+                continue
+            s, e, c, depth = task
+            while c > 0 and splits[c, e - s, s] == 0:
+                c -= 1
+            if c > 0:
+                j = s + int(splits[c, e - s, s])
+                add(Action.ADVANCE, j, s, depth)
+                add(Action.TAKESHOT, j, j, depth + 1)
+                self.__stored_ckps.append(j)
+                stack.append((s, j, c, depth))
+                stack.append((s, j, None, depth))
+                stack.append((j, e, c - int(self.__units[j]), depth + 1))
+                continue
+            for end in range(e - 1, s, -1):
+                add(Action.ADVANCE, end, s, depth)
+                reverse(end, depth)
+                add(Action.RESTORE, s, s, depth)
+            reverse(s, depth)
+        add(Action.TERMINATE, 0, 0, -1)
+        return oplist
+
+    @property
+    def oplist(self):
+        return self.__oplist
+
+    def reset(self):
+        """Rewinds the scheduler to the first action of the schedule"""
+        self.__next = iter(self.__oplist)
+        self.__capo = 0
+        self.__old_capo = 0
+        self.__cp_pointer = 0
+
+    def next(self):
+        action = next(self.__next, self.__oplist[-1])
+        self.__capo = action.capo
+        self.__old_capo = action.old_capo
+        self.__cp_pointer = action.ckp
+        return action
+
+    @property
+    def capo(self):
+        return self.__capo
+
+    @property
+    def old_capo(self):
+        return self.__old_capo
+
+    @property
+    def cp_pointer(self):
+        return self.__cp_pointer
+
+    @property
+    def ratio(self):
+        """Steps advanced per timestep, counted as for CRevolve"""
+        steps = sum(a.capo - a.old_capo for a in self.__oplist
+                    if a.type == Action.ADVANCE)
+        return steps / self.n_timesteps
+
+    @property
+    def makespan(self):
+        """Total cost of the schedule"""
+        cost = {Action.TAKESHOT: self.wd, Action.RESTORE: self.rd}
+        total = 0.
+        for a in self.__oplist:
+            if a.type == Action.ADVANCE:
+                total += self.costs[a.old_capo:a.capo].sum()
+            elif a.type == Action.LASTFW:
+                total += self.costs[a.capo]
+            elif a.type == Action.REVSTART:
+                total += self.reverse_costs[a.capo]
+            elif a.type == Action.REVERSE:
+                total += self.costs[a.capo] + self.reverse_costs[a.capo]
+            else:
+                total += cost.get(a.type, 0)
+        return total
+
+    @property
+    def peak_bytes(self):
+        """Largest number of bytes held in checkpoints at any time, or None
+        without checkpoint sizes"""
+        if self.sizes is None:
+            return None
+        held = {}
+        peak = 0
+        for a in self.__oplist:
+            if a.type == Action.TAKESHOT:
+                # keys are used as a stack: saving a key frees those above
+                held = {k: v for k, v in held.items() if k < a.ckp}
+                held[a.ckp] = self.sizes[a.capo]
+                peak = max(peak, sum(held.values()))
+        return peak
+
+    def storage(self, k):
+        """Returns a list of all timesteps checkpointed at the k-th
+        storage level. For WeightedRevolve, k is always 0"""
+        return self.__stored_ckps
@@ -0,0 +1,131 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from timeit import default_timer
+import numpy as np
+from . import crevolve as cr
+from .logger import logger
+from .schedulers import CRevolve, SharedSchedule, schedule_array
+
+
+def plan_shots(n_timesteps, checkpoint_nbytes, memory_budget=None, max_workers=None):
+    """
+    Returns the number of shots to run at once and the number of
+    checkpoints of each, such that shots complete at the highest rate when
+    the concurrent shots share `memory_budget` bytes of checkpoints. A shot
+    with c checkpoints runs numforw(n_timesteps, c) forward steps besides
+    its n_timesteps reverse steps, so running more shots at once trades
+    recomputation for concurrency. Without a budget, each of `max_workers`
+    shots (default: one per CPU) gets adjust(n_timesteps) checkpoints.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if memory_budget is None:
+        return max_workers, cr.adjust(n_timesteps)
+    best = None
+    for workers in range(1, max_workers + 1):
+        n_checkpoints = min(int(memory_budget // (workers * checkpoint_nbytes)),
+                            max(n_timesteps - 1, 1))
+        if n_checkpoints < 1:
+            break
+        rate = workers / (cr.numforw(n_timesteps, n_checkpoints) + n_timesteps)
+        if best is None or rate > best[0]:
+            best = (rate, workers, n_checkpoints)
+    if best is None:
+        raise ValueError("RevolverError: memory budget of %d bytes cannot hold a "
+                         "checkpoint of %d bytes." % (memory_budget, checkpoint_nbytes))
+    return best[1], best[2]
+
+
+# schedule attached by each worker process, see 'ShotDriver.run'
+_shared = None
+
+
+def _attach(name, shape, n_checkpoints, n_timesteps):
+    global _shared
+    memory = shared_memory.SharedMemory(name=name)
+    actions = np.ndarray(shape, dtype=np.int32, buffer=memory.buf)
+    _shared = (memory, actions, n_checkpoints, n_timesteps)
+
+
+def _run_shot(shot, args):
+    memory, actions, n_checkpoints, n_timesteps = _shared
+    start = default_timer()
+    result = shot(args, SharedSchedule(actions, n_checkpoints, n_timesteps))
+    return result, default_timer() - start
+
+
+class ShotDriver(object):
+    """
+    Runs independent shots, each an adjoint computation with its own
+    revolver, on a pool of processes. The checkpoint memory of the node is
+    split between the shots running at once (see 'plan_shots'), and the
+    Revolve schedule, which is the same for every shot, is computed once
+    and placed in shared memory, where the workers replay it through a
+    SharedSchedule.
+
+    A shot is a picklable function shot(args, scheduler) that builds its
+    operators and a revolver with `scheduler=scheduler`, runs it and
+    returns a picklable result. After 'run', `stats` reports the
+    aggregate throughput of the node.
+    """
+
+    def __init__(self, n_timesteps, checkpoint_nbytes, memory_budget=None,
+                 max_workers=None):
+        """
+        @params:
+            n_timesteps:       number of timesteps of every shot
+            checkpoint_nbytes: bytes of one checkpoint
+            memory_budget:     bytes available for the checkpoints of all
+                               concurrent shots
+            max_workers:       largest number of shots run at once
+                               (default: one per CPU)
+        """
+        self.n_timesteps = n_timesteps
+        self.checkpoint_nbytes = checkpoint_nbytes
+        self.memory_budget = memory_budget
+        self.n_workers, self.n_checkpoints = plan_shots(
+            n_timesteps, checkpoint_nbytes, memory_budget, max_workers)
+        self.actions = schedule_array(CRevolve(self.n_checkpoints, n_timesteps))
+        self.stats = {}
+        logger.info("Running %d shots at once with %d checkpoints each"
+                    % (self.n_workers, self.n_checkpoints))
+
+    def run(self, shot, shots):
+        """Runs shot(args, scheduler) for every args in `shots` and returns
+        the results in the same order"""
+        if not shots:
+            return []
+        memory = shared_memory.SharedMemory(create=True, size=self.actions.nbytes)
+        try:
+            view = np.ndarray(self.actions.shape, dtype=np.int32, buffer=memory.buf)
+            view[:] = self.actions
+            del view
+            start = default_timer()
+            with ProcessPoolExecutor(
+                max_workers=min(self.n_workers, len(shots)), initializer=_attach,
+                initargs=(memory.name, self.actions.shape, self.n_checkpoints,
+                          self.n_timesteps),
+            ) as executor:
+                outcomes = list(executor.map(_run_shot, [shot] * len(shots), shots))
+            elapsed = default_timer() - start
+        finally:
+            memory.close()
+            memory.unlink()
+
+        busy = sum(t for _, t in outcomes)
+        n_shots = len(shots)
+        self.stats = {
+            "shots": n_shots,
+            "workers": self.n_workers,
+            "n_checkpoints": self.n_checkpoints,
+            "elapsed": elapsed,
+            "shots_per_second": n_shots / elapsed,
+            "timesteps_per_second": n_shots * self.n_timesteps / elapsed,
+            "mean_shot_time": busy / n_shots,
+            "efficiency": busy / (elapsed * min(self.n_workers, n_shots)),
+        }
+        logger.info("%d shots in %.3fs: %.2f shots/s, %.0f timesteps/s"
+                    % (n_shots, elapsed, self.stats["shots_per_second"],
+                       self.stats["timesteps_per_second"]))
+        return [result for result, _ in outcomes]
@@ -1,13 +1,38 @@
 from abc import ABCMeta, abstractmethod
+import asyncio
 import numpy as np
 import datetime
 from functools import reduce
 from operator import mul
 from .logger import logger
-from .compression import CompressedObject
+from .compression import CompressedObject, ZeroBlockEncoder
+from timeit import default_timer
 import pickle
+import mmap
 import os
 import shutil
+import threading
+
+HUGEPAGE_SIZE = 2 * 1024 * 1024
+
+
+class CapacityExceeded(ValueError):
+    """Raised by a storage whose packed capacity cannot hold a checkpoint"""
+
+
+def omp_placement():
+    """Guesses the CPUs of each thread of an OpenMP operator from
+    OMP_NUM_THREADS and the affinity of this process, assuming close
+    binding: the available CPUs are split into one contiguous group per
+    thread, in order."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    n_threads = int(os.environ.get("OMP_NUM_THREADS", str(len(cpus))).split(",")[0])
+    n_threads = max(min(n_threads, len(cpus)), 1)
+    bounds = np.linspace(0, len(cpus), n_threads + 1).astype(int)
+    return [set(cpus[bounds[i]:bounds[i + 1]]) for i in range(n_threads)]
 
 
 class Storage(object):
@@ -33,6 +58,10 @@ class Storage(object):
 
     __metaclass__ = ABCMeta
 
+    # whether the storage hands out writable slot buffers
+    # through 'acquire_slot'/'commit_slot'
+    supports_inplace = False
+
     def __init__(self, size_ckp, n_ckp, dtype, profiler, wd=0, rd=0, name="storage"):
         """
         @attributes:
@@ -53,12 +82,133 @@ class Storage(object):
         self.rd = rd
         self.name = name
         self.__maxsize = self.size_ckp * n_ckp
-        self.__current_size = 0
+        self.__current_bytes = 0
         self.__itemsize = np.dtype(self.dtype).itemsize
 
         # stack interface controls
         self.__stack_ptr = -1
 
+        # static description of the checkpoint data, see 'register_layout'
+        self.layout = None
+
+        # I/O accounting
+        self.occupancy = {}
+        self.reset_stats()
+
+        # the StoragePool this storage was taken from, if any
+        self.pool = None
+
+    def register_layout(self, layout):
+        """Shares the CheckpointLayout of the checkpoints that will be
+        stored, so that storages can precompute where each field goes.
+        Storages without a layout infer the shapes on every save."""
+        self.layout = layout
+
+    def _check_layout_fits(self, layout):
+        if layout.nbytes > self.size_ckp * np.dtype(self.dtype).itemsize:
+            raise ValueError(
+                "StorageError: checkpoint layout needs %d bytes per slot, but "
+                "%s only holds %d." % (layout.nbytes, self.name,
+                                       self.size_ckp * np.dtype(self.dtype).itemsize)
+            )
+
+    def reset(self, keep_layout=False):
+        """Forgets every checkpoint and resets the counters, so that the
+        storage can serve another run. The slots keep their memory or
+        files, and the registered layout is dropped unless `keep_layout`."""
+        self.occupancy = {}
+        self.__current_bytes = 0
+        self.__stack_ptr = -1
+        if not keep_layout:
+            self.layout = None
+        self.reset_stats()
+
+    def preallocate(self):
+        """Sizes the storage for all its slots up front, where that is
+        not done on construction"""
+        pass
+
+    def reset_stats(self):
+        """Resets the byte and bandwidth counters reported by 'stats'"""
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.raw_bytes_written = 0
+        self.raw_bytes_read = 0
+        self.n_writes = 0
+        self.n_reads = 0
+        self.write_time = 0.
+        self.read_time = 0.
+        self.peak_write_bandwidth = 0.
+        self.peak_read_bandwidth = 0.
+        self.peak_slots = len(self.occupancy)
+        self.peak_bytes = self.__current_bytes
+
+    def _account_write(self, key, raw_nbytes, nbytes, elapsed):
+        """Records that `nbytes` bytes, holding `raw_nbytes` bytes of
+        uncompressed checkpoint data, were written to slot `key`
+        in `elapsed` seconds."""
+        self.bytes_written += nbytes
+        self.raw_bytes_written += raw_nbytes
+        self.n_writes += 1
+        self.write_time += elapsed
+        if elapsed > 0:
+            self.peak_write_bandwidth = max(self.peak_write_bandwidth,
+                                            nbytes / elapsed / 1e9)
+        self.__current_bytes += nbytes - self.occupancy.get(key, 0)
+        self.occupancy[key] = nbytes
+        self.peak_slots = max(self.peak_slots, len(self.occupancy))
+        self.peak_bytes = max(self.peak_bytes, self.__current_bytes)
+        if self.profiler is not None:
+            self.profiler.add_bytes(self.name, "write", nbytes, raw_nbytes, elapsed)
+
+    def _account_read(self, key, raw_nbytes, nbytes, elapsed):
+        """Records that `nbytes` stored bytes were read from slot `key` and
+        expanded into `raw_nbytes` bytes of checkpoint data in `elapsed`
+        seconds."""
+        self.bytes_read += nbytes
+        self.raw_bytes_read += raw_nbytes
+        self.n_reads += 1
+        self.read_time += elapsed
+        if elapsed > 0:
+            self.peak_read_bandwidth = max(self.peak_read_bandwidth,
+                                           nbytes / elapsed / 1e9)
+        if self.profiler is not None:
+            self.profiler.add_bytes(self.name, "read", nbytes, raw_nbytes, elapsed)
+
+    def _account_free(self, key):
+        """Records that slot `key` no longer holds a checkpoint"""
+        self.__current_bytes -= self.occupancy.pop(key, 0)
+
+    def release(self, key):
+        """Tells the storage that slot `key` will not be read again until
+        it is saved anew, so that its memory can be given back"""
+        self._account_free(key)
+
+    def stats(self):
+        """Returns a dict with the bytes moved in and out of this storage,
+        the achieved bandwidths (GB/s) and the peak occupancy."""
+        return {
+            "name": self.name,
+            "bytes_written": self.bytes_written,
+            "bytes_read": self.bytes_read,
+            "raw_bytes_written": self.raw_bytes_written,
+            "raw_bytes_read": self.raw_bytes_read,
+            "compression_ratio": (self.raw_bytes_written / self.bytes_written
+                                  if self.bytes_written else 1.),
+            "n_writes": self.n_writes,
+            "n_reads": self.n_reads,
+            "write_bandwidth": (self.bytes_written / self.write_time / 1e9
+                                if self.write_time else 0.),
+            "read_bandwidth": (self.bytes_read / self.read_time / 1e9
+                               if self.read_time else 0.),
+            "peak_write_bandwidth": self.peak_write_bandwidth,
+            "peak_read_bandwidth": self.peak_read_bandwidth,
+            "slots": len(self.occupancy),
+            "bytes": self.__current_bytes,
+            "peak_slots": self.peak_slots,
+            "peak_bytes": self.peak_bytes,
+        }
+
     @abstractmethod
     def save(self, key, data_pointers):
         return NotImplemented
@@ -67,6 +217,32 @@ class Storage(object):
     def load(self, key, locations):
         return NotImplemented
 
+    async def async_save(self, key, data_pointers):
+        """Awaitable 'save'. By default, the copy runs in the default
+        executor of the event loop, which keeps serving other coroutines
+        meanwhile. Storages with native asynchronous I/O override it."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.save, key, data_pointers)
+
+    async def async_load(self, key, locations):
+        """Awaitable 'load', see 'async_save'"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.load, key, locations)
+
+    def acquire_slot(self, key, shapes=None):
+        """Returns a list of writable arrays with the given `shapes` (by
+        default, those of the registered layout), which are views of the
+        memory of slot `key`. Once they are filled, the checkpoint must be
+        made valid with 'commit_slot'."""
+        raise ValueError("StorageError: %s does not support in-place "
+                         "checkpoints." % type(self).__name__)
+
+    def commit_slot(self, key):
+        """Marks the buffers handed out by 'acquire_slot' for slot `key`
+        as a valid checkpoint."""
+        raise ValueError("StorageError: %s does not support in-place "
+                         "checkpoints." % type(self).__name__)
+
     def push(self, data_pointers):
         if self.isFull():
             ValueError(
@@ -77,6 +253,17 @@ class Storage(object):
             self.__stack_ptr += 1
             self.save(self.__stack_ptr, data_pointers)
 
+    def acquire_push(self, shapes=None):
+        """Stack-interface version of 'acquire_slot'"""
+        if self.isFull():
+            raise ValueError("StorageError: Trying to push into an already full stack.")
+        return self.acquire_slot(self.__stack_ptr + 1, shapes)
+
+    def commit_push(self):
+        """Stack-interface version of 'commit_slot'"""
+        self.__stack_ptr += 1
+        self.commit_slot(self.__stack_ptr)
+
     def peek(self, locations):
         if self.isEmpty():
             return
@@ -88,6 +275,7 @@ class Storage(object):
             raise ValueError("StorageError: Trying to pop from an empty stack.")
         else:
             self.load(self.__stack_ptr, locations)
+            self._account_free(self.__stack_ptr)
             self.__stack_ptr -= 1
 
     def isFull(self):
@@ -109,7 +297,12 @@ class Storage(object):
     @property
     def size(self):
         """Returns the current storage size in words of 'dtype'"""
-        return self.__current_size
+        return self.__current_bytes // self.__itemsize
+
+    @property
+    def size_in_bytes(self):
+        """Returns the current storage size in bytes"""
+        return self.__current_bytes
 
     @property
     def nckp(self):
@@ -136,6 +329,9 @@ class DiskStorage(Storage):
     All .dat binary files are stored into 'fildir/dat/' folder.
     'singlefile': lets the user decide whether to use one or
     multiple files to store checkpoints.
+    'zero_blocks': block size in bytes; when set, all-zero blocks of a
+    checkpoint are not written to disk (see ZeroBlockEncoder). Needs a
+    registered layout, which revolvers provide.
     """
 
     def __init__(
@@ -149,11 +345,16 @@ class DiskStorage(Storage):
         wd=0,
         rd=0,
         name="DiskStorage",
-        keepfiles=False
+        keepfiles=False,
+        zero_blocks=None,
     ):
         super().__init__(size_ckp, n_ckp, dtype, profiler, wd=wd, rd=rd, name=name)
         self.singlefile = singlefile
         self.keepfiles = keepfiles
+        self.zero_blocks = None
+        if zero_blocks is not None:
+            self.zero_blocks = ZeroBlockEncoder(zero_blocks)
+        self.bitmaps = {}
         self.filedir = None
         self.__myPID = os.getpid()
         self.__myTimestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
@@ -172,11 +373,11 @@ class DiskStorage(Storage):
         """ create unique file names"""
         self.datFileName = self.filedir + self.__datFileTemplate
 
-        self.__current_size = 0
         self.shapes = {}
         if self.singlefile is True:
             self.storage_w = open(self.datFileName, "bw+")
-            self.storage_r = open(self.datFileName, "br+")
+            # unbuffered, so reads never see data older than the last write
+            self.storage_r = open(self.datFileName, "br+", buffering=0)
             self.default_storage = self.storage_w
 
     def __del__(self):
@@ -184,6 +385,29 @@ class DiskStorage(Storage):
         if self.keepfiles is False:
             self.removeDatdir()
 
+    def reset(self, keep_layout=False):
+        super().reset(keep_layout)
+        self.shapes = {}
+        self.bitmaps = {}
+
+    def preallocate(self):
+        """Sizes the checkpoint file for all slots, so that writes never
+        have to grow it. Files of multi-file storages are created on save."""
+        if self.singlefile is True:
+            fd = self.storage_w.fileno()
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, self.maxsize_in_bytes)
+            else:
+                os.ftruncate(fd, self.maxsize_in_bytes)
+
+    def register_layout(self, layout):
+        self._check_layout_fits(layout)
+        super().register_layout(layout)
+        self.__staging = np.empty(layout.nbytes, dtype=np.uint8)
+        self.__staging_views = layout.views(self.__staging)
+        if self.zero_blocks is not None:
+            self.__packed = np.empty(layout.nbytes, dtype=np.uint8)
+
     def removeDatdir(self):
         """ Removes dat file directory """
         shutil.rmtree(self.filedir, ignore_errors=True)
@@ -205,8 +429,6 @@ class DiskStorage(Storage):
         checkpoint with number `key`."""
         assert key < self.n_ckp
         noffset = key * self.size_ckp
-        if self.__current_size > 0:
-            assert noffset <= self.__current_size
         foffset = noffset * (np.dtype(self.dtype).itemsize)
         """Moves the file-pointer to position determined
         by the 'key' parameter"""
@@ -214,7 +436,10 @@ class DiskStorage(Storage):
         return self.default_storage
 
     def save(self, key, data_pointers):
-        with self.profiler.get_timer("storage", "copy_save"):
+        start = default_timer()
+        raw_nbytes = 0
+        nbytes = 0
+        with self.profiler.get_timer("storage", "copy_save", key=key):
             shapes = []
             if self.singlefile is True:
                 self.__setW()
@@ -224,21 +449,50 @@ class DiskStorage(Storage):
                 self.checkFilesDir()
                 slot = open(ckpfile, "bw")
 
-            for ptr in data_pointers:
-                assert ptr.strides[-1] == ptr.itemsize
-                with self.profiler.get_timer("storage", "flatten"):
-                    data = ptr.ravel()
-                    data = data.astype(self.dtype)
-                data.tofile(slot)
+            if self.layout is None and self.zero_blocks is not None:
+                raise ValueError("StorageError: zero_blocks needs a registered "
+                                 "layout, see 'register_layout'.")
+            if self.layout is not None:
+                self.layout.encode(data_pointers, self.__staging_views)
+                raw_nbytes = self.layout.raw_nbytes
+                if self.zero_blocks is not None:
+                    bitmap, nbytes = self.zero_blocks.encode(self.__staging,
+                                                             self.__packed)
+                    self.bitmaps[key] = (bitmap, nbytes)
+                    slot.write(self.__packed[:nbytes])
+                else:
+                    slot.write(self.__staging)
+                    nbytes = self.layout.nbytes
                 slot.flush()
-                self.__current_size += self.size_ckp
-                shapes.append(ptr.shape)
-            self.shapes[key] = shapes
+            else:
+                for ptr in data_pointers:
+                    assert ptr.strides[-1] == ptr.itemsize
+                    with self.profiler.get_timer("storage", "flatten", key=key):
+                        data = ptr.ravel()
+                        data = data.astype(self.dtype)
+                    data.tofile(slot)
+                    slot.flush()
+                    raw_nbytes += ptr.nbytes
+                    nbytes += data.nbytes
+                    shapes.append(ptr.shape)
+                self.shapes[key] = shapes
             if self.singlefile is False:
                 slot.close()
+        self._account_write(key, raw_nbytes, nbytes, default_timer() - start)
+
+    def __readinto(self, slot, view):
+        """Fills `view` from `slot`, which may return short reads"""
+        while view.nbytes:
+            n = slot.readinto(view)
+            if not n:
+                raise ValueError("StorageError: checkpoint file is truncated")
+            view = view[n:]
 
     def load(self, key, locations):
-        with self.profiler.get_timer("storage", "copy_load"):
+        start = default_timer()
+        raw_nbytes = 0
+        nbytes = 0
+        with self.profiler.get_timer("storage", "copy_load", key=key):
             if self.singlefile is True:
                 self.__setR()
                 slot = self[key]
@@ -247,14 +501,28 @@ class DiskStorage(Storage):
                 self.checkFilesDir()
                 slot = open(ckpfile, "br")
 
-            offset = 0
-            for shape, ptr in zip(self.shapes[key], locations):
-                size = reduce(mul, ptr.shape)
-                ckp = np.fromfile(slot, dtype=self.dtype, count=size)
-                np.copyto(ptr, ckp.reshape(ptr.shape))
-                offset += size
+            if self.layout is not None:
+                raw_nbytes = self.layout.raw_nbytes
+                if self.zero_blocks is not None:
+                    bitmap, nbytes = self.bitmaps[key]
+                    self.__readinto(slot, memoryview(self.__packed)[:nbytes])
+                    self.zero_blocks.decode(self.__packed, bitmap, self.__staging)
+                else:
+                    self.__readinto(slot, memoryview(self.__staging))
+                    nbytes = self.layout.nbytes
+                self.layout.decode(self.__staging_views, locations)
+            else:
+                offset = 0
+                for shape, ptr in zip(self.shapes[key], locations):
+                    size = reduce(mul, ptr.shape)
+                    ckp = np.fromfile(slot, dtype=self.dtype, count=size)
+                    np.copyto(ptr, ckp.reshape(ptr.shape))
+                    offset += size
+                    raw_nbytes += ptr.nbytes
+                    nbytes += ckp.nbytes
             if self.singlefile is False:
                 slot.close()
+        self._account_read(key, raw_nbytes, nbytes, default_timer() - start)
 
 
 class NumpyStorage(Storage):
@@ -264,15 +532,41 @@ class NumpyStorage(Storage):
     storage also supports random access."""
 
     """Allocates memory on initialisation. Requires number of checkpoints and
-    size of one checkpoint. Memory is allocated in C-contiguous style."""
+    size of one checkpoint. Memory is allocated in C-contiguous style.
+    'elastic': when set, slots are page-aligned in an anonymous mmap arena,
+    so memory is only committed once a slot is written, and 'release'
+    returns a slot's pages to the OS (madvise MADV_DONTNEED).
+    'hugepages': when set, the arena is aligned to 2 MiB and backed by
+    transparent huge pages (madvise MADV_HUGEPAGE), and slots of 2 MiB or
+    more are aligned to huge pages, which cuts TLB misses when copying
+    large checkpoints.
+    'first_touch': number of threads, or one set of CPUs per thread (see
+    'omp_placement'), that fault in the arena before use. Thread i zeroes
+    the i-th contiguous share of every slot, which is what the i-th thread
+    of an operator with a static OpenMP schedule over the outermost
+    dimension copies into it, so that each page lands on the NUMA node of
+    the thread that writes it."""
+
+    supports_inplace = True
 
     def __init__(
-        self, size_ckp, n_ckp, dtype, profiler=None, wd=0, rd=0, name="MemoryStorage"
+        self, size_ckp, n_ckp, dtype, profiler=None, wd=0, rd=0, name="MemoryStorage",
+        elastic=False, hugepages=False, first_touch=None,
     ):
         super().__init__(size_ckp, n_ckp, dtype, profiler, wd=wd, rd=rd, name=name)
-        self.storage = np.zeros((n_ckp, size_ckp), order="C", dtype=dtype)
+        self.elastic = elastic
+        self.hugepages = hugepages
+        self.__arena = None
+        if elastic or hugepages or first_touch is not None:
+            self.storage = self.__map_arena(size_ckp, n_ckp, dtype)
+            if first_touch is not None:
+                self.__first_touch(first_touch)
+        else:
+            self.storage = np.zeros((n_ckp, size_ckp), order="C", dtype=dtype)
         self.shapes = {}
         self.profiler = profiler
+        self.__acquired = {}
+        self.__views = {}
 
     """Returns a pointer to the contiguous chunk of memory reserved for the
     checkpoint with number `key`."""
@@ -280,29 +574,141 @@ class NumpyStorage(Storage):
     def __getitem__(self, key):
         return self.storage[key, :]
 
+    def reset(self, keep_layout=False):
+        super().reset(keep_layout)
+        self.shapes = {}
+        self.__acquired = {}
+        self.__views = {}
+
+    def register_layout(self, layout):
+        self._check_layout_fits(layout)
+        super().register_layout(layout)
+        self.__views = {}
+
+    def __map_arena(self, size_ckp, n_ckp, dtype):
+        """Returns the slots as a view of an anonymous mmap arena, with
+        every slot starting on a page (or huge page) boundary"""
+        itemsize = np.dtype(dtype).itemsize
+        align = mmap.PAGESIZE
+        if self.hugepages and size_ckp * itemsize >= HUGEPAGE_SIZE:
+            align = HUGEPAGE_SIZE
+        self.slot_nbytes = max(-(-size_ckp * itemsize // align), 1) * align
+        extra = HUGEPAGE_SIZE if self.hugepages else 0
+        # a private mapping: DONTNEED on shared memory keeps the pages
+        self.__arena = mmap.mmap(-1, max(n_ckp, 1) * self.slot_nbytes + extra,
+                                 flags=mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS)
+        self.__offset = 0
+        if self.hugepages:
+            address = np.frombuffer(self.__arena, dtype=np.uint8).ctypes.data
+            self.__offset = -address % HUGEPAGE_SIZE
+            if hasattr(mmap, "MADV_HUGEPAGE"):
+                self.__arena.madvise(mmap.MADV_HUGEPAGE)
+            else:
+                logger.warning("Transparent huge pages are not supported here, "
+                               "using regular pages")
+        return np.ndarray((n_ckp, size_ckp), dtype=dtype, buffer=self.__arena,
+                          offset=self.__offset, strides=(self.slot_nbytes, itemsize))
+
+    def __first_touch(self, placement):
+        if isinstance(placement, int):
+            placement = [None] * placement
+        bounds = np.linspace(0, self.storage.shape[1], len(placement) + 1).astype(int)
+
+        def touch(rank, cpus):
+            # affinity set from a thread only applies to that thread
+            if cpus and hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, cpus)
+            self.storage[:, bounds[rank]:bounds[rank + 1]] = 0
+
+        threads = [threading.Thread(target=touch, args=(rank, cpus))
+                   for rank, cpus in enumerate(placement)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def release(self, key):
+        super().release(key)
+        if self.elastic and hasattr(self.__arena, "madvise"):
+            # the pages read back as zeros, and are only committed again
+            # when the slot is next written
+            self.__arena.madvise(mmap.MADV_DONTNEED,
+                                 self.__offset + key * self.slot_nbytes,
+                                 self.slot_nbytes)
+
+    def slot_views(self, key):
+        """Returns the views of slot `key` holding each field of the
+        registered layout. Views are computed once per slot."""
+        views = self.__views.get(key)
+        if views is None:
+            views = self.__views[key] = self.layout.views(self[key].view(np.uint8))
+        return views
+
     def save(self, key, data_pointers):
+        start = default_timer()
+        if self.layout is not None:
+            with self.profiler.get_timer("storage", "copy_save", key=key):
+                self.layout.encode(data_pointers, self.slot_views(key))
+            self._account_write(key, self.layout.raw_nbytes, self.layout.nbytes,
+                                default_timer() - start)
+            return
         slot = self[key]
         offset = 0
+        raw_nbytes = 0
         shapes = []
         for ptr in data_pointers:
             assert ptr.strides[-1] == ptr.itemsize
-            with self.profiler.get_timer("storage", "flatten"):
+            with self.profiler.get_timer("storage", "flatten", key=key):
                 data = ptr.ravel()
-            with self.profiler.get_timer("storage", "copy_save"):
+            with self.profiler.get_timer("storage", "copy_save", key=key):
                 np.copyto(slot[offset:(len(data) + offset)], data)
 
             offset += len(data)
+            raw_nbytes += ptr.nbytes
             shapes.append(ptr.shape)
         self.shapes[key] = shapes
+        self._account_write(key, raw_nbytes, offset * slot.itemsize,
+                            default_timer() - start)
+
+    def acquire_slot(self, key, shapes=None):
+        if shapes is None:
+            self.__acquired[key] = (None, self.layout.nbytes, default_timer())
+            return self.slot_views(key)
+        slot = self[key]
+        offset = 0
+        buffers = []
+        for shape in shapes:
+            size = reduce(mul, shape, 1)
+            buffers.append(slot[offset:offset + size].reshape(shape))
+            offset += size
+        self.__acquired[key] = (list(shapes), offset * slot.itemsize, default_timer())
+        return buffers
+
+    def commit_slot(self, key):
+        shapes, nbytes, start = self.__acquired.pop(key)
+        if shapes is not None:
+            self.shapes[key] = shapes
+        self._account_write(key, nbytes, nbytes, default_timer() - start)
 
     def load(self, key, locations):
+        start = default_timer()
+        if self.layout is not None:
+            with self.profiler.get_timer("storage", "copy_load", key=key):
+                self.layout.decode(self.slot_views(key), locations)
+            self._account_read(key, self.layout.raw_nbytes, self.layout.nbytes,
+                               default_timer() - start)
+            return
         slot = self[key]
         offset = 0
+        raw_nbytes = 0
         for shape, ptr in zip(self.shapes[key], locations):
             size = reduce(mul, ptr.shape)
-            with self.profiler.get_timer("storage", "copy_load"):
+            with self.profiler.get_timer("storage", "copy_load", key=key):
                 np.copyto(ptr, slot[offset:offset + size].reshape(ptr.shape))
             offset += size
+            raw_nbytes += ptr.nbytes
+        self._account_read(key, raw_nbytes, offset * slot.itemsize,
+                           default_timer() - start)
 
 
 class BytesStorage(Storage):
@@ -312,7 +718,12 @@ class BytesStorage(Storage):
     storage also supports random access."""
 
     """Allocates memory on initialisation. Requires number of checkpoints and
-    size of one checkpoint. Memory is allocated in C-contiguous style."""
+    size of one checkpoint. Memory is allocated in C-contiguous style.
+    With 'capacity' (in bytes), a single buffer of that size is allocated
+    instead and compressed checkpoints are packed back to back in LIFO
+    order: slot `key` starts where the highest slot below it ends, and
+    saving it discards every slot above it. Checkpoints compressed by a
+    factor r then take 1/r of the memory of fixed-size slots."""
 
     def __init__(
         self,
@@ -325,17 +736,55 @@ class BytesStorage(Storage):
         wd=0,
         rd=0,
         name="ByteStorage",
+        capacity=None,
     ):
         super().__init__(size_ckp, n_ckp, dtype, profiler, wd=wd, rd=rd, name=name)
         size = size_ckp * n_ckp
         self.size_ckp = size_ckp
         self.n_ckp = n_ckp
         self.dtype = dtype
+        self.capacity = capacity
+        if capacity is not None:
+            size = capacity
+        # keys of the packed slots, in increasing order, and their offsets
+        self.__packed = []
+        self.__starts = {}
         self.storage = memoryview(bytearray(size))
         self.auto_pickle = auto_pickle
         self.compressor, self.decompressor = compression
         self.lengths = {}
         self.metadata = {}
+        self.__encoded = None
+
+    def reset(self, keep_layout=False):
+        super().reset(keep_layout)
+        self.__packed = []
+        self.__starts = {}
+        self.lengths = {}
+        self.metadata = {}
+        if not keep_layout:
+            self.__encoded = None
+
+    def register_layout(self, layout):
+        super().register_layout(layout)
+        # fields kept in reduced precision are converted into these
+        # buffers before compression, interiors are compressed from views
+        self.__encoded = None
+        if layout.converted or layout.partial:
+            self.__encoded = [np.empty(f.shape, dtype=f.storage_dtype)
+                              if f.converted else None for f in layout]
+
+    def _encode(self, data):
+        if self.__encoded is None:
+            return data
+        encoded = []
+        for field, ptr, buf in zip(self.layout, data, self.__encoded):
+            if buf is None:
+                encoded.append(field.region(ptr))
+            else:
+                field.encode(ptr, buf)
+                encoded.append(buf)
+        return encoded
 
     """Returns a pointer to the contiguous chunk of memory reserved for the
     checkpoint with number `key`. May be a copy."""
@@ -346,17 +795,28 @@ class BytesStorage(Storage):
 
     def get_location(self, key):
         assert key < self.n_ckp
+        if self.capacity is not None:
+            return (self.storage, self.__starts[key], self.capacity)
         start = self.size_ckp * key
         end = start + self.size_ckp * np.dtype(self.dtype).itemsize
         return (self.storage, start, end)
 
     def save(self, key, data):
+        timer_start = default_timer()
         logger.debug("ByteStorage: Saving to location %d/%d" % (key, self.n_ckp))
+        nbytes = self._store(key, self._encode(data))
+        self._account_write(key, sum(x.nbytes for x in data), nbytes,
+                            default_timer() - timer_start)
+
+    def _store(self, key, data):
+        """Compresses the arrays `data` into slot `key`. Returns the number
+        of bytes stored."""
         dataset = [self.compressor(x) for x in data]
         logger.debug("ByteStorage: Compression complete")
-        offset = 0
         sizes = []
         metadatas = []
+        if self.capacity is not None:
+            self._pack(key)
         ptr, start, end = self.get_location(key)
         for compressed_object in dataset:
             if not (isinstance(compressed_object, CompressedObject)):
@@ -369,7 +829,6 @@ class BytesStorage(Storage):
                     assert isinstance(data, tuple) and len(data) == 2
                     data, metadata = data
                     data = pickle.dumps(metadata)
-            start += offset
             compressed_data = compressed_object.data
             metadata = compressed_object.metadata
             logger.debug("Start: %d, End: %d" % (start, end))
@@ -377,32 +836,302 @@ class BytesStorage(Storage):
             actual_size = len(compressed_data)
             logger.debug("Actual size: %d" % actual_size)
 
+            if self.capacity is not None and actual_size > allowed_size:
+                raise CapacityExceeded("StorageError: %s capacity of %d bytes "
+                                       "exceeded." % (self.name, self.capacity))
             assert actual_size <= allowed_size
             logger.debug(type(compressed_data))
             self.storage[start:(start + actual_size)] = compressed_data
             sizes.append(actual_size)
-            offset += actual_size
+            start += actual_size
             metadatas.append(metadata)
 
         self.lengths[key] = sizes
         self.metadata[key] = metadatas
+        return sum(sizes)
+
+    def _pack(self, key):
+        """Places slot `key` right after the highest slot below it,
+        discarding the slots above it"""
+        while self.__packed and self.__packed[-1] >= key:
+            self._account_free(self.__packed.pop())
+        start = 0
+        if self.__packed:
+            top = self.__packed[-1]
+            start = self.__starts[top] + sum(self.lengths[top])
+        self.__packed.append(key)
+        self.__starts[key] = start
 
     def load(self, key, locations):
+        timer_start = default_timer()
         logger.debug("ByteStorage: Loading from location %d" % key)
+        decompressed, nbytes = self._fetch(key)
+        assert len(locations) == len(decompressed)
+        self._decode(decompressed, locations)
+        self._account_read(key, sum(x.nbytes for x in locations), nbytes,
+                           default_timer() - timer_start)
+        logger.debug("ByteStorage: Load complete")
+
+    def _fetch(self, key):
+        """Returns the decompressed arrays held in slot `key` and the number
+        of bytes read."""
         ptr, start, end = self.get_location(key)
         sizes = self.lengths[key]
         metadatas = self.metadata[key]
+        assert len(sizes) == len(metadatas)
 
-        assert len(locations) == len(sizes) == len(metadatas)
-
-        offset = 0
-        for actual_size, metadata, location in zip(sizes, metadatas, locations):
+        arrays = []
+        for actual_size, metadata in zip(sizes, metadatas):
             logger.debug("Start: %d, End: %d" % (start, end))
-            start += offset
             compressed_data = self.storage[start:(start + actual_size)]
             compressed_object = CompressedObject(compressed_data, metadata=metadata)
+            arrays.append(self.decompressor(compressed_object))
+            start += actual_size
+        return arrays, sum(sizes)
 
-            decompressed = self.decompressor(compressed_object)
-            location[:] = decompressed
-            offset += actual_size
-        logger.debug("ByteStorage: Load complete")
+    def _decode(self, arrays, locations):
+        """Copies arrays in storage representation into `locations`"""
+        if self.__encoded is None:
+            for array, location in zip(arrays, locations):
+                location[:] = array
+            return
+        for field, array, location in zip(self.layout, arrays, locations):
+            field.decode(array.reshape(field.shape), location)
+
+
+def _bits(array):
+    """Returns the bit pattern of `array` as unsigned integers"""
+    return array.view(np.dtype("u%d" % array.dtype.itemsize))
+
+
+class DeltaStorage(BytesStorage):
+    """
+    BytesStorage that saves a checkpoint as its difference from the
+    checkpoint in the slot below it, which is kept in the same storage.
+    Consecutive checkpoints of a slowly varying state are highly
+    correlated, so the differences compress much better than the states.
+
+    By default the difference is the bitwise XOR of the two states, which
+    is lossless: unchanged entries become exact zeros and slowly changing
+    ones keep mostly-zero high bits. With `quantum`, floating-point fields
+    store round((new - reference) / quantum) as `quantized_dtype`, and the
+    reference of the next checkpoint is the reconstructed state, so the
+    error of every restore stays within quantum / 2. Checkpoints whose
+    quantized difference does not fit `quantized_dtype` are stored whole.
+
+    The reference policy follows the LIFO order of the Revolve schedulers:
+    the checkpoint in slot `key` refers to slot `key - 1`, and saving into
+    slot `key` discards every slot above it, so a reference is never
+    overwritten while a difference depends on it. At most `max_chain`
+    differences follow a whole checkpoint, which bounds the cost of a
+    restore. The last reconstructed state is cached, which makes repeated
+    restores of the same slot and saves on top of it cheap; this costs
+    memory for one extra checkpoint.
+    """
+
+    def __init__(
+        self,
+        size_ckp,
+        n_ckp,
+        dtype,
+        compression,
+        max_chain=8,
+        quantum=None,
+        quantized_dtype=np.int16,
+        auto_pickle=False,
+        profiler=None,
+        wd=0,
+        rd=0,
+        name="DeltaStorage",
+        capacity=None,
+    ):
+        super().__init__(size_ckp, n_ckp, dtype, compression, auto_pickle=auto_pickle,
+                         profiler=profiler, wd=wd, rd=rd, name=name,
+                         capacity=capacity)
+        if max_chain < 0:
+            raise ValueError("StorageError: max_chain must be non-negative.")
+        self.max_chain = max_chain
+        self.quantum = quantum
+        self.quantized_dtype = np.dtype(quantized_dtype)
+        # number of differences between each slot and its whole checkpoint
+        self.chain = {}
+        self.__cache_key = None
+        self.__cache = None
+
+    def reset(self, keep_layout=False):
+        super().reset(keep_layout)
+        self.chain = {}
+        self.__cache_key = None
+        self.__cache = None
+
+    def _quantized(self, array):
+        return self.quantum is not None and array.dtype.kind == "f"
+
+    def save(self, key, data):
+        timer_start = default_timer()
+        states = [np.array(x) for x in self._encode(data)]
+        for k in [k for k in self.chain if k >= key]:
+            del self.chain[k]
+        if self.__cache_key is not None and self.__cache_key >= key:
+            self.__cache_key = self.__cache = None
+
+        deltas = None
+        depth = self.chain.get(key - 1)
+        if depth is not None and depth < self.max_chain:
+            deltas, states = self._delta(self._reconstruct(key - 1)[0], states)
+        if deltas is None:
+            nbytes = self._store(key, states)
+            self.chain[key] = 0
+        else:
+            nbytes = self._store(key, deltas)
+            self.chain[key] = depth + 1
+        self.__cache_key, self.__cache = key, states
+        self._account_write(key, sum(x.nbytes for x in data), nbytes,
+                            default_timer() - timer_start)
+
+    def _delta(self, references, states):
+        """Returns the differences of `states` from `references` and the
+        states a restore will reconstruct, or None if the differences do
+        not fit the quantized dtype."""
+        deltas = []
+        restored = []
+        for ref, state in zip(references, states):
+            if not self._quantized(state):
+                deltas.append(_bits(ref) ^ _bits(state))
+                restored.append(state)
+                continue
+            q = np.rint((state - ref) / self.quantum)
+            info = np.iinfo(self.quantized_dtype)
+            if q.size and (q.min() < info.min or q.max() > info.max):
+                return None, states
+            deltas.append(q.astype(self.quantized_dtype))
+            restored.append((ref + q * self.quantum).astype(state.dtype))
+        return deltas, restored
+
+    def _reconstruct(self, key):
+        """Returns the states held in slot `key` and the bytes read to
+        reconstruct them."""
+        if self.__cache_key == key:
+            return self.__cache, 0
+        arrays, nbytes = self._fetch(key)
+        if self.chain[key] == 0:
+            states = [np.array(x) for x in arrays]
+        else:
+            references, ref_nbytes = self._reconstruct(key - 1)
+            nbytes += ref_nbytes
+            states = []
+            for ref, delta in zip(references, arrays):
+                delta = delta.reshape(ref.shape)
+                if self._quantized(ref):
+                    states.append((ref + delta * self.quantum).astype(ref.dtype))
+                else:
+                    states.append((_bits(ref) ^ delta).view(ref.dtype))
+        self.__cache_key, self.__cache = key, states
+        return states, nbytes
+
+    def load(self, key, locations):
+        timer_start = default_timer()
+        states, nbytes = self._reconstruct(key)
+        assert len(locations) == len(states)
+        self._decode(states, locations)
+        self._account_read(key, sum(x.nbytes for x in locations), nbytes,
+                           default_timer() - timer_start)
+
+
+class StoragePool(object):
+    """
+    Keeps the storages of finished runs, so that a new revolver asking for
+    the same kind of storage (type, slot size, number of slots, dtype and
+    allocation options) reuses their memory, or their open and pre-sized
+    checkpoint files, instead of allocating new ones. Storages are taken
+    with 'acquire' and given back with 'release' (see
+    'BaseRevolver.release_storage'); idle storages are dropped with
+    'evict', or as soon as they exceed `max_idle_bytes`.
+    `storage_pool` is a process-wide instance.
+    """
+
+    def __init__(self, max_idle_bytes=None):
+        self.max_idle_bytes = max_idle_bytes
+        # idle storages by request, and in order of release
+        self.__idle = {}
+        self.__released = []
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def __request(storage_type, size_ckp, n_ckp, dtype, options):
+        return (storage_type, size_ckp, n_ckp, np.dtype(dtype).str,
+                repr(sorted(options.items())))
+
+    def acquire(self, storage_type, size_ckp, n_ckp, dtype, profiler=None, wd=0, rd=0,
+                name=None, **options):
+        """
+        Returns an idle storage_type(size_ckp, n_ckp, dtype, **options),
+        or a new one if there is none. Pre-sizes new storages (see
+        'Storage.preallocate').
+        @params:
+            storage_type: storage class, e.g. NumpyStorage or DiskStorage
+            profiler:     profiler of the new owner
+            wd, rd, name: costs and name, which are not part of the request
+            options:      keyword arguments of storage_type
+        """
+        request = self.__request(storage_type, size_ckp, n_ckp, dtype, options)
+        idle = self.__idle.get(request)
+        if idle:
+            storage = idle.pop()
+            self.__released.remove(storage)
+            self.hits += 1
+        else:
+            kwargs = dict(options)
+            if name is not None:
+                kwargs["name"] = name
+            storage = storage_type(size_ckp, n_ckp, dtype, profiler=profiler, **kwargs)
+            storage.preallocate()
+            storage.pool = self
+            storage.pool_request = request
+            self.misses += 1
+        storage.profiler = profiler
+        storage.wd = wd
+        storage.rd = rd
+        if name is not None:
+            storage.name = name
+        return storage
+
+    def release(self, storage):
+        """Gives back a storage taken with 'acquire', dropping its data"""
+        if storage.pool is not self:
+            raise ValueError("StorageError: %s was not taken from this pool."
+                             % storage.name)
+        if storage in self.__released:
+            return
+        storage.reset()
+        storage.profiler = None
+        self.__idle.setdefault(storage.pool_request, []).append(storage)
+        self.__released.append(storage)
+        if self.max_idle_bytes is not None:
+            while self.idle_bytes > self.max_idle_bytes:
+                self.__drop(self.__released[0])
+
+    def __drop(self, storage):
+        self.__released.remove(storage)
+        self.__idle[storage.pool_request].remove(storage)
+        # disk storages remove their files once collected
+        storage.pool = None
+
+    def evict(self, storage_type=None):
+        """Drops the idle storages (of storage_type only, if given)"""
+        for storage in list(self.__released):
+            if storage_type is None or isinstance(storage, storage_type):
+                self.__drop(storage)
+
+    @property
+    def n_idle(self):
+        return len(self.__released)
+
+    @property
+    def idle_bytes(self):
+        """Bytes held by idle storages"""
+        return sum(st.maxsize_in_bytes for st in self.__released)
+
+
+storage_pool = StoragePool()
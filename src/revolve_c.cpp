@@ -49,6 +49,22 @@ extern "C" int revolve_getwhere(CRevolve r)
 extern "C" void revolve_set_info(CRevolve r, int inf) { ((Revolve*) r.ptr)->set_info(inf); }
 extern "C" void revolve_turn(CRevolve r, int final) { ((Revolve*) r.ptr)->turn(final); }
 
+extern "C" int revolve_get_write_and_read_counts(CRevolve r, int* counts, int n)
+{
+  vector <int> v = ((Revolve*) r.ptr)->get_write_and_read_counts();
+  for (int i = 0; i < n && i < (int) v.size(); i++)
+    counts[i] = v[i];
+  return v.size();
+}
+extern "C" int revolve_get_number_of_writes_i(CRevolve r, int l, int c, int i)
+{
+  return ((Revolve*) r.ptr)->get_number_of_writes_i(l, c, i);
+}
+extern "C" int revolve_get_number_of_reads_i(CRevolve r, int l, int c, int i)
+{
+  return ((Revolve*) r.ptr)->get_number_of_reads_i(l, c, i);
+}
+
 const char* revolve_caction_string(CACTION action) { 
  static const char *CACTION_NAME[] = { "advance", "takeshot", "restore", "firsturn", "youturn", "terminate", "error"};
  return CACTION_NAME[action];
@@ -0,0 +1,147 @@
+from utils import IncrementCheckpoint, IncOperator, InplaceCheckpoint
+from utils import build, run, sweep
+from pyrevolve import MemoryRevolver, DiskRevolver, StoreAllRevolver
+from pyrevolve import MultiLevelRevolver, NumpyStorage, DiskStorage
+import asyncio
+import threading
+import numpy as np
+import pytest
+
+
+class AsyncIncOperator(IncOperator):
+    """IncOperator whose apply is a coroutine, yielding to the event loop
+    before each step"""
+    def __init__(self, direction, u, v=None, log=None, name=None):
+        super().__init__(direction, u, v)
+        self.log = log
+        self.name = name
+        self.threads = set()
+
+    async def apply(self, **kwargs):
+        await asyncio.sleep(0)
+        self.threads.add(threading.get_ident())
+        if self.log is not None:
+            self.log.append(self.name)
+        super().apply(**kwargs)
+
+
+def make_revolver(cp, f, b, nt, ncp, kind):
+    if kind == "memory":
+        return MemoryRevolver(cp, f, b, ncp, nt)
+    if kind == "disk":
+        return DiskRevolver(cp, f, b, ncp, nt, fast_slots=1)
+    if kind == "storeall":
+        return StoreAllRevolver(cp, f, b, nt)
+    storages = [NumpyStorage(cp.size, 2, cp.dtype),
+                DiskStorage(cp.size, nt, cp.dtype, filedir="./")]
+    return MultiLevelRevolver(cp, f, b, nt, storage_list=storages)
+
+
+def assert_same_states(states, async_states):
+    assert [t for t, _ in async_states] == [t for t, _ in states]
+    for (_, u), (_, async_u) in zip(states, async_states):
+        assert np.all(u == async_u)
+
+
+@pytest.mark.parametrize("kind", ["memory", "disk", "storeall", "multilevel"])
+@pytest.mark.parametrize("nt, ncp", [(1, 1), (10, 2), (30, 4)])
+@pytest.mark.parametrize("checkpoint_type", [IncrementCheckpoint, InplaceCheckpoint])
+def test_async_matches_sync(kind, nt, ncp, checkpoint_type):
+    results = [run(make_revolver, nt, nt, ncp, kind, checkpoint=checkpoint_type,
+                   record=True, asynchronous=asynchronous)
+               for asynchronous in (False, True)]
+    (_, _, _, f, b), (_, _, _, async_f, async_b) = results
+    assert async_f.counter == f.counter
+    assert len(async_b.states) == len(b.states) == nt
+    assert_same_states(b.states, async_b.states)
+
+
+@pytest.mark.parametrize("nt, stride", [(10, 3), (50, 10)])
+def test_async_cache(nt, stride):
+    b = run(StoreAllRevolver, nt, nt, record=True)[4]
+    rev, _, _, _, async_b = run(StoreAllRevolver, nt, nt, stride=stride, cache=True,
+                                record=True, asynchronous=True)
+    assert rev.avoided_steps > 0
+    assert_same_states(b.states, async_b.states)
+
+
+@pytest.mark.parametrize("nt, stride", [(20, 5), (50, 10)])
+def test_async_cache_coroutine_operator(nt, stride):
+    b = run(StoreAllRevolver, nt, nt, record=True)[4]
+    rev, df, _, _, async_b = build(StoreAllRevolver, nt, nt, stride=stride,
+                                   cache=True, record=True)
+    rev.fwd_operator = AsyncIncOperator(1, df)
+    sweep(rev, asynchronous=True)
+    assert rev.avoided_steps > 0
+    assert_same_states(b.states, async_b.states)
+
+
+def test_async_release():
+    _, _, _, f, b = run(MemoryRevolver, 40, 4, 40, record=True)
+    rev, _, _, async_f, async_b = build(MemoryRevolver, 40, 4, 40, record=True)
+    rev.enable_release()
+    sweep(rev, asynchronous=True)
+    assert len(rev.released) == 4
+    assert async_f.counter == f.counter
+    assert_same_states(b.states, async_b.states)
+
+
+def test_coroutine_operators_run_on_the_loop():
+    u = np.zeros(16)
+    v = np.zeros(16)
+    f = AsyncIncOperator(1, u)
+    b = AsyncIncOperator(-1, u, v)
+    rev = MemoryRevolver(IncrementCheckpoint([u]), f, b, 3, 20)
+
+    async def main():
+        await rev.async_apply_forward()
+        await rev.async_apply_reverse()
+        return threading.get_ident()
+    loop_thread = asyncio.run(main())
+    assert f.threads == b.threads == {loop_thread}
+    assert b.counter == 20
+
+
+def test_revolvers_interleave():
+    log = []
+    revolvers = []
+    for name in ("a", "b"):
+        u = np.zeros(16)
+        v = np.zeros(16)
+        f = AsyncIncOperator(1, u, log=log, name=name)
+        b = AsyncIncOperator(-1, u, v, log=log, name=name)
+        revolvers.append((MemoryRevolver(IncrementCheckpoint([u]), f, b, 3, 20), b))
+
+    async def drive(rev):
+        await rev.async_apply_forward()
+        await rev.async_apply_reverse()
+
+    async def main():
+        await asyncio.gather(*(drive(rev) for rev, _ in revolvers))
+    asyncio.run(main())
+    # each revolver ran its operators before the other one finished
+    assert log.index("b") < len(log) - 1 - log[::-1].index("a")
+    assert log.index("a") < len(log) - 1 - log[::-1].index("b")
+    for _, b in revolvers:
+        assert b.counter == 20
+
+
+def test_native_async_storage():
+    rev, _, _, _, b = build(MemoryRevolver, 20, 3, 20, record=True)
+    storage = rev.storage_list[0]
+    calls = {"save": 0, "load": 0}
+
+    async def async_save(key, data_pointers):
+        calls["save"] += 1
+        storage.save(key, data_pointers)
+
+    async def async_load(key, locations):
+        calls["load"] += 1
+        storage.load(key, locations)
+
+    storage.async_save = async_save
+    storage.async_load = async_load
+    sweep(rev, asynchronous=True)
+    assert calls["save"] == storage.n_writes > 0
+    assert calls["load"] == storage.n_reads > 0
+    assert [t for t, _ in b.states] == list(range(19, -1, -1))
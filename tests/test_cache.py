@@ -0,0 +1,45 @@
+from utils import build
+from pyrevolve import SingleLevelRevolver, StoreAllRevolver
+import numpy as np
+import pytest
+
+
+def run(revolver_type, nt, *args, sweeps=1, **kwargs):
+    rev, _, db, f, _ = build(revolver_type, nt, *args, **kwargs)
+    rev.apply_forward()
+    results = []
+    for _ in range(sweeps):
+        db[:] = 0
+        rev.apply_reverse()
+        results.append(db.copy())
+    return rev, f.counter, results
+
+
+@pytest.mark.parametrize("nt, stride", [(10, 3), (50, 5), (50, 10), (101, 20)])
+def test_cache_storeall(nt, stride):
+    _, steps, results = run(StoreAllRevolver, nt, nt, stride=stride)
+    rev, cached_steps, cached_results = run(StoreAllRevolver, nt, nt, stride=stride,
+                                            cache=True)
+    assert np.all(results[0] == cached_results[0])
+    assert rev.avoided_steps > 0
+    assert cached_steps == steps - rev.avoided_steps
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 2), (30, 4), (50, 12)])
+@pytest.mark.parametrize("kwargs", [{}, {'retain': True}, {'costs': 'window'}])
+def test_cache_single_level(nt, ncp, kwargs):
+    if kwargs.get('costs') == 'window':
+        kwargs = {'costs': np.where((np.arange(nt) > nt // 4)
+                                    & (np.arange(nt) < nt // 2), 10., 1.)}
+    sweeps = 3 if kwargs.get('retain') else 1
+    _, steps, results = run(SingleLevelRevolver, nt, ncp, nt, sweeps=sweeps, **kwargs)
+    rev, cached_steps, cached_results = run(SingleLevelRevolver, nt, ncp, nt,
+                                            sweeps=sweeps, cache=True, **kwargs)
+    for a, b in zip(results, cached_results):
+        assert np.all(a == b)
+    assert cached_steps == steps - rev.avoided_steps
+
+
+def test_cache_needs_fixed_slots():
+    with pytest.raises(ValueError):
+        run(StoreAllRevolver, 10, 10, stride=2, capacity=10000, cache=True)
@@ -2,7 +2,8 @@ import numpy as np
 import pytest
 
 from pyrevolve.compression import (compressors, decompressors,
-                                   init_compression, compressors_available)
+                                   init_compression, compressors_available,
+                                   ZeroBlockEncoder)
 from pyrevolve import Revolver
 from utils import IncrementOperator, YoCheckpoint
 
@@ -73,3 +74,30 @@ def test_compression_is_used():
     assert(counters[0] >= ncp)
     revolver.apply_reverse()
     assert(counters[1] >= counters[0])
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 16, 64])
+@pytest.mark.parametrize("nbytes", [0, 5, 64, 1001])
+def test_zero_blocks_reversible(block_size, nbytes):
+    rng = np.random.default_rng(block_size + nbytes)
+    data = np.zeros(nbytes, dtype=np.uint8)
+    nonzero = rng.choice(nbytes, size=nbytes // 10, replace=False) if nbytes else []
+    data[nonzero] = rng.integers(1, 255, size=len(nonzero))
+    encoder = ZeroBlockEncoder(block_size)
+    packed = np.empty_like(data)
+    bitmap, n = encoder.encode(data, packed)
+    mask = encoder.mask(data)
+    assert n <= min(nbytes, np.count_nonzero(mask) * block_size)
+    out = np.full_like(data, 255)
+    encoder.decode(packed, bitmap, out)
+    assert np.all(out == data)
+
+
+def test_zero_blocks_compressor():
+    a = np.zeros((100, 100))
+    a[40:60, 40:60] = np.linspace(1, 2, 400).reshape(20, 20)
+    compressor, decompressor = init_compression({'scheme': 'zeroblock',
+                                                 'block_size': 256})
+    compressed = compressor(a)
+    assert len(compressed.data) < a.nbytes // 4
+    assert np.all(decompressor(compressed) == a)
@@ -0,0 +1,100 @@
+from utils import IncrementCheckpoint, IncOperator
+from pyrevolve import (SingleLevelRevolver, MemoryRevolver, DiskRevolver,
+                       StoreAllRevolver, ParallelReverse)
+from pyrevolve.parallel import live_checkpoints
+import numpy as np
+import pytest
+
+
+class Problem(object):
+    def __init__(self, nt):
+        self.nt = nt
+        self.df = np.zeros([nt, 10])
+        self.db = np.zeros([nt, 10])
+        self.cp = IncrementCheckpoint([self.df])
+        self.f = IncOperator(1, self.df)
+        self.b = IncOperator(-1, self.df, self.db)
+        self.trace = []
+        b_apply = self.b.apply
+
+        def apply(**kwargs):
+            b_apply(**kwargs)
+            self.trace.append((kwargs['t_start'], self.db.copy()))
+        self.b.apply = apply
+
+    def factory(self):
+        df = np.zeros([self.nt, 10])
+        return IncrementCheckpoint([df]), IncOperator(1, df)
+
+
+def test_live_checkpoints():
+    assert live_checkpoints({0: 0, 1: 5, 2: 9}) == {0: 0, 5: 1, 9: 2}
+    # saving key 1 again supersedes key 2
+    assert live_checkpoints({0: 0, 2: 9, 1: 12}) == {0: 0, 12: 1}
+
+
+@pytest.mark.parametrize("nt", [1, 2, 10, 41])
+@pytest.mark.parametrize("n_workers, block", [(1, None), (3, None), (2, 2)])
+@pytest.mark.parametrize("revolver_type, args, kwargs", [
+    (MemoryRevolver, (3,), {}),
+    (DiskRevolver, (4,), {}),
+    (SingleLevelRevolver, (3,), {'costs': 'varying'}),
+    (StoreAllRevolver, (), {'stride': 4}),
+])
+def test_parallel_reverse(nt, n_workers, block, revolver_type, args, kwargs):
+    if kwargs.get('costs') == 'varying':
+        kwargs = dict(costs=np.arange(nt) % 3 + 1.)
+    traces = []
+    for parallel in [False, True]:
+        p = Problem(nt)
+        rev = revolver_type(p.cp, p.f, p.b, *args, nt, **kwargs)
+        if parallel:
+            engine = ParallelReverse(rev, p.factory, n_workers=n_workers, block=block)
+            engine.apply_forward()
+            engine.apply_reverse()
+            assert engine.stats["workers"] == n_workers
+        else:
+            rev.apply_forward()
+            rev.apply_reverse()
+        assert p.b.counter == nt
+        traces.append(p.trace)
+    # every reverse step sees the same forward state, in the same order
+    assert [t for t, _ in traces[0]] == [t for t, _ in traces[1]]
+    assert all(np.all(a == b) for (_, a), (_, b) in zip(*traces))
+    # the revolver was reset and can run again
+    rev.apply_forward()
+    rev.apply_reverse()
+
+
+def test_parallel_reverse_rejects_multiple_sweeps():
+    p = Problem(10)
+    rev = SingleLevelRevolver(p.cp, p.f, p.b, 3, 10, retain=True)
+    with pytest.raises(ValueError):
+        ParallelReverse(rev, p.factory)
+
+
+@pytest.mark.parametrize("memory_budget", [None, 3, 20])
+def test_parallel_reverse_bounds_buffers(memory_budget):
+    nt, ncp, n_workers = 1000, 10, 7
+    p = Problem(nt)
+    rev = MemoryRevolver(p.cp, p.f, p.b, ncp, nt)
+    nbytes = p.cp.nbytes
+    if memory_budget is not None:
+        memory_budget *= nbytes
+    engine = ParallelReverse(rev, p.factory, n_workers=n_workers,
+                             memory_budget=memory_budget)
+    engine.apply_forward()
+    engine.apply_reverse()
+    assert p.b.counter == nt
+    budget = memory_budget or ncp * nbytes
+    assert 0 < engine.stats["buffer_states"] * nbytes <= budget
+
+
+def test_parallel_reverse_rejects_small_budgets():
+    p = Problem(10)
+    rev = MemoryRevolver(p.cp, p.f, p.b, 3, 10)
+    with pytest.raises(ValueError):
+        ParallelReverse(rev, p.factory, memory_budget=p.cp.nbytes - 1)
+    with pytest.raises(ValueError):
+        ParallelReverse(rev, p.factory, n_workers=2, block=2,
+                        memory_budget=5 * p.cp.nbytes)
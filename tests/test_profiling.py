@@ -0,0 +1,73 @@
+from pyrevolve.profiling import Histogram, Profiler
+from pyrevolve import Revolver
+from utils import SimpleOperator, SimpleCheckpoint
+from utils import IncrementCheckpoint, IncOperator
+import numpy as np
+import json
+import pytest
+
+
+@pytest.mark.parametrize("p", [50, 90, 99, 100])
+def test_histogram_percentiles(p):
+    hist = Histogram()
+    values = [0.001 * (i + 1) for i in range(1000)]
+    for v in values:
+        hist.record(v)
+    exact = values[int(p / 100. * len(values)) - 1]
+    relerr = 2 ** (1. / hist.sub_buckets) - 1
+    assert abs(hist.percentile(p) - exact) <= relerr * exact
+    assert hist.max == values[-1]
+
+
+def test_histogram_constant_size():
+    hist = Histogram()
+    n_buckets = len(hist.buckets)
+    for i in range(10000):
+        hist.record(i * 0.1)
+    assert len(hist.buckets) == n_buckets
+    assert hist.count == 10000
+
+
+def test_profiler_exports_percentiles():
+    profiler = Profiler()
+    cp = SimpleCheckpoint()
+    f = SimpleOperator()
+    b = SimpleOperator()
+
+    rev = Revolver(cp, f, b, 3, 10, profiler=profiler)
+    rev.apply_forward()
+    rev.apply_reverse()
+    results = profiler.get_dict()
+    for key in ('p50', 'p90', 'p99', 'max'):
+        assert 'reverse_advance_%s' % key in results
+    assert float(results['reverse_advance_p50']) <= \
+        float(results['reverse_advance_max'])
+    assert 'p99=' in profiler.summary()
+
+
+@pytest.mark.parametrize("capacity", [5, 1000])
+def test_chrome_trace_export(tmpdir, capacity):
+    profiler = Profiler()
+    tracer = profiler.enable_tracing(capacity)
+    nt = 10
+    df = np.zeros([nt, 3])
+    db = np.zeros([nt, 3])
+    cp = IncrementCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+
+    rev = Revolver(cp, f, b, 3, nt, profiler=profiler)
+    rev.apply_forward()
+    rev.apply_reverse()
+    assert len(tracer.events) == min(capacity, tracer.n_events)
+
+    filename = str(tmpdir.join("trace.json"))
+    tracer.dump(filename)
+    with open(filename) as fh:
+        trace = json.load(fh)
+    events = trace["traceEvents"]
+    assert len(events) == len(tracer.events)
+    assert trace["otherData"]["dropped_events"] == tracer.dropped
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+    reverses = [e for e in events if e["name"] == "reverse"]
+    assert all("capo" in e["args"] for e in reverses)
@@ -1,6 +1,12 @@
-from utils import SimpleOperator, SimpleCheckpoint
-from pyrevolve import Revolver
-
+from utils import SimpleOperator, SimpleCheckpoint, IncrementCheckpoint, IncOperator
+from utils import RecordOperator, run
+from pyrevolve import Revolver, MemoryRevolver, DiskRevolver, fewest_writes
+from pyrevolve import ParallelReverse
+from pyrevolve import crevolve as cr
+from pyrevolve.schedulers import CRevolve
+from pyrevolve.schedulers import slot_counts
+
+import numpy as np
 import pytest
 
 
@@ -78,3 +84,96 @@ def test_num_loads_and_saves(nt, ncp):
 #    rev.apply_reverse()
 #    assert(cp.save_pointers == cp.load_pointers)
 #    assert(len(cp.save_pointers) == min(ncp, nt - 1))
+
+
+# the closed forms of revolve.cpp are exact for up to three sweeps
+@pytest.mark.parametrize("nt, ncp", [(10, 2), (10, 3), (23, 5), (50, 8),
+                                     (100, 13), (200, 20)])
+def test_closed_form_slot_counts(nt, ncp):
+    scheduler = CRevolve(ncp, nt)
+    assert cr.write_counts(nt, ncp) == scheduler.write_counts
+    assert cr.read_counts(nt, ncp) == scheduler.read_counts
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 1), (23, 3), (100, 5), (200, 8)])
+def test_slot_counts(nt, ncp):
+    scheduler = CRevolve(ncp, nt)
+    assert slot_counts(ncp, nt) == (scheduler.write_counts, scheduler.read_counts)
+
+
+@pytest.mark.parametrize("nt, ncp, tolerance", [(50, 10, 0.), (100, 13, 0.),
+                                                (100, 13, 0.2), (200, 20, 0.5)])
+def test_fewest_writes(nt, ncp, tolerance):
+    c = fewest_writes(ncp, nt, tolerance)
+    assert c <= ncp
+    assert cr.numforw(nt, c) <= (1 + tolerance) * cr.numforw(nt, ncp)
+    assert sum(slot_counts(c, nt)[0]) <= sum(slot_counts(ncp, nt)[0])
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 2), (30, 4), (50, 10)])
+@pytest.mark.parametrize("fast_slots", [0, 1, 3, 20])
+@pytest.mark.parametrize("minimize_writes", [False, True])
+def test_disk_revolver_placement(nt, ncp, fast_slots, minimize_writes):
+    _, _, _, f, b = run(MemoryRevolver, nt, ncp, nt, record=True)
+    _, _, _, disk_f, disk_b = run(DiskRevolver, nt, ncp, nt, fast_slots=fast_slots,
+                                  minimize_writes=minimize_writes, record=True)
+    assert disk_f.counter == f.counter
+    assert len(disk_b.states) == len(b.states)
+    for (t, u), (disk_t, disk_u) in zip(b.states, disk_b.states):
+        assert t == disk_t
+        assert np.all(u == disk_u)
+
+
+class FusedOperator(RecordOperator):
+    """Reverse operator that also runs the forward step when fused"""
+    def __init__(self, u, fwd):
+        super().__init__(u)
+        self.fwd = fwd
+        self.fused = 0
+
+    def apply_fused(self, **kwargs):
+        self.fwd.apply(**kwargs)
+        self.apply(**kwargs)
+        self.fused += 1
+
+
+@pytest.mark.parametrize("nt, ncp", [(1, 1), (10, 2), (30, 4), (50, 10)])
+@pytest.mark.parametrize("fuse", [True, False])
+def test_fused_reverse(nt, ncp, fuse):
+    _, _, _, ref_f, ref_b = run(MemoryRevolver, nt, ncp, nt, record=True)
+    states, forward = ref_b.states, ref_f.counter
+    u = np.zeros([nt, 10])
+    f = IncOperator(1, u)
+    b = FusedOperator(u, f)
+    rev = MemoryRevolver(IncrementCheckpoint([u]), f, b, ncp, nt)
+    rev.fuse_reverse = fuse
+    rev.apply_forward()
+    rev.apply_reverse()
+    # REVSTART runs the reverse operator alone, every other step is fused
+    assert b.fused == (nt - 1 if fuse else 0)
+    assert f.counter == forward
+    assert len(b.states) == len(states)
+    for (t, u), (fused_t, fused_u) in zip(states, b.states):
+        assert t == fused_t
+        assert np.all(u == fused_u)
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 2), (30, 4)])
+def test_fused_parallel_reverse(nt, ncp):
+    states = run(MemoryRevolver, nt, ncp, nt, record=True)[4].states
+    u = np.zeros([nt, 10])
+    f = IncOperator(1, u)
+    b = FusedOperator(u, f)
+    rev = MemoryRevolver(IncrementCheckpoint([u]), f, b, ncp, nt)
+
+    def factory():
+        w = np.zeros([nt, 10])
+        return IncrementCheckpoint([w]), IncOperator(1, w)
+
+    engine = ParallelReverse(rev, factory, n_workers=2)
+    engine.apply_forward()
+    engine.apply_reverse()
+    assert b.fused == nt - 1
+    assert [t for t, _ in b.states] == [t for t, _ in states]
+    for (_, u), (_, fused_u) in zip(states, b.states):
+        assert np.all(u == fused_u)
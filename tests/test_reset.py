@@ -0,0 +1,64 @@
+from utils import InplaceCheckpoint, build
+from pyrevolve import (SingleLevelRevolver, MultiLevelRevolver, MemoryRevolver,
+                       DiskRevolver, StoreAllRevolver, NumpyStorage, DiskStorage)
+from pyrevolve.schedulers import Action, CRevolve, WeightedRevolve, StoreAll, Retain
+import numpy as np
+import pytest
+
+
+def actions(scheduler):
+    oplist = []
+    while True:
+        a = scheduler.next()
+        oplist.append((a.type, a.capo, a.old_capo, a.ckp))
+        if a.type == Action.TERMINATE:
+            return oplist
+
+
+@pytest.mark.parametrize("make", [lambda: CRevolve(3, 20),
+                                  lambda: WeightedRevolve(3, 20),
+                                  lambda: StoreAll(20, stride=4),
+                                  lambda: Retain(CRevolve(3, 20))])
+def test_scheduler_reset(make):
+    scheduler = make()
+    first = actions(scheduler)
+    scheduler.reset()
+    assert actions(scheduler) == first
+    assert actions(make()) == first
+
+
+def multilevel(cp, f, b, nt):
+    storages = [NumpyStorage(cp.size, 3, cp.dtype),
+                DiskStorage(cp.size, nt, cp.dtype, wd=2, rd=2)]
+    return MultiLevelRevolver(cp, f, b, nt, storage_list=storages)
+
+
+@pytest.mark.parametrize("nt", [1, 10, 33])
+@pytest.mark.parametrize("revolver_type, args, kwargs", [
+    (MemoryRevolver, (4,), {}),
+    (DiskRevolver, (4,), {}),
+    (SingleLevelRevolver, (4,), {'costs': 'varying', 'cache': True}),
+    (SingleLevelRevolver, (4,), {'checkpoint': InplaceCheckpoint}),
+    (StoreAllRevolver, (), {'stride': 3, 'cache': True}),
+    (multilevel, (), {}),
+])
+def test_revolver_reset(nt, revolver_type, args, kwargs):
+    if kwargs.get('costs') == 'varying':
+        kwargs = dict(kwargs, costs=np.arange(nt) % 3 + 1.)
+    rev, df, db, f, b = build(revolver_type, nt, *args, nt, **kwargs)
+    storages = [st.storage if isinstance(st, NumpyStorage) else st
+                for st in rev.storage_list]
+    results = []
+    for _ in range(3):
+        df[:] = 0
+        db[:] = 0
+        rev.apply_forward()
+        assert np.all(df == nt)
+        rev.apply_reverse()
+        results.append(db.copy())
+        rev.reset()
+    assert all(np.all(r == results[0]) for r in results)
+    assert b.counter == 3 * nt
+    # nothing was reallocated
+    assert storages == [st.storage if isinstance(st, NumpyStorage) else st
+                        for st in rev.storage_list]
@@ -0,0 +1,75 @@
+from utils import IncrementCheckpoint, IncOperator
+from pyrevolve import SingleLevelRevolver, MemoryRevolver
+from pyrevolve.schedulers import Action, CRevolve, WeightedRevolve, Retain
+import numpy as np
+import pytest
+
+
+def sweep(scheduler, slots, live):
+    """Runs one reverse sweep of `scheduler` on symbolic states, checking
+    that every restore finds the state its key was saved with"""
+    reversed_steps = []
+    while True:
+        a = scheduler.next()
+        if a.type == Action.TERMINATE:
+            return reversed_steps, live
+        if a.type in (Action.TAKESHOT, Action.RESTORE):
+            assert 0 <= a.ckp < scheduler.n_checkpoints
+        if a.type == Action.TAKESHOT:
+            slots[a.ckp] = live
+        elif a.type == Action.RESTORE:
+            assert slots[a.ckp] == a.capo
+            live = slots[a.ckp]
+        elif a.type == Action.ADVANCE:
+            assert a.old_capo == live
+            live = a.capo
+        elif a.type == Action.LASTFW:
+            assert a.capo == live
+            return reversed_steps, live
+        elif a.type in (Action.REVERSE, Action.REVSTART):
+            assert a.capo == live or a.type == Action.REVSTART
+            reversed_steps.append(a.capo)
+            live = a.capo + 1
+
+
+@pytest.mark.parametrize("nt", [2, 5, 10, 23, 50])
+@pytest.mark.parametrize("ncp", [1, 2, 3, 6, 60])
+@pytest.mark.parametrize("scheduler_type", [CRevolve, WeightedRevolve])
+def test_retain_schedule(scheduler_type, nt, ncp):
+    scheduler = Retain(scheduler_type(ncp, nt))
+    slots = {}
+    _, live = sweep(scheduler, slots, 0)
+    forward = dict(slots)
+    assert len(forward) == min(ncp, nt - 1)
+    for _ in range(3):
+        steps, live = sweep(scheduler, slots, live)
+        assert steps == list(range(nt - 1, -1, -1))
+        assert all(slots[k] == v for k, v in forward.items())
+    assert scheduler.n_sweeps == 3
+    assert scheduler.replay_ratio < 1 + scheduler.ratio
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 2), (30, 4), (50, 10)])
+def test_retain_revolver(nt, ncp):
+    df = np.zeros([nt, 10])
+    db = np.zeros([nt, 10])
+    cp = IncrementCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+    ref_db = np.zeros_like(db)
+    ref = MemoryRevolver(IncrementCheckpoint([df]), f, IncOperator(-1, df, ref_db),
+                         ncp, nt)
+    ref.apply_forward()
+    ref.apply_reverse()
+
+    df[:] = 0
+    f.counter = 0
+    rev = SingleLevelRevolver(cp, f, b, ncp, nt, retain=True)
+    rev.apply_forward()
+    assert f.counter == nt
+    for _ in range(3):
+        db[:] = 0
+        rev.apply_reverse()
+        assert b.counter > 0
+        assert np.all(db == ref_db)
+    assert rev.retain_extra_bytes == max(rev.n_checkpoints - ncp, 0) * cp.nbytes
@@ -0,0 +1,65 @@
+from utils import IncrementCheckpoint, IncOperator
+from pyrevolve import SingleLevelRevolver, ShotDriver, plan_shots
+from pyrevolve.schedulers import CRevolve, SharedSchedule, schedule_array
+import pyrevolve.crevolve as cr
+import numpy as np
+import pytest
+
+
+def adjoint_shot(args, scheduler):
+    """Runs one shot and returns its gradient and forward step count"""
+    nt, scale = args
+    df = np.zeros([nt, 10])
+    db = np.zeros([nt, 10])
+    cp = IncrementCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+    rev = SingleLevelRevolver(cp, f, b, None, nt, scheduler=scheduler)
+    rev.apply_forward()
+    rev.apply_reverse()
+    assert b.counter == nt
+    return scale * db, f.counter
+
+
+@pytest.mark.parametrize("nt, ncp", [(1, 1), (10, 2), (50, 7)])
+def test_shared_schedule(nt, ncp):
+    scheduler = CRevolve(ncp, nt)
+    shared = SharedSchedule(schedule_array(scheduler), ncp, nt)
+    assert shared.ratio == scheduler.ratio
+    assert shared.storage(0) == scheduler.storage(0)
+    for _ in range(2):
+        for a in scheduler.oplist:
+            b = shared.next()
+            assert (a.type, a.capo, a.old_capo) == (b.type, b.capo, b.old_capo)
+            assert a.ckp == b.ckp
+        shared.reset()
+
+
+def test_plan_shots():
+    nt, nbytes = 100, 1000
+    assert plan_shots(nt, nbytes, max_workers=4) == (4, cr.adjust(nt))
+    workers, ncp = plan_shots(nt, nbytes, memory_budget=40 * nbytes, max_workers=8)
+    assert workers * ncp * nbytes <= 40 * nbytes
+    for w in range(1, 9):
+        c = 40 // w
+        assert (w / (cr.numforw(nt, c) + nt)
+                <= workers / (cr.numforw(nt, ncp) + nt) + 1e-12)
+    with pytest.raises(ValueError):
+        plan_shots(nt, nbytes, memory_budget=nbytes // 2)
+
+
+@pytest.mark.parametrize("budget", [None, 3 * 10 * 8 * 30])
+def test_shot_driver(budget):
+    nt = 30
+    checkpoint_nbytes = nt * 10 * 8
+    driver = ShotDriver(nt, checkpoint_nbytes, memory_budget=budget, max_workers=3)
+    shots = [(nt, s) for s in range(7)]
+    results = driver.run(adjoint_shot, shots)
+    reference, steps = adjoint_shot((nt, 1), CRevolve(driver.n_checkpoints, nt))
+    assert len(results) == len(shots)
+    for (_, scale), (db, f_steps) in zip(shots, results):
+        assert np.all(db == scale * reference)
+        assert f_steps == steps
+    assert driver.stats["shots"] == len(shots)
+    assert driver.stats["shots_per_second"] > 0
+    assert driver.run(adjoint_shot, []) == []
@@ -1,10 +1,15 @@
 from pyrevolve.compression import init_compression, compressors_available
-from pyrevolve.storage import BytesStorage
+from pyrevolve.storage import BytesStorage, NumpyStorage, DiskStorage, DeltaStorage
+from pyrevolve.storage import omp_placement, StoragePool
+from pyrevolve.layout import CheckpointLayout
+from pyrevolve.profiling import Profiler
 from utils import SimpleOperator, SimpleCheckpoint
-from utils import IncrementCheckpoint, IncOperator
-from pyrevolve import SingleLevelRevolver
+from utils import IncrementCheckpoint, IncOperator, InplaceCheckpoint, run
+from pyrevolve import SingleLevelRevolver, MultiLevelRevolver
+from pyrevolve import MemoryRevolver, DiskRevolver
 import numpy as np
 import pytest
+import os
 
 
 @pytest.mark.parametrize("scheme", compressors_available)
@@ -88,3 +93,637 @@ def test_num_loads_and_saves(nt, ncp, singlefile, diskckp):
     rev.apply_reverse()
 
     assert(cp.load_counter >= cp.save_counter)
+
+
+@pytest.mark.parametrize("diskckp", [True, False])
+def test_storage_byte_accounting(diskckp):
+    nt = 10
+    ncp = 4
+    df = np.zeros([nt, ncp])
+    db = np.zeros([nt, ncp])
+    cp = IncrementCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+
+    rev = SingleLevelRevolver(cp, f, b, ncp, nt, diskstorage=diskckp)
+    rev.apply_forward()
+    storage = rev.storage_list[0]
+    stats = storage.stats()
+    assert stats["n_writes"] == ncp
+    assert stats["bytes_written"] == ncp * cp.nbytes
+    assert stats["raw_bytes_written"] == stats["bytes_written"]
+    assert stats["peak_slots"] == ncp
+    assert stats["peak_bytes"] == ncp * cp.nbytes
+    assert storage.size == ncp * cp.size
+    rev.apply_reverse()
+    stats = storage.stats()
+    assert stats["bytes_read"] == stats["n_reads"] * cp.nbytes
+    assert stats["read_bandwidth"] > 0
+
+    results = rev.profiler.get_dict()
+    assert results["%s_write_bytes" % storage.name] == stats["bytes_written"]
+    assert results["%s_read_bytes" % storage.name] == stats["bytes_read"]
+
+
+@pytest.mark.parametrize("scheme", compressors_available)
+def test_compressed_byte_accounting(scheme):
+    dtype = np.float64
+    compression = init_compression({'scheme': scheme})
+    store = BytesStorage(1000, 1, dtype, compression, False)
+    a = np.arange(100, dtype=dtype).reshape(10, 10)
+    store.save(0, [a])
+    store.load(0, [a])
+    stats = store.stats()
+    assert stats["raw_bytes_written"] == stats["raw_bytes_read"] == a.nbytes
+    assert stats["bytes_written"] == stats["bytes_read"] == store.size_in_bytes
+    assert stats["compression_ratio"] == a.nbytes / stats["bytes_written"]
+
+
+def test_stack_pop_frees_slots():
+    store = NumpyStorage(4, 3, np.float32, profiler=Profiler())
+    a = np.ones(4, dtype=np.float32)
+    store.push([a])
+    store.push([a])
+    assert store.size == 8
+    store.pop([a])
+    assert store.size == 4
+    assert store.stats()["peak_slots"] == 2
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 2), (10, 4), (10, 10)])
+@pytest.mark.parametrize("multilevel", [True, False])
+def test_inplace_checkpoint(nt, ncp, multilevel):
+    df = np.zeros([nt, ncp])
+    db = np.zeros([nt, ncp])
+    cp = InplaceCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+
+    if multilevel:
+        st_list = [NumpyStorage(cp.size, ncp, cp.dtype),
+                   NumpyStorage(cp.size, nt, cp.dtype, wd=2, rd=2)]
+        rev = MultiLevelRevolver(cp, f, b, nt, storage_list=st_list)
+    else:
+        rev = SingleLevelRevolver(cp, f, b, ncp, nt)
+    rev.apply_forward()
+    assert cp.fill_counter > 0
+    assert sum(st.stats()["n_writes"] for st in rev.storage_list) == cp.fill_counter
+    rev.apply_reverse()
+    assert b.counter == nt
+    assert np.count_nonzero(db) == 0
+
+
+def test_acquire_and_commit_slot():
+    store = NumpyStorage(10, 2, np.float32, profiler=Profiler())
+    a, b = store.acquire_slot(1, [(2, 3), (4,)])
+    a[:] = 1
+    b[:] = 2
+    store.commit_slot(1)
+    a1 = np.zeros((2, 3), dtype=np.float32)
+    b1 = np.zeros(4, dtype=np.float32)
+    store.load(1, [a1, b1])
+    assert np.all(a1 == 1) and np.all(b1 == 2)
+    assert store.size == 10
+
+
+def test_acquire_slot_unsupported(tmpdir):
+    store = DiskStorage(10, 2, np.float32, filedir=str(tmpdir), profiler=Profiler())
+    assert not store.supports_inplace
+    with pytest.raises(ValueError, match="StorageError"):
+        store.acquire_slot(0, [(10,)])
+    with pytest.raises(ValueError, match="StorageError"):
+        store.commit_slot(0)
+
+
+@pytest.mark.parametrize("diskckp", [True, False])
+def test_layout_inferred_and_shared(diskckp):
+    nt = 10
+    ncp = 3
+    df = np.zeros([nt, ncp])
+    dg = np.zeros([4, 5, 6])
+    db = np.zeros([nt, ncp])
+    cp = IncrementCheckpoint([df, dg])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+
+    rev = SingleLevelRevolver(cp, f, b, ncp, nt, diskstorage=diskckp)
+    assert rev.layout is None
+    rev.apply_forward()
+    layout = rev.layout
+    assert [fl.shape for fl in layout] == [df.shape, dg.shape]
+    assert [fl.offset for fl in layout] == [0, df.nbytes]
+    assert layout.nbytes == cp.nbytes
+    assert rev.storage_list[0].layout is layout
+    rev.apply_reverse()
+    assert b.counter == nt
+    assert np.count_nonzero(db) == 0
+
+
+@pytest.mark.parametrize("diskckp", [True, False])
+def test_layout_non_contiguous_fields(diskckp):
+    store = NumpyStorage(12, 2, np.float64, profiler=Profiler())
+    if diskckp:
+        store = DiskStorage(12, 2, np.float64, profiler=Profiler(), filedir="./")
+    a = np.arange(24, dtype=np.float64).reshape(4, 6)[:, ::2]
+    store.register_layout(CheckpointLayout.from_arrays([a], np.float64))
+    store.save(1, [a])
+    a1 = np.zeros((4, 3))
+    store.load(1, [a1])
+    assert np.all(a1 == a)
+
+
+@pytest.mark.parametrize("shapes", [
+    [(20, 20)],
+    # as many bytes as the checkpoint, but other shapes or fields
+    [(5, 20)],
+    [(10, 5), (10, 5)],
+])
+def test_layout_validated_at_construction(shapes):
+    class LaidOutCheckpoint(IncrementCheckpoint):
+        @property
+        def layout(self):
+            return CheckpointLayout(shapes, [np.float64] * len(shapes), np.float64)
+
+    df = np.zeros([10, 10])
+    cp = LaidOutCheckpoint([df])
+    f = IncOperator(1, df)
+    with pytest.raises(ValueError):
+        SingleLevelRevolver(cp, f, f, 2, 10)
+
+
+def make_store(kind, size_ckp, n_ckp, dtype):
+    if kind == "disk":
+        return DiskStorage(size_ckp, n_ckp, dtype, profiler=Profiler(), filedir="./")
+    if kind == "bytes":
+        compression = init_compression({"scheme": None})
+        return BytesStorage(size_ckp * np.dtype(dtype).itemsize, n_ckp, dtype,
+                            compression)
+    return NumpyStorage(size_ckp, n_ckp, dtype, profiler=Profiler())
+
+
+@pytest.mark.parametrize("kind", ["numpy", "disk", "bytes"])
+def test_layout_heterogeneous_dtypes(kind):
+    u = np.linspace(-1, 1, 30).reshape(5, 6)
+    mask = np.arange(7, dtype=np.int32)
+    v = np.linspace(0, 2, 9, dtype=np.float32).reshape(3, 3)
+    layout = CheckpointLayout.from_arrays([u, mask, v], [None, None, None])
+    assert [f.offset for f in layout] == [0, u.nbytes, u.nbytes + 28]
+    assert layout.nbytes == layout.raw_nbytes
+    store = make_store(kind, 64, 2, np.float64)
+    store.register_layout(layout)
+    store.save(1, [u, mask, v])
+    u1, mask1, v1 = np.zeros_like(u), np.zeros_like(mask), np.zeros_like(v)
+    store.load(1, [u1, mask1, v1])
+    assert np.all(u1 == u) and np.all(mask1 == mask) and np.all(v1 == v)
+
+
+@pytest.mark.parametrize("kind", ["numpy", "disk", "bytes"])
+@pytest.mark.parametrize("storage_dtype, rtol", [(np.float32, 1e-7),
+                                                 (np.float16, 1e-3),
+                                                 ("bfloat16", 4e-3)])
+def test_layout_reduced_precision(kind, storage_dtype, rtol):
+    u = np.linspace(0.5, 4, 40).reshape(5, 8)
+    mask = np.arange(5, dtype=np.int64)
+    layout = CheckpointLayout.from_arrays([u, mask], [storage_dtype, None])
+    itemsize = 2 if storage_dtype == "bfloat16" else np.dtype(storage_dtype).itemsize
+    assert layout.fields[0].nbytes == u.size * itemsize
+    assert layout.fields[1].offset % 8 == 0
+    assert layout.saved_nbytes == u.nbytes - u.size * itemsize
+    store = make_store(kind, 64, 2, np.float64)
+    store.register_layout(layout)
+    store.save(0, [u, mask])
+    u1, mask1 = np.zeros_like(u), np.zeros_like(mask)
+    store.load(0, [u1, mask1])
+    assert np.allclose(u1, u, rtol=rtol, atol=0)
+    assert np.all(mask1 == mask)
+
+
+def test_bfloat16_rounding():
+    layout = CheckpointLayout([(4,)], [np.float32], "bfloat16")
+    field = layout.fields[0]
+    # 1 + 2**-8 is halfway between two bfloat16 values: ties go to even
+    a = np.array([1., -2., 1 + 2**-8, 1 + 3 * 2**-8], dtype=np.float32)
+    bits = np.zeros(4, dtype=np.uint16)
+    field.encode(a, bits)
+    assert list(bits) == [0x3F80, 0xC000, 0x3F80, 0x3F82]
+    a1 = np.zeros_like(a)
+    field.decode(bits, a1)
+    assert list(a1) == [1., -2., 1., 1 + 2**-6]
+
+
+def test_bfloat16_nan_and_inf():
+    layout = CheckpointLayout([(6,)], [np.float32], "bfloat16")
+    field = layout.fields[0]
+    # NaNs whose payload would carry into the exponent or vanish on rounding
+    a = np.array([0x7FFFFFFF, 0xFFFFFFFF, 0x7F800001, 0xFFC00000,
+                  0x7F800000, 0xFF800000], dtype=np.uint32).view(np.float32)
+    bits = np.zeros(6, dtype=np.uint16)
+    field.encode(a, bits)
+    assert list(bits) == [0x7FFF, 0xFFFF, 0x7FC0, 0xFFC0, 0x7F80, 0xFF80]
+    a1 = np.zeros_like(a)
+    field.decode(bits, a1)
+    assert np.all(np.isnan(a1[:4]))
+    assert list(np.signbit(a1[:4])) == [False, True, False, True]
+    assert list(a1[4:]) == [np.inf, -np.inf]
+
+
+def test_precision_report():
+    u = np.linspace(1, 2, 100)
+    v = np.arange(10, dtype=np.int32)
+    layout = CheckpointLayout.from_arrays([u, v], [np.float16, None])
+    u_report, v_report = layout.precision_report([u, v])
+    assert u_report["storage_dtype"] == "float16"
+    assert u_report["saved_nbytes"] == 600
+    assert 0 < u_report["max_abs_error"] <= 2 ** -10
+    assert 0 < u_report["max_rel_error"] <= 2 ** -11
+    assert v_report["saved_nbytes"] == 0
+    assert v_report["max_abs_error"] == 0
+
+
+def test_revolver_reduced_precision():
+    class HalfCheckpoint(IncrementCheckpoint):
+        @property
+        def storage_dtypes(self):
+            return [np.float32]
+
+        @property
+        def layout(self):
+            return CheckpointLayout([df.shape], [np.float64], [np.float32])
+
+    nt = 10
+    ncp = 3
+    df = np.zeros([nt, ncp])
+    db = np.zeros([nt, ncp])
+    cp = HalfCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+    rev = SingleLevelRevolver(cp, f, b, ncp, nt)
+    # slots only hold what the reduced-precision layout needs
+    assert rev.storage_list[0].size_ckp == df.size // 2
+    rev.apply_forward()
+    rev.apply_reverse()
+    assert b.counter == nt
+    assert np.count_nonzero(db) == 0
+
+
+@pytest.mark.parametrize("kind", ["numpy", "disk", "bytes"])
+@pytest.mark.parametrize("storage_dtype", [np.float64, np.float32])
+def test_layout_interior_only(kind, storage_dtype):
+    pad = 2
+    u = np.arange(10 * 12, dtype=np.float64).reshape(10, 12)
+    interior = (slice(pad, -pad), slice(pad, -pad))
+    layout = CheckpointLayout.from_arrays([u], storage_dtype, interiors=[interior])
+    field = layout.fields[0]
+    assert field.shape == (6, 8)
+    assert field.array_shape == u.shape
+    assert layout.nbytes == 48 * np.dtype(storage_dtype).itemsize
+    assert layout.raw_nbytes == u.nbytes
+    store = make_store(kind, 64, 2, np.float64)
+    store.register_layout(layout)
+    store.save(1, [u])
+    u1 = np.full_like(u, -1.)
+    store.load(1, [u1])
+    assert np.all(u1[interior] == u[interior])
+    # the halo is left untouched
+    u1[interior] = -1.
+    assert np.all(u1 == -1.)
+
+
+def test_layout_interior_dimensions():
+    with pytest.raises(ValueError):
+        CheckpointLayout([(4, 4)], [np.float64], np.float64,
+                         interiors=[(slice(1, -1),) * 3])
+    layout = CheckpointLayout([(4, 6)], [np.float64], np.float64,
+                              interiors=[(slice(1, -1),)])
+    assert layout.fields[0].shape == (2, 6)
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 3), (10, 6)])
+def test_revolver_interior_only(nt, ncp):
+    class PaddedCheckpoint(IncrementCheckpoint):
+        @property
+        def interiors(self):
+            return [(slice(1, -1), slice(1, -1))]
+
+    df = np.zeros([nt + 2, ncp + 2])
+    db = np.zeros([nt + 2, ncp + 2])
+    cp = PaddedCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+    rev = SingleLevelRevolver(cp, f, b, ncp, nt)
+    rev.apply_forward()
+    assert rev.layout.nbytes == nt * ncp * df.itemsize
+    rev.apply_reverse()
+    assert b.counter == nt
+    assert np.count_nonzero(db[1:-1, 1:-1]) == 0
+
+
+@pytest.mark.parametrize("diskckp", [True, False])
+@pytest.mark.parametrize("declared", ["storage_dtypes", "interiors"])
+def test_layout_sizes_slots_at_construction(diskckp, declared):
+    class DeclaredCheckpoint(IncrementCheckpoint):
+        @property
+        def storage_dtypes(self):
+            return [np.float16] if declared == "storage_dtypes" else None
+
+        @property
+        def interiors(self):
+            return [(slice(8, -8),) * 2] if declared == "interiors" else None
+
+    nt, ncp = 10, 4
+    df = np.zeros([40, 80])
+    db = np.zeros([40, 80])
+    cp = DeclaredCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+    rev = SingleLevelRevolver(cp, f, b, ncp, nt, diskstorage=diskckp)
+    # the layout is known before the storage allocates its slots
+    nbytes = 40 * 80 * 2 if declared == "storage_dtypes" else 24 * 64 * 8
+    assert rev.layout.nbytes == nbytes
+    assert rev.storage_list[0].maxsize_in_bytes == ncp * nbytes
+    rev.apply_forward()
+    rev.apply_reverse()
+    assert b.counter == nt
+
+
+@pytest.mark.parametrize("own_dtypes", [True, False])
+def test_inplace_mixed_dtypes(own_dtypes):
+    class MixedCheckpoint(InplaceCheckpoint):
+        def __init__(self, objects):
+            self.objects = objects
+            self.fill_counter = 0
+
+        @property
+        def dtype(self):
+            return np.float64
+
+        @property
+        def storage_dtypes(self):
+            # without them, every field is stored as float64
+            return [None, None] if own_dtypes else None
+
+        @property
+        def size(self):
+            return self.nbytes // 8
+
+        @property
+        def nbytes(self):
+            return sum(o.size for o in self.objects) * 8
+
+    u = np.zeros(10)
+    v = np.zeros(6, dtype=np.float32)
+    cp = MixedCheckpoint([u, v])
+    rev = SingleLevelRevolver(cp, SimpleOperator(), SimpleOperator(), 2, 10)
+    storage = rev.storage_list[0]
+    # the float32 field can only be written in place if stored as float32
+    assert rev._inplace(storage, 0) == own_dtypes
+    assert [f.dtype for f in rev.layout] == [np.float64, np.float32]
+    assert rev.layout.converted != own_dtypes
+    u[:], v[:] = 1., 2.
+    rev._save(0, 1, 0)
+    u[:], v[:] = 0., 0.
+    rev._load(0, 1, 0)
+    assert np.all(u == 1.) and np.all(v == 2.)
+
+
+def test_zero_blocks(tmpdir):
+    store = DiskStorage(2000, 2, np.float64, filedir=str(tmpdir), profiler=Profiler(),
+                        zero_blocks=64)
+    u = np.zeros((40, 40))
+    u[10:12, 5:25] = 1.
+    v = np.zeros((10, 10), dtype=np.float32)
+    store.register_layout(CheckpointLayout.from_arrays([u, v], [None, None]))
+    store.save(0, [u, v])
+    store.save(1, [u + 1, v])
+    stats = store.stats()
+    assert stats["bytes_written"] < 0.1 * u.nbytes + u.nbytes + v.nbytes
+    assert store.occupancy[0] <= 4 * 64 * 8
+    u1, v1 = np.full_like(u, -1.), np.full_like(v, -1.)
+    store.load(0, [u1, v1])
+    assert np.all(u1 == u) and np.all(v1 == v)
+    store.load(1, [u1, v1])
+    assert np.all(u1 == u + 1) and np.all(v1 == v)
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 3), (10, 6)])
+def test_revolver_zero_blocks(nt, ncp):
+    df = np.zeros([nt, 50])
+    db = np.zeros([nt, 50])
+    cp = IncrementCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+    store = DiskStorage(cp.size, ncp, cp.dtype, filedir="./", zero_blocks=128)
+    rev = MultiLevelRevolver(cp, f, b, nt, storage_list=[store])
+    rev.apply_forward()
+    rev.apply_reverse()
+    assert b.counter == nt
+    assert np.count_nonzero(db) == 0
+
+
+def test_zero_blocks_need_layout(tmpdir):
+    store = DiskStorage(100, 2, np.float64, filedir=str(tmpdir), profiler=Profiler(),
+                        zero_blocks=64)
+    with pytest.raises(ValueError):
+        store.save(0, [np.zeros(100)])
+
+
+def test_numpy_storage_has_no_zero_blocks():
+    # fixed-size slots gain nothing from packing out zero blocks
+    with pytest.raises(TypeError):
+        NumpyStorage(100, 2, np.float64, zero_blocks=64)
+
+
+@pytest.mark.parametrize("layout", [False, True])
+def test_numpy_storage_zero_checkpoints(layout):
+    u = np.zeros((40, 40))
+    v = np.zeros((10, 10), dtype=np.float32)
+    store = NumpyStorage(u.size + v.size, 2, np.float64, profiler=Profiler())
+    if layout:
+        store.register_layout(CheckpointLayout.from_arrays([u, v], [None, None]))
+    # the zero checkpoint overwrites non-zero data in the same slot
+    store.save(0, [u + 1, v + 2])
+    store.save(0, [u, v])
+    store.save(1, [u, v])
+    for key in range(2):
+        u1, v1 = np.full_like(u, -1.), np.full_like(v, -1.)
+        store.load(key, [u1, v1])
+        assert np.count_nonzero(u1) == np.count_nonzero(v1) == 0
+
+
+@pytest.mark.parametrize("scheme", compressors_available)
+@pytest.mark.parametrize("max_chain", [0, 1, 3])
+@pytest.mark.parametrize("nt, ncp", [(10, 3), (20, 6), (20, 19)])
+def test_delta_storage_lossless(scheme, max_chain, nt, ncp):
+    results = []
+    for delta in (False, True):
+        df = np.linspace(0, 1, nt * ncp).reshape(nt, ncp)
+        db = np.zeros([nt, ncp])
+        cp = IncrementCheckpoint([df])
+        f = IncOperator(1, df)
+        b = IncOperator(-1, df, db)
+        rev = SingleLevelRevolver(cp, f, b, ncp, nt)
+        if delta:
+            rev.resetStorageList()
+            rev.addDeltaStorage({"scheme": scheme}, max_chain=max_chain)
+        rev.apply_forward()
+        rev.apply_reverse()
+        assert b.counter == nt
+        results.append(db)
+    assert max(rev.storage_list[0].chain.values()) <= max_chain
+    assert np.all(results[0] == results[1])
+
+
+def test_delta_storage_lifo_policy():
+    compression = init_compression({"scheme": None})
+    store = DeltaStorage(800, 4, np.float64, compression, max_chain=2)
+    a = np.linspace(0, 1, 100)
+    for key in range(4):
+        store.save(key, [a + key])
+    assert store.chain == {0: 0, 1: 1, 2: 2, 3: 0}
+    # overwriting slot 1 discards the slots above it
+    store.save(1, [a + 10])
+    assert store.chain == {0: 0, 1: 1}
+    store.save(2, [a + 20])
+    a1 = np.empty_like(a)
+    for key, shift in [(2, 20), (0, 0), (1, 10), (2, 20)]:
+        store.load(key, [a1])
+        assert np.all(a1 == a + shift)
+
+
+def test_delta_storage_quantized():
+    compression = init_compression({"scheme": "zeroblock", "block_size": 64})
+    quantum = 1e-4
+    store = DeltaStorage(9000, 8, np.float64, compression, max_chain=7,
+                         quantum=quantum)
+    x = np.linspace(0, 2 * np.pi, 1000)
+    mask = np.arange(10)
+    states = [np.sin(x + 0.01 * t) for t in range(8)]
+    for key, u in enumerate(states):
+        store.save(key, [u, mask])
+    assert store.chain[7] == 7
+    stats = store.stats()
+    assert stats["compression_ratio"] > 2
+    u1, mask1 = np.empty_like(x), np.empty_like(mask)
+    for key in reversed(range(8)):
+        store.load(key, [u1, mask1])
+        assert np.max(np.abs(u1 - states[key])) <= quantum / 2 * (1 + 1e-9)
+        assert np.all(mask1 == mask)
+    # differences beyond the quantized range fall back to whole checkpoints
+    store.save(1, [states[1] + 1e3, mask])
+    assert store.chain[1] == 0
+
+
+def test_elastic_release():
+    store = NumpyStorage(1000, 4, np.float64, profiler=Profiler(), elastic=True)
+    a = np.arange(1000.)
+    b = np.empty_like(a)
+    for key in range(4):
+        store.save(key, [a + key])
+    store.release(1)
+    store.load(1, [b])
+    assert np.all(b == 0)
+    store.load(2, [b])
+    assert np.all(b == a + 2)
+    store.save(1, [a])
+    store.load(1, [b])
+    assert np.all(b == a)
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 2), (30, 4), (50, 12)])
+def test_revolver_elastic(nt, ncp):
+    results = []
+    for elastic in [False, True]:
+        df = np.zeros([nt, 10])
+        db = np.zeros([nt, 10])
+        cp = IncrementCheckpoint([df])
+        f = IncOperator(1, df)
+        b = IncOperator(-1, df, db)
+        rev = SingleLevelRevolver(cp, f, b, ncp, nt, elastic=elastic)
+        rev.apply_forward()
+        rev.apply_reverse()
+        assert b.counter == nt
+        results.append(db.copy())
+    assert np.all(results[0] == results[1])
+    assert rev.released == set(range(ncp))
+    assert rev.storage_list[0].size_in_bytes == 0
+    assert rev.profiler.memory["reverse"]["current"] > 0
+    with pytest.raises(ValueError):
+        SingleLevelRevolver(cp, f, b, ncp, nt, elastic=True, retain=True)
+
+
+@pytest.mark.parametrize("kwargs", [{'hugepages': True}, {'first_touch': 3},
+                                    {'first_touch': [None, None], 'hugepages': True,
+                                     'elastic': True}])
+def test_arena_allocation(kwargs):
+    size = 300000
+    store = NumpyStorage(size, 3, np.float64, profiler=Profiler(), **kwargs)
+    assert store.storage.ctypes.data % 4096 == 0
+    assert np.all(store.storage[:, ::1000] == 0)
+    a = np.random.rand(size)
+    b = np.empty_like(a)
+    for key in range(3):
+        store.save(key, [a + key])
+    for key in range(3):
+        store.load(key, [b])
+        assert np.all(b == a + key)
+
+
+def test_omp_placement(monkeypatch):
+    monkeypatch.setenv("OMP_NUM_THREADS", "1")
+    placement = omp_placement()
+    assert len(placement) == 1
+    assert len(placement[0]) >= 1
+
+
+def run_pooled(revolver_type, nt, *args, **kwargs):
+    rev, df, db, _, b = run(revolver_type, nt, *args, **kwargs)
+    assert b.counter == nt
+    # the last reverse step sees the state restored from timestep 0
+    assert np.all(df == 1) and np.all(db == 0)
+    return rev
+
+
+@pytest.mark.parametrize("revolver_type", [MemoryRevolver, DiskRevolver])
+def test_storage_pool_reuse(revolver_type):
+    nt, ncp = 20, 4
+    pool = StoragePool()
+    rev = run_pooled(revolver_type, nt, ncp, nt, pool=pool)
+    storage = rev.storage_list[0]
+    rev.release_storage()
+    assert pool.n_idle == 1 and storage.size_in_bytes == 0
+    rev = run_pooled(revolver_type, nt, ncp, nt, pool=pool)
+    assert rev.storage_list[0] is storage
+    assert (pool.hits, pool.misses) == (1, 1)
+    # a different number of slots needs a different storage
+    other = run_pooled(revolver_type, nt, ncp + 1, nt, pool=pool)
+    assert other.storage_list[0] is not storage
+    rev.release_storage()
+    other.release_storage()
+    assert pool.n_idle == 2
+    pool.evict()
+    assert pool.n_idle == 0
+
+
+def test_storage_pool_multilevel():
+    nt = 20
+    pool = StoragePool()
+    for _ in range(2):
+        storages = [pool.acquire(NumpyStorage, 10 * nt, 3, np.float64),
+                    pool.acquire(DiskStorage, 10 * nt, nt, np.float64, wd=2, rd=2)]
+        rev = run_pooled(MultiLevelRevolver, nt, nt, storage_list=storages)
+        rev.release_storage()
+    assert (pool.hits, pool.misses) == (2, 2)
+
+
+def test_storage_pool_limits():
+    pool = StoragePool(max_idle_bytes=2 * 8 * 100 * 4)
+    storages = [pool.acquire(NumpyStorage, 100, 4, np.float64) for _ in range(3)]
+    with pytest.raises(ValueError):
+        StoragePool().release(storages[0])
+    for st in storages:
+        pool.release(st)
+    # the oldest idle storage is dropped to stay within the limit
+    assert pool.n_idle == 2
+    assert pool.acquire(NumpyStorage, 100, 4, np.float64) is storages[2]
+    disk = pool.acquire(DiskStorage, 100, 4, np.float64)
+    assert os.path.getsize(disk.datFileName) == disk.maxsize_in_bytes
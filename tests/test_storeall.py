@@ -0,0 +1,154 @@
+from utils import IncrementCheckpoint, IncOperator, SimpleCheckpoint, SimpleOperator
+from utils import run
+from pyrevolve import (MemoryRevolver, StoreAllRevolver, select_revolver,
+                       BytesStorage)
+from pyrevolve.compression import init_compression
+from pyrevolve.schedulers import Action, StoreAll
+import asyncio
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("nt", [1, 2, 5, 10, 31])
+@pytest.mark.parametrize("stride", [1, 2, 3, 7])
+def test_storeall_schedule(nt, stride):
+    scheduler = StoreAll(nt, stride)
+    keys = []
+    steps = 0
+    reversed_steps = []
+    while True:
+        action = scheduler.next()
+        if action.type == Action.TAKESHOT:
+            assert action.capo == action.ckp * stride
+            keys.append(action.ckp)
+        elif action.type == Action.ADVANCE:
+            steps += action.capo - action.old_capo
+        elif action.type == Action.RESTORE:
+            assert action.capo == action.ckp * stride
+            assert action.ckp in keys
+        elif action.type in (Action.REVERSE, Action.REVSTART):
+            reversed_steps.append(action.capo)
+        elif action.type == Action.TERMINATE:
+            break
+    assert keys == list(range(scheduler.n_checkpoints))
+    assert reversed_steps == list(range(nt - 1, -1, -1))
+    assert steps == round(scheduler.ratio * nt)
+    assert steps - (nt - 1) <= (nt - 1) * (stride - 1)
+
+
+@pytest.mark.parametrize("nt", [1, 2, 10, 23])
+@pytest.mark.parametrize("stride", [1, 3])
+@pytest.mark.parametrize("scheme", [None, "zeroblock"])
+def test_storeall_matches_revolve(nt, stride, scheme):
+    _, _, db_ref, f_ref, b_ref = run(MemoryRevolver, nt, nt, nt, width=50)
+    _, _, db, f, b = run(StoreAllRevolver, nt, nt, stride=stride, width=50,
+                         compression_params={"scheme": scheme})
+    assert b.counter == b_ref.counter == nt
+    assert np.all(db == db_ref)
+    if stride == 1:
+        assert f.counter == f_ref.counter
+
+
+def test_storeall_loads_and_saves():
+    nt = 10
+    cp = SimpleCheckpoint()
+    f = SimpleOperator()
+    b = SimpleOperator()
+    rev = StoreAllRevolver(cp, f, b, nt)
+    rev.apply_forward()
+    assert cp.save_counter == nt - 1
+    assert cp.load_counter == 0
+    rev.apply_reverse()
+    assert cp.load_counter == nt - 1
+
+
+def test_packed_bytes_storage():
+    compression = init_compression({"scheme": "zeroblock", "block_size": 64})
+    store = BytesStorage(800, 10, np.float64, compression, capacity=1000)
+    a = np.zeros(100)
+    a[:8] = 1.
+    for key in range(10):
+        store.save(key, [a + key * (np.arange(100) < 8)])
+    assert store.size_in_bytes == 10 * 64
+    # saving a slot discards the slots above it
+    store.save(2, [a])
+    assert store.size_in_bytes == 3 * 64
+    a1 = np.empty_like(a)
+    store.load(1, [a1])
+    assert np.all(a1[:8] == 2.) and np.all(a1[8:] == 0.)
+    with pytest.raises(ValueError):
+        for key in range(3, 10):
+            store.save(key, [np.ones(100)])
+
+
+@pytest.mark.parametrize("budget, expected", [(10**6, StoreAllRevolver),
+                                              (2 * 10**5, MemoryRevolver)])
+def test_select_revolver(budget, expected):
+    nt = 50
+    df = np.zeros([100, 100])
+    cp = IncrementCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, np.zeros_like(df))
+    rev = select_revolver(cp, f, b, nt, budget, compression_params={"scheme": None},
+                          compression_ratio=10)
+    assert type(rev) is expected
+    if expected is MemoryRevolver:
+        assert rev.n_checkpoints == budget // cp.nbytes
+
+
+def test_select_revolver_needs_ratio():
+    df = np.zeros([100, 100])
+    cp = IncrementCheckpoint([df])
+    f = IncOperator(1, df)
+    rev = select_revolver(cp, f, f, 50, 10**6, compression_params={"scheme": None})
+    assert type(rev) is MemoryRevolver
+    # the zero initial state says nothing about the compressibility of the run
+    with pytest.raises(ValueError, match="compression_ratio"):
+        select_revolver(cp, f, f, 50, 10**6, compression_params={"scheme": "zeroblock"})
+
+
+@pytest.mark.parametrize("stride", [1, 3])
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_select_revolver_falls_back(stride, asynchronous):
+    nt = 50
+    df = np.zeros([64, 64])
+    db = np.zeros_like(df)
+    cp = IncrementCheckpoint([df])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+    # an optimistic ratio: after the first step, the field does not compress
+    rev = select_revolver(cp, f, b, nt, 5 * cp.nbytes, stride=stride,
+                          compression_params={"scheme": "zeroblock"},
+                          compression_ratio=1000)
+    assert type(rev) is StoreAllRevolver
+    if asynchronous:
+        asyncio.run(rev.async_apply_forward())
+    else:
+        rev.apply_forward()
+    assert rev.fell_back
+    assert rev.n_checkpoints == 5
+    rev.apply_reverse()
+    assert b.counter == nt
+    assert np.count_nonzero(db) == 0
+
+
+def test_storeall_report():
+    nt = 20
+    df = np.zeros([nt, 5])
+    db = np.zeros([nt, 5])
+    padding = np.zeros([100, 100])
+    cp = IncrementCheckpoint([df, padding])
+    f = IncOperator(1, df)
+    b = IncOperator(-1, df, db)
+    rev = StoreAllRevolver(cp, f, b, nt, compression_params={"scheme": "zeroblock"},
+                           capacity=2 * cp.nbytes)
+    rev.apply_forward()
+    rev.apply_reverse()
+    report = rev.report()
+    assert report["n_checkpoints"] == nt - 1
+    assert report["forward_steps"] == nt - 1
+    assert report["compression_ratio"] > 10
+    assert report["peak_bytes"] < 2 * cp.nbytes
+    assert report["revolve_checkpoints"] == 1
+    assert report["revolve_forward_steps"] > report["forward_steps"]
+    assert report["total_time"] > 0
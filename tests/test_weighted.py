@@ -0,0 +1,192 @@
+from utils import IncrementCheckpoint, IncOperator
+from pyrevolve import SingleLevelRevolver, MemoryRevolver, Checkpoint, Operator
+from pyrevolve.schedulers import Action, CRevolve, WeightedRevolve
+import numpy as np
+import pytest
+
+
+def schedule_cost(oplist, costs, wd=0, rd=0):
+    """Forward, write and read cost of a CRevolve-style action list"""
+    total = 0.
+    for a in oplist:
+        if a.type == Action.ADVANCE:
+            total += costs[a.old_capo:a.capo].sum()
+        elif a.type == Action.TAKESHOT:
+            total += wd
+        elif a.type == Action.RESTORE:
+            total += rd
+    return total
+
+
+@pytest.mark.parametrize("nt", [1, 2, 3, 10, 23, 50])
+@pytest.mark.parametrize("ncp", [1, 2, 3, 5, 60])
+def test_uniform_costs_match_revolve(nt, ncp):
+    assert np.isclose(WeightedRevolve(ncp, nt).ratio, CRevolve(ncp, nt).ratio)
+
+
+@pytest.mark.parametrize("nt", [2, 5, 17, 40])
+@pytest.mark.parametrize("ncp", [1, 2, 4])
+def test_schedule_is_consistent(nt, ncp):
+    scheduler = WeightedRevolve(ncp, nt, costs=np.arange(nt) % 3 + 1)
+    live = 0
+    slots = {}
+    reversed_steps = []
+    for a in scheduler.oplist:
+        assert 0 <= a.ckp < ncp or a.type == Action.TERMINATE
+        if a.type == Action.TAKESHOT:
+            assert a.capo == live
+            slots[a.ckp] = live
+        elif a.type == Action.ADVANCE:
+            assert a.old_capo == live and a.capo > live
+            live = a.capo
+        elif a.type == Action.RESTORE:
+            live = slots[a.ckp]
+        elif a.type in (Action.LASTFW, Action.REVERSE):
+            assert a.capo == live
+            reversed_steps.append(live)
+            live += 1
+    assert reversed_steps == list(range(nt - 1, -1, -1))
+
+
+@pytest.mark.parametrize("nt, ncp", [(20, 2), (40, 3), (60, 5)])
+def test_expensive_window_is_avoided(nt, ncp):
+    costs = np.ones(nt)
+    costs[nt // 4:nt // 2] = 20
+    weighted = WeightedRevolve(ncp, nt, costs=costs, wd=1, rd=1)
+    revolve = CRevolve(ncp, nt)
+    # every step is run forward and reversed once besides the recomputation
+    overhead = weighted.makespan - costs.sum() - nt
+    assert np.isclose(overhead, schedule_cost(weighted.oplist, costs, 1, 1))
+    assert overhead < schedule_cost(revolve.oplist, costs, 1, 1)
+
+
+def test_invalid_costs():
+    with pytest.raises(ValueError):
+        WeightedRevolve(2, 10, costs=np.ones(9))
+    with pytest.raises(ValueError):
+        WeightedRevolve(2, 10, reverse_costs=-np.ones(10))
+
+
+@pytest.mark.parametrize("nt, ncp", [(10, 2), (25, 3), (40, 6)])
+def test_weighted_revolver(nt, ncp):
+    results = []
+    for revolver, kwargs in [(MemoryRevolver, {}),
+                             (SingleLevelRevolver, {'costs': np.arange(nt) % 5 + 1})]:
+        df = np.zeros([nt, 10])
+        db = np.zeros([nt, 10])
+        cp = IncrementCheckpoint([df])
+        f = IncOperator(1, df)
+        b = IncOperator(-1, df, db)
+        rev = revolver(cp, f, b, ncp, nt, **kwargs)
+        rev.apply_forward()
+        assert np.all(df == nt)
+        rev.apply_reverse()
+        assert b.counter == nt
+        results.append(db.copy())
+    assert np.all(results[0] == results[1])
+
+
+@pytest.mark.parametrize("nt", [2, 5, 23, 50])
+@pytest.mark.parametrize("ncp", [1, 2, 5])
+def test_uniform_sizes_match_revolve(nt, ncp):
+    scheduler = WeightedRevolve(None, nt, sizes=np.full(nt, 100.),
+                                memory_budget=100 * ncp, budget_units=ncp)
+    assert np.isclose(scheduler.ratio, CRevolve(ncp, nt).ratio)
+    assert scheduler.peak_bytes <= 100 * ncp
+
+
+@pytest.mark.parametrize("budget", [400, 1000, 2500])
+def test_memory_budget(budget):
+    nt = 60
+    sizes = np.where(np.arange(nt) % 20 < 10, 100., 300.)
+    scheduler = WeightedRevolve(None, nt, sizes=sizes, memory_budget=budget)
+    assert scheduler.peak_bytes <= budget
+    # never worse than slots of the largest size, never better than of the smallest
+    assert scheduler.ratio <= CRevolve(int(budget // 300), nt).ratio + 1e-9
+    assert scheduler.ratio >= CRevolve(int(budget // 100), nt).ratio - 1e-9
+
+
+def test_memory_budget_too_small():
+    with pytest.raises(ValueError):
+        WeightedRevolve(None, 10, sizes=np.full(10, 100.), memory_budget=50)
+
+
+@pytest.mark.parametrize("budget", [False, True])
+def test_size_guard(budget):
+    def kwargs(nt):
+        if budget:
+            return {"n_checkpoints": None, "sizes": np.ones(nt), "memory_budget": 64.}
+        return {"n_checkpoints": 10}
+
+    # refused before any table is allocated
+    with pytest.raises(ValueError, match="CRevolve"):
+        WeightedRevolve(n_timesteps=1000, **kwargs(1000))
+    with pytest.raises(ValueError, match="CRevolve"):
+        WeightedRevolve(n_timesteps=50, max_work=10 ** 4, **kwargs(50))
+    scheduler = WeightedRevolve(n_timesteps=50, max_work=None, **kwargs(50))
+    assert scheduler.oplist[-1].type == Action.TERMINATE
+
+
+def mesh_size(t):
+    return 8 + (t % 7) * 4
+
+
+class MeshCheckpoint(Checkpoint):
+    """Checkpoint of a field whose active size changes with the timestep"""
+    def __init__(self, field):
+        self.field = field
+
+    def get_data(self, timestep):
+        return [self.field[:mesh_size(timestep)]]
+
+    def get_data_location(self, timestep):
+        return self.get_data(timestep)
+
+    @property
+    def dtype(self):
+        return self.field.dtype
+
+    @property
+    def size(self):
+        return self.field.size
+
+    @property
+    def nbytes(self):
+        return self.field.nbytes
+
+
+class MeshForward(Operator):
+    """Refines or coarsens the mesh every step, filling new cells from the
+    active ones"""
+    def __init__(self, field):
+        self.field = field
+
+    def apply(self, **kwargs):
+        for t in range(kwargs['t_start'], kwargs['t_end']):
+            self.field[:mesh_size(t + 1)] = self.field[0] + 1
+
+
+class MeshReverse(Operator):
+    def __init__(self, field):
+        self.field = field
+        self.steps = []
+
+    def apply(self, **kwargs):
+        t = kwargs['t_start']
+        assert np.all(self.field[:mesh_size(t + 1)] == t + 1)
+        self.steps.append(t)
+
+
+@pytest.mark.parametrize("nt, budget", [(10, 60), (40, 200), (40, 1000)])
+def test_memory_budget_revolver(nt, budget):
+    u = np.zeros(40, dtype=np.int32)
+    cp = MeshCheckpoint(u)
+    f = MeshForward(u)
+    b = MeshReverse(u)
+    rev = SingleLevelRevolver(cp, f, b, None, nt, memory_budget=budget,
+                              checkpoint_sizes=lambda t: mesh_size(t) * 4)
+    rev.apply_forward()
+    rev.apply_reverse()
+    assert b.steps == list(range(nt - 1, -1, -1))
+    assert rev.storage_list[0].peak_bytes <= budget
+    assert rev.scheduler.peak_bytes <= budget
@@ -2,6 +2,7 @@ from pyrevolve import Operator, Checkpoint
 import numpy as np
 from operator import mul
 from functools import reduce
+import asyncio
 
 
 def np_ref_address(ptr):
@@ -127,3 +128,66 @@ class IncOperator(Operator):
         else:
             self.v[:] = (self.u[:]*(-1) + 1)
         self.counter += abs(t_end - t_start)
+
+
+class RecordOperator(IncOperator):
+    """Reverse operator recording the forward state it is given"""
+    def __init__(self, u):
+        super().__init__(-1, u)
+        self.states = []
+
+    def apply(self, **kwargs):
+        self.states.append((kwargs['t_start'], self.u.copy()))
+
+
+class InplaceCheckpoint(IncrementCheckpoint):
+    """Writes its data straight into the storage-provided buffers"""
+
+    def __init__(self, _objects):
+        super().__init__(_objects)
+        self.fill_counter = 0
+
+    @property
+    def supports_inplace(self):
+        return True
+
+    def get_data_shapes(self, timestep):
+        return [o.shape for o in self.objects]
+
+    def fill_data(self, timestep, buffers):
+        self.fill_counter += 1
+        for o, buf in zip(self.objects, buffers):
+            buf[:] = o
+
+
+def build(revolver_type, nt, *args, width=10, checkpoint=IncrementCheckpoint,
+          record=False, **kwargs):
+    """Returns revolver_type(cp, f, b, *args, **kwargs), over a forward field
+    df of shape (nt, width) and its adjoint db, followed by df, db and the
+    IncOperators f and b (a RecordOperator if `record`)"""
+    df = np.zeros([nt, width])
+    db = np.zeros([nt, width])
+    cp = checkpoint([df])
+    f = IncOperator(1, df)
+    b = RecordOperator(df) if record else IncOperator(-1, df, db)
+    return revolver_type(cp, f, b, *args, **kwargs), df, db, f, b
+
+
+def sweep(rev, asynchronous=False):
+    """Runs the forward and reverse sweeps of `rev`, from an event loop if
+    `asynchronous`"""
+    if asynchronous:
+        async def sweeps():
+            await rev.async_apply_forward()
+            await rev.async_apply_reverse()
+        asyncio.run(sweeps())
+    else:
+        rev.apply_forward()
+        rev.apply_reverse()
+
+
+def run(revolver_type, nt, *args, asynchronous=False, **kwargs):
+    """Builds a revolver as 'build' does and runs its sweeps"""
+    rev, df, db, f, b = build(revolver_type, nt, *args, **kwargs)
+    sweep(rev, asynchronous)
+    return rev, df, db, f, b